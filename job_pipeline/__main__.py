@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import typer
 
@@ -20,11 +20,20 @@ import job_pipeline.sources.kaggle_promptcloud_listings
 import job_pipeline.sources.launchrecruitment
 import job_pipeline.sources.probono
 import job_pipeline.sources.seek
+from job_pipeline.lib.gazetteer import Gazetteer
+from job_pipeline.lib.geocodecache import (
+    DEFAULT_GEOCODE_CACHE_ENTRIES,
+    DEFAULT_GEOCODE_CACHE_TTL,
+    GeocodeCache,
+)
+from job_pipeline.lib.normalise import set_gazetteer, set_geocode_cache
 from job_pipeline.sources.abstract_datasource import AbstractDatasource
+from job_pipeline.sources.commoncrawl_datasource import CommonCrawlDatasource
 
 RAW_DATA_DIR = Path("./data/01_raw")
 EXTRACT_DATA_DIR = Path("./data/02_primary")
 NORMALISED_DATA_DIR = Path("./data/03_secondary")
+GEOCODE_CACHE_PATH = Path("./data/00_cache/geocode.sqlite")
 
 
 DATASOURCES: List[AbstractDatasource] = [
@@ -62,32 +71,81 @@ def build(overwrite: bool = False):
 
 
 @app.command()
-def fetch(overwrite: bool = False):
+def fetch(overwrite: bool = False, cdx_mirror: Optional[Path] = None):
     """1 - Fetch the data"""
+    if cdx_mirror is not None:
+        CommonCrawlDatasource.cdx_local_path = cdx_mirror
     for datasource in DATASOURCES:
         datasource.download(RAW_DATA_DIR / datasource.name, overwrite=overwrite)
 
 
 @app.command()
-def extract(overwrite: bool = False):
+def extract(
+    overwrite: bool = False,
+    workers: int = 1,
+    extension: str = ".jsonl",
+    full: bool = False,
+):
     """2 - Extract Fetched Data"""
+    AbstractDatasource.extract_extension = extension
+    CommonCrawlDatasource.extract_full = full
     for datasource in DATASOURCES:
         datasource.extract_all(
             RAW_DATA_DIR / datasource.name,
             EXTRACT_DATA_DIR / datasource.name,
             overwrite=overwrite,
+            workers=workers,
         )
 
 
 @app.command()
-def normalise(overwrite: bool = False):
+def normalise(
+    overwrite: bool = False,
+    workers: int = 1,
+    geocode_cache: Path = GEOCODE_CACHE_PATH,
+    geocode_cache_entries: int = DEFAULT_GEOCODE_CACHE_ENTRIES,
+    geocode_cache_days: float = DEFAULT_GEOCODE_CACHE_TTL / (24 * 60 * 60),
+    gazetteer: Optional[Path] = None,
+):
     """3 - Normalise Extracted Data"""
+    if gazetteer is not None:
+        set_gazetteer(Gazetteer.from_csv(gazetteer))
+    with GeocodeCache(
+        geocode_cache, geocode_cache_entries, geocode_cache_days * 24 * 60 * 60
+    ) as cache:
+        set_geocode_cache(cache)
+        for datasource in DATASOURCES:
+            datasource.normalise_all(
+                EXTRACT_DATA_DIR / datasource.name,
+                NORMALISED_DATA_DIR / datasource.name,
+                overwrite=overwrite,
+                workers=workers,
+            )
+        logging.info(f"Geocode cache: {cache}")
+
+
+@app.command()
+def stream(
+    overwrite: bool = False,
+    keep_raw: bool = False,
+    workers: int = 1,
+    cdx_mirror: Optional[Path] = None,
+    extension: str = ".jsonl",
+    full: bool = False,
+):
+    """Fetch and Extract Common Crawl Data in one pass"""
+    AbstractDatasource.extract_extension = extension
+    CommonCrawlDatasource.extract_full = full
+    if cdx_mirror is not None:
+        CommonCrawlDatasource.cdx_local_path = cdx_mirror
     for datasource in DATASOURCES:
-        datasource.normalise_all(
-            EXTRACT_DATA_DIR / datasource.name,
-            NORMALISED_DATA_DIR / datasource.name,
-            overwrite=overwrite,
-        )
+        if isinstance(datasource, CommonCrawlDatasource):
+            datasource.stream(
+                EXTRACT_DATA_DIR / datasource.name,
+                RAW_DATA_DIR / datasource.name if keep_raw else None,
+                overwrite=overwrite,
+                workers=workers,
+            )
 
 
 if __name__ == "__main__":
@@ -5,8 +5,9 @@ from typing import Dict, Generator, List, Optional, Union
 
 import requests
 from mypy_extensions import TypedDict
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from job_pipeline.lib.rangecache import RangeCache
+from job_pipeline.lib.ratelimit import AdaptiveAdapter, AdaptiveLimiter
 
 
 def jsonl_loads(jsonl):
@@ -17,13 +18,18 @@ INDEXES_URL = "https://index.commoncrawl.org/collinfo.json"
 
 # TODO: This should all be wrapped in an object rather than a global
 CC_DATA_URL = "https://data.commoncrawl.org/"
-RETRY_STRATEGY = Retry(total=10, backoff_factor=1, status_forcelist=set([504, 500, 503]))
-ADAPTER = HTTPAdapter(max_retries=RETRY_STRATEGY)
+# Concurrency shared by all requests to each server; adapts to throttling
+CC_DATA_LIMITER = AdaptiveLimiter(initial=16, maximum=512)
+CC_INDEX_LIMITER = AdaptiveLimiter(initial=4, maximum=32)
+
 CC_HTTP = requests.Session()
-CC_HTTP.mount(CC_DATA_URL, ADAPTER)
+CC_HTTP.mount(CC_DATA_URL, AdaptiveAdapter(CC_DATA_LIMITER, pool_maxsize=64))
 
 CC_INDEX = requests.Session()
-CC_INDEX.mount("https://index.commoncrawl.org/", ADAPTER)
+CC_INDEX.mount("https://index.commoncrawl.org/", AdaptiveAdapter(CC_INDEX_LIMITER))
+
+# Filters applied to every CDX query
+DEFAULT_FILTERS = ["=status:200"]
 
 
 CrawlIndexDict = TypedDict(
@@ -47,6 +53,11 @@ CrawlResultDict = TypedDict(
 )
 
 
+def cdx_row_key(row: CrawlResultDict) -> str:
+    """Unique identifier for the WARC record of a CDX row"""
+    return f"{row['filename']}:{row['offset']}"
+
+
 @lru_cache(maxsize=1)
 def get_indexes() -> List[CrawlIndexDict]:
     r = CC_INDEX.get(INDEXES_URL)
@@ -94,7 +105,7 @@ def cdx_query_page(
 def cdx_query(
     api: str, query: str, filters: Optional[List[str]] = None
 ) -> Generator[CrawlResultDict, None, None]:
-    filters = ["=status:200"] + (filters or [])
+    filters = DEFAULT_FILTERS + (filters or [])
     num_pages = cdx_num_pages(api, query, filters)
     for page in range(num_pages):
         logging.debug(f"Querying page {page} of {num_pages} for {query} on {api}")
@@ -102,11 +113,19 @@ def cdx_query(
             yield result
 
 
-def fetch_cc(filename: str, offset: int, length: int) -> bytes:
+def fetch_cc(
+    filename: str, offset: int, length: int, cache: Optional[RangeCache] = None
+) -> bytes:
+    if cache is not None:
+        content = cache.get(filename, int(offset), int(length))
+        if content is not None:
+            return content
     data_url = CC_DATA_URL + filename
     start_byte = int(offset)
-    end_byte = start_byte + int(length)
+    end_byte = start_byte + int(length) - 1
     headers = {"Range": f"bytes={start_byte}-{end_byte}"}
     r = CC_HTTP.get(data_url, headers=headers)
     r.raise_for_status()
+    if cache is not None:
+        cache.put(filename, int(offset), int(length), r.content)
     return r.content
@@ -0,0 +1,303 @@
+"""Asynchronous fetching of WARC records from Common Crawl
+
+All requests run on a single event loop with a bounded number of in-flight
+requests sharing a keep-alive connection pool, so hundreds of concurrent range
+requests cost no more than one process.
+How many of those requests are actually in flight adapts to the server through
+the shared lib.cc.CC_DATA_LIMITER.
+
+Records close together in the same WARC file are coalesced into a single range
+request and split apart again after fetching.
+An optional RangeCache serves previously fetched records from local disk.
+"""
+import asyncio
+import logging
+from typing import (
+    Any,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
+
+from job_pipeline.lib.cc import CC_DATA_LIMITER, CC_DATA_URL, CrawlResultDict
+from job_pipeline.lib.rangecache import RangeCache
+from job_pipeline.lib.ratelimit import (
+    DEFAULT_MAX_ATTEMPTS,
+    THROTTLE_STATUSES,
+    AdaptiveLimiter,
+)
+
+DEFAULT_CONCURRENCY = 128
+# Largest number of unwanted bytes between records to fetch in one request
+DEFAULT_MAX_GAP = 16 * 1024
+# Largest single request when coalescing records
+DEFAULT_MAX_SPAN = 8 * 1024 * 1024
+
+_DONE = object()
+
+
+class RangeSpan(NamedTuple):
+    """A contiguous byte range [start, end) of filename covering rows"""
+
+    filename: str
+    start: int
+    end: int
+    rows: List[CrawlResultDict]
+
+
+def row_range_key(row: CrawlResultDict) -> Tuple[str, int]:
+    return row["filename"], int(row["offset"])
+
+
+def coalesce_ranges(
+    rows: Iterable[CrawlResultDict],
+    max_gap: Optional[int] = DEFAULT_MAX_GAP,
+    max_span: int = DEFAULT_MAX_SPAN,
+) -> Generator[RangeSpan, None, None]:
+    """Merge rows sorted by (filename, offset) into spans
+
+    Consecutive rows in the same file are merged when the gap between them is
+    at most max_gap bytes and the merged span is at most max_span bytes
+    (a single record larger than max_span gets its own span).
+    If max_gap is None every row is fetched separately.
+    """
+    span: Optional[RangeSpan] = None
+    for row in rows:
+        filename, start = row_range_key(row)
+        end = start + int(row["length"])
+        if (
+            span is not None
+            and max_gap is not None
+            and filename == span.filename
+            and start - span.end <= max_gap
+            and max(end, span.end) - span.start <= max_span
+        ):
+            assert start >= span.start, "Rows must be sorted by (filename, offset)"
+            span.rows.append(row)
+            span = span._replace(end=max(end, span.end))
+        else:
+            if span is not None:
+                yield span
+            span = RangeSpan(filename, start, end, [row])
+    if span is not None:
+        yield span
+
+
+def plan_ranges(
+    rows: Iterable[CrawlResultDict],
+    max_gap: Optional[int] = DEFAULT_MAX_GAP,
+    max_span: int = DEFAULT_MAX_SPAN,
+) -> List[RangeSpan]:
+    """Sort rows by (filename, offset) and coalesce them into spans"""
+    return list(coalesce_ranges(sorted(rows, key=row_range_key), max_gap, max_span))
+
+
+def split_span(
+    span: RangeSpan, content: bytes
+) -> Generator[Tuple[CrawlResultDict, bytes], None, None]:
+    """Split content fetched for span into the content of each row"""
+    if len(content) != span.end - span.start:
+        raise ValueError(
+            f"Expected {span.end - span.start} bytes from {span.filename} "
+            f"at {span.start}, got {len(content)}"
+        )
+    for row in span.rows:
+        start = int(row["offset"]) - span.start
+        yield row, content[start : start + int(row["length"])]
+
+
+async def fetch_range(
+    session: aiohttp.ClientSession,
+    filename: str,
+    offset: int,
+    length: int,
+    base_url: str = CC_DATA_URL,
+    limiter: AdaptiveLimiter = CC_DATA_LIMITER,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> bytes:
+    """Fetch length bytes starting at offset from filename
+
+    Requests wait on limiter, and throttled requests are retried after the
+    limiter's backoff delay.
+    """
+    url = base_url + filename
+    headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+    for attempt in range(1, max_attempts + 1):
+        await limiter.acquire_async()
+        throttled = True
+        try:
+            async with session.get(url, headers=headers) as r:
+                throttled = r.status in THROTTLE_STATUSES
+                if not throttled or attempt == max_attempts:
+                    r.raise_for_status()
+                    return await r.read()
+                logging.debug("Status %s fetching %s; retrying", r.status, url)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            throttled = True
+            if attempt == max_attempts:
+                raise
+            logging.debug("Error fetching %s: %s; retrying", url, e)
+        finally:
+            limiter.release(throttled)
+        await asyncio.sleep(limiter.backoff_delay(attempt))
+    raise AssertionError("Unreachable")
+
+
+async def _fetch_span(
+    session: aiohttp.ClientSession,
+    span: RangeSpan,
+    queue: "asyncio.Queue[Any]",
+    base_url: str,
+    limiter: AdaptiveLimiter,
+    cache: Optional[RangeCache],
+) -> None:
+    missing_rows = []
+    for row in span.rows:
+        content = None
+        if cache is not None:
+            content = cache.get(row["filename"], int(row["offset"]), int(row["length"]))
+        if content is None:
+            missing_rows.append(row)
+        else:
+            await queue.put((row, content))
+    if not missing_rows:
+        return
+    # Only fetch the part of the span covering the missing rows
+    if len(missing_rows) < len(span.rows):
+        start = min(int(row["offset"]) for row in missing_rows)
+        end = max(int(row["offset"]) + int(row["length"]) for row in missing_rows)
+        span = RangeSpan(span.filename, start, end, missing_rows)
+    content = await fetch_range(
+        session,
+        span.filename,
+        span.start,
+        span.end - span.start,
+        base_url,
+        limiter,
+    )
+    for row, row_content in split_span(span, content):
+        if cache is not None:
+            cache.put(
+                row["filename"], int(row["offset"]), int(row["length"]), row_content
+            )
+        await queue.put((row, row_content))
+
+
+async def _fetch_worker(
+    session: aiohttp.ClientSession,
+    spans: Iterator[RangeSpan],
+    queue: "asyncio.Queue[Any]",
+    base_url: str,
+    limiter: AdaptiveLimiter,
+    cache: Optional[RangeCache],
+) -> None:
+    # The iterator is shared between workers; this is safe since next is
+    # only called between awaits on a single thread.
+    for span in spans:
+        await _fetch_span(session, span, queue, base_url, limiter, cache)
+
+
+async def _fetch_spans(
+    spans: Iterable[RangeSpan],
+    queue: "asyncio.Queue[Any]",
+    concurrency: int,
+    base_url: str,
+    limiter: AdaptiveLimiter,
+    cache: Optional[RangeCache],
+) -> None:
+    span_iter = iter(spans)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            workers = [
+                asyncio.ensure_future(
+                    _fetch_worker(session, span_iter, queue, base_url, limiter, cache)
+                )
+                for _ in range(concurrency)
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except Exception:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(_DONE)
+
+
+def fetch_all_spans(
+    spans: Iterable[RangeSpan],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    base_url: str = CC_DATA_URL,
+    limiter: AdaptiveLimiter = CC_DATA_LIMITER,
+    cache: Optional[RangeCache] = None,
+) -> Generator[Tuple[CrawlResultDict, bytes], None, None]:
+    """Fetch each span, yielding (row, content) for its rows as they arrive
+
+    At most concurrency requests are in flight at once, fewer if the limiter
+    has found the server cannot handle that many.
+    Results are yielded in completion order, not the order of spans.
+    Rows found in cache are not fetched, and fetched rows are added to it.
+    """
+    loop = asyncio.new_event_loop()
+    task: Optional["asyncio.Task[None]"] = None
+    try:
+        # Bounded so a slow consumer applies backpressure to the fetchers
+        queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=concurrency)
+        task = loop.create_task(
+            _fetch_spans(spans, queue, concurrency, base_url, limiter, cache)
+        )
+        while True:
+            item = loop.run_until_complete(queue.get())
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        loop.run_until_complete(task)
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+        loop.close()
+
+
+def fetch_all_ranges(
+    rows: Iterable[CrawlResultDict],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    base_url: str = CC_DATA_URL,
+    max_gap: Optional[int] = DEFAULT_MAX_GAP,
+    max_span: int = DEFAULT_MAX_SPAN,
+    presorted: bool = False,
+    limiter: AdaptiveLimiter = CC_DATA_LIMITER,
+    cache: Optional[RangeCache] = None,
+) -> Generator[Tuple[CrawlResultDict, bytes], None, None]:
+    """Fetch the WARC content for each row, yielding (row, content) as they arrive
+
+    Nearby rows are coalesced into single requests; see coalesce_ranges.
+    If rows are presorted by (filename, offset) they are planned lazily
+    rather than read into memory.
+    """
+    spans: Iterable[RangeSpan]
+    if presorted:
+        spans = coalesce_ranges(rows, max_gap, max_span)
+    else:
+        spans = plan_ranges(rows, max_gap, max_span)
+        logging.debug(
+            "Fetching %d records in %d requests",
+            sum(len(s.rows) for s in spans),
+            len(spans),
+        )
+    return fetch_all_spans(spans, concurrency, base_url, limiter, cache)
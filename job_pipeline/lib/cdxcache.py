@@ -0,0 +1,181 @@
+"""Persistent on-disk cache of Common Crawl CDX index queries
+
+Crawl indexes are only published on the index server once the crawl is
+complete and never change afterwards, so a page that has been fetched once
+never needs to be queried again.
+Rows are written to SQLite as each page arrives and read back in
+(filename, offset) order, so a query result is never held in memory.
+"""
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Generator, List, Optional, Set
+
+from job_pipeline.lib.cc import (
+    DEFAULT_FILTERS,
+    CrawlResultDict,
+    cdx_num_pages,
+    cdx_query_page,
+)
+from job_pipeline.lib.io import pathlike
+
+DEFAULT_CDX_NTHREAD = 4
+
+NumPagesFunction = Callable[[str, str, Optional[List[str]]], int]
+QueryPageFunction = Callable[
+    [str, str, int, Optional[List[str]]], List[CrawlResultDict]
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS num_pages (
+    api TEXT, query TEXT, filters TEXT, pages INTEGER,
+    PRIMARY KEY (api, query, filters)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    api TEXT, query TEXT, filters TEXT, page INTEGER, num_rows INTEGER,
+    PRIMARY KEY (api, query, filters, page)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    api TEXT, query TEXT, filters TEXT, page INTEGER,
+    filename TEXT, offset INTEGER, data TEXT
+);
+CREATE INDEX IF NOT EXISTS rows_by_location
+    ON rows (api, query, filters, filename, offset);
+"""
+
+
+class CdxResults:
+    """Rows of a cached CDX query, iterated in (filename, offset) order"""
+
+    def __init__(self, cache: "CdxCache", api: str, query: str, filters: str):
+        self.cache = cache
+        self.key = (api, query, filters)
+
+    def __len__(self) -> int:
+        (count,) = self.cache.db.execute(
+            "SELECT coalesce(sum(num_rows), 0) FROM pages "
+            "WHERE api = ? AND query = ? AND filters = ?",
+            self.key,
+        ).fetchone()
+        return count
+
+    def __iter__(self) -> Generator[CrawlResultDict, None, None]:
+        cursor = self.cache.db.execute(
+            "SELECT data FROM rows WHERE api = ? AND query = ? AND filters = ? "
+            "ORDER BY filename, offset",
+            self.key,
+        )
+        for (data,) in cursor:
+            yield json.loads(data)
+
+
+class CdxCache:
+    """SQLite cache of CDX query pages keyed by (api, query, filters, page)"""
+
+    def __init__(self, path: pathlike):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "CdxCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def num_pages(
+        self,
+        api: str,
+        query: str,
+        filters: List[str],
+        num_pages_fn: NumPagesFunction = cdx_num_pages,
+    ) -> int:
+        key = (api, query, json.dumps(filters))
+        row = self.db.execute(
+            "SELECT pages FROM num_pages WHERE api = ? AND query = ? AND filters = ?",
+            key,
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        pages = num_pages_fn(api, query, filters)
+        with self.db:
+            self.db.execute("INSERT INTO num_pages VALUES (?, ?, ?, ?)", (*key, pages))
+        return pages
+
+    def cached_pages(self, api: str, query: str, filters: List[str]) -> Set[int]:
+        cursor = self.db.execute(
+            "SELECT page FROM pages WHERE api = ? AND query = ? AND filters = ?",
+            (api, query, json.dumps(filters)),
+        )
+        return {page for (page,) in cursor}
+
+    def add_page(
+        self,
+        api: str,
+        query: str,
+        filters: List[str],
+        page: int,
+        rows: List[CrawlResultDict],
+    ) -> None:
+        key = (api, query, json.dumps(filters), page)
+        # Rows and the page marker are committed together, so an interrupted
+        # query never leaves a partial page
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (*key, row["filename"], int(row["offset"]), json.dumps(row))
+                    for row in rows
+                ),
+            )
+            self.db.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?)", (*key, len(rows))
+            )
+
+    def query(
+        self,
+        api: str,
+        query: str,
+        filters: Optional[List[str]] = None,
+        nthread: int = DEFAULT_CDX_NTHREAD,
+        num_pages_fn: NumPagesFunction = cdx_num_pages,
+        page_fn: QueryPageFunction = cdx_query_page,
+    ) -> CdxResults:
+        """Equivalent of lib.cc.cdx_query that only fetches uncached pages
+
+        Missing pages are fetched with up to nthread requests in parallel.
+        """
+        filters = DEFAULT_FILTERS + (filters or [])
+        num_pages = self.num_pages(api, query, filters, num_pages_fn)
+        missing_pages = sorted(
+            set(range(num_pages)) - self.cached_pages(api, query, filters)
+        )
+        if missing_pages:
+            logging.info(
+                "Querying %d of %d pages for %s on %s",
+                len(missing_pages),
+                num_pages,
+                query,
+                api,
+            )
+        with ThreadPoolExecutor(nthread) as executor:
+            futures = {
+                executor.submit(page_fn, api, query, page, filters): page
+                for page in missing_pages
+            }
+            # SQLite connections belong to one thread; write from this one.
+            # Keep every page that succeeded so a retry only fetches failures.
+            error: Optional[BaseException] = None
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                self.add_page(api, query, filters, futures[future], future.result())
+        if error is not None:
+            raise error
+        return CdxResults(self, api, query, json.dumps(filters))
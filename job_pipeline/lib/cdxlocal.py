@@ -0,0 +1,210 @@
+"""CDX queries against a local mirror of the Common Crawl index
+
+The index of each crawl is a set of sorted cdx-NNNNN.gz shards, each a
+sequence of gzip members (blocks) of a few thousand lines, and a cluster.idx
+listing the first key and location of every block.
+A query binary searches cluster.idx for the SURT key of the url and only
+decompresses the blocks that can contain it, so no block is read from disk
+unless it is needed.
+
+The functions mirror cdx_num_pages, cdx_query_page and cdx_query in lib.cc,
+with each block as one page, so they can be passed to CdxCache.query.
+Their api is the local indexes directory of a crawl; see local_cdx_api.
+"""
+import json
+import logging
+import mmap
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Generator, List, Optional, Tuple
+
+from job_pipeline.lib.cc import DEFAULT_FILTERS, CrawlResultDict
+from job_pipeline.lib.io import pathlike
+
+CLUSTER_INDEX_NAME = "cluster.idx"
+
+# Alternative names pywb accepts for CDX fields in filters
+CDX_FIELD_ALIASES = {
+    "statuscode": "status",
+    "mimetype": "mime",
+    "original": "url",
+}
+
+# Location of a block of a CDX shard: (shard, offset, length)
+CdxBlock = Tuple[str, int, int]
+
+
+def local_cdx_api(root: pathlike, api: str) -> str:
+    """Indexes directory for a crawl's CDX API url in a mirror of data.commoncrawl.org
+
+    For example https://index.commoncrawl.org/CC-MAIN-2022-05-index maps to
+    root/cc-index/collections/CC-MAIN-2022-05/indexes
+    """
+    crawl = api.rstrip("/").rsplit("/", 1)[-1]
+    if crawl.endswith("-index"):
+        crawl = crawl[: -len("-index")]
+    return str(Path(root) / "cc-index" / "collections" / crawl / "indexes")
+
+
+def surt_key(query: str) -> str:
+    """SURT key of a url query; a trailing * is a prefix query
+
+    Like the CDX server the scheme and a leading www are dropped and the url
+    is lowercased, so www.seek.com.au/job/* becomes au,com,seek)/job/
+    Exact queries end with a space, matching the separator before the
+    timestamp in the index.
+    """
+    prefix = query.endswith("*")
+    url = query.rstrip("*").lower()
+    url = re.sub(r"^[a-z]+://", "", url)
+    host, _, path = url.partition("/")
+    host = re.sub(r"^www\d*\.", "", host.split(":")[0])
+    assert not host.startswith("*"), "Domain queries are not supported"
+    key = ",".join(reversed(host.split("."))) + ")/" + path
+    return key if prefix else key + " "
+
+
+def _line_start(index: mmap.mmap, lo: int, pos: int) -> int:
+    """Start of the line containing pos, where a line starts at lo"""
+    return index.rfind(b"\n", lo, pos) + 1 or lo
+
+
+def _bisect_lines(index: mmap.mmap, key: bytes) -> int:
+    """Position of the first line of sorted index that is not less than key"""
+    lo, hi = 0, len(index)
+    while lo < hi:
+        start = _line_start(index, lo, (lo + hi) // 2)
+        end = index.find(b"\n", start)
+        end = len(index) if end == -1 else end
+        if index[start:end] < key:
+            lo = end + 1
+        else:
+            hi = start
+    return lo
+
+
+@lru_cache(maxsize=64)
+def cluster_blocks(api: str, key: str) -> List[CdxBlock]:
+    """Blocks of the shards in api that may contain lines starting with key"""
+    start_key = key.encode("utf-8")
+    # No UTF-8 encoded key contains \xff, so this bounds every key with prefix
+    end_key = start_key + b"\xff"
+    with open(Path(api) / CLUSTER_INDEX_NAME, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as index:
+        start = _bisect_lines(index, start_key)
+        # The block before the first greater key can contain matching lines
+        if start > 0:
+            start = _line_start(index, 0, start - 1)
+        end = _bisect_lines(index, end_key)
+        lines = index[start:end].splitlines()
+    blocks = []
+    for line in lines:
+        _key, shard, offset, length = line.decode("utf-8").split("\t")[:4]
+        blocks.append((shard, int(offset), int(length)))
+    return blocks
+
+
+def read_block(api: str, block: CdxBlock) -> List[bytes]:
+    """Decompress the lines of a CDX block"""
+    shard, offset, length = block
+    with open(Path(api) / shard, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS).splitlines()
+
+
+def parse_cdx_line(line: bytes) -> CrawlResultDict:
+    """The row of a CDX line, with fields not every line has as empty strings
+
+    Fields of the line that CrawlResultDict doesn't declare are dropped.
+    """
+    urlkey, timestamp, data = line.decode("utf-8").split(" ", 2)
+    fields = json.loads(data)
+    row: CrawlResultDict = {
+        "urlkey": urlkey,
+        "timestamp": timestamp,
+        "mime": fields.get("mime", ""),
+        "status": fields["status"],
+        "offset": fields["offset"],
+        "filename": fields["filename"],
+        "mime-detected": fields.get("mime-detected", ""),
+        "digest": fields["digest"],
+        "redirect": fields.get("redirect", ""),
+        "url": fields["url"],
+        "length": fields["length"],
+    }
+    return row
+
+
+def cdx_filter(filter_string: str) -> Callable[[CrawlResultDict, str], bool]:
+    """Predicate on a row and its CDX line for a CDX server filter
+
+    The filter syntax follows pywb: a leading ! inverts the filter, then =
+    is an exact match, ~ a substring match and otherwise a regular expression
+    matched at the start of the value.
+    The value is the field before the first :, or the whole line if none.
+    """
+    invert = filter_string.startswith("!")
+    if invert:
+        filter_string = filter_string[1:]
+    mode = filter_string[:1] if filter_string[:1] in ("=", "~") else ""
+    filter_string = filter_string[len(mode) :]
+    field, sep, value = filter_string.partition(":")
+    if not sep:
+        field, value = "", filter_string
+    field = CDX_FIELD_ALIASES.get(field, field)
+
+    regex = re.compile(value) if mode == "" else None
+
+    def matches(text: str) -> bool:
+        if mode == "=":
+            return text == value
+        if mode == "~":
+            return value in text
+        assert regex is not None
+        return regex.match(text) is not None
+
+    def predicate(row: CrawlResultDict, line: str) -> bool:
+        text = row.get(field, "") if field else line
+        return matches(str(text)) != invert
+
+    return predicate
+
+
+def local_cdx_num_pages(
+    api: str, query: str, filters: Optional[List[str]] = None
+) -> int:
+    num_pages = len(cluster_blocks(api, surt_key(query)))
+    if num_pages == 0:
+        logging.warning("No results found for %s in %s", query, api)
+    return num_pages
+
+
+def local_cdx_query_page(
+    api: str, query: str, page: int = 0, filters: Optional[List[str]] = None
+) -> List[CrawlResultDict]:
+    key = surt_key(query).encode("utf-8")
+    predicates = [cdx_filter(f) for f in filters or []]
+    results = []
+    for line in read_block(api, cluster_blocks(api, surt_key(query))[page]):
+        if not line.startswith(key):
+            continue
+        row = parse_cdx_line(line)
+        text = line.decode("utf-8")
+        if all(predicate(row, text) for predicate in predicates):
+            results.append(row)
+    return results
+
+
+def local_cdx_query(
+    api: str, query: str, filters: Optional[List[str]] = None
+) -> Generator[CrawlResultDict, None, None]:
+    filters = DEFAULT_FILTERS + (filters or [])
+    num_pages = local_cdx_num_pages(api, query, filters)
+    for page in range(num_pages):
+        logging.debug(f"Querying page {page} of {num_pages} for {query} on {api}")
+        for result in local_cdx_query_page(api, query, page, filters):
+            yield result
@@ -0,0 +1,148 @@
+"""Index of the payload digests of downloaded Common Crawl records
+
+The same page is often captured unchanged in several crawls, and these
+captures share a CDX digest.
+Recording the digest of every downloaded record lets later captures of the
+same payload be stored as a reference instead of being downloaded again.
+References are not extracted, so this drops those captures from the output
+along with their URI and view date.
+"""
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+from job_pipeline.lib.cc import CrawlResultDict, cdx_row_key
+from job_pipeline.lib.io import pathlike
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetched (
+    digest TEXT PRIMARY KEY, source TEXT, key TEXT, url TEXT, timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS fetched_by_source ON fetched (source);
+CREATE TABLE IF NOT EXISTS refs (
+    source TEXT, key TEXT, url TEXT, timestamp TEXT, digest TEXT,
+    ref_source TEXT, ref_key TEXT
+);
+CREATE INDEX IF NOT EXISTS refs_by_source ON refs (source);
+"""
+
+
+class DigestIndex:
+    """Digests of records downloaded across all sources of a datasource
+
+    Each digest is owned by the first source to download it; later rows with
+    the same digest are stored as references to that record.
+    """
+
+    def __init__(self, path: pathlike):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(_SCHEMA)
+        # Digests claimed by rows that are being downloaded: digest -> key
+        self.pending: Dict[str, str] = {}
+        self.source: Optional[str] = None
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "DigestIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def prune(self, sources: Iterable[str]) -> None:
+        """Remove all entries for sources other than those given"""
+        sources = set(sources)
+        with self.db:
+            for table in ("fetched", "refs"):
+                indexed = {
+                    source
+                    for (source,) in self.db.execute(
+                        f"SELECT DISTINCT source FROM {table}"
+                    )
+                }
+                self.db.executemany(
+                    f"DELETE FROM {table} WHERE source = ?",
+                    ((source,) for source in indexed - sources),
+                )
+
+    def start_source(self, source: str, done: Set[str]) -> None:
+        """Start downloading source where the records with keys done are kept
+
+        Entries of source for any other records are discarded.
+        """
+        self.source = source
+        self.pending = {}
+        stale_keys = [
+            (key,)
+            for (key,) in self.db.execute(
+                "SELECT key FROM fetched WHERE source = ?", (source,)
+            )
+            if key not in done
+        ]
+        with self.db:
+            self.db.executemany("DELETE FROM fetched WHERE key = ?", stale_keys)
+            self.db.execute("DELETE FROM refs WHERE source = ?", (source,))
+
+    def claim(self, row: CrawlResultDict) -> bool:
+        """Claim row's digest for the current source
+
+        Returns False, recording a reference, if the digest is already
+        downloaded or being downloaded; otherwise the row should be fetched
+        and then passed to add.
+        """
+        assert self.source is not None, "Call start_source first"
+        digest = row.get("digest")
+        if not digest:
+            return True
+        if digest in self.pending:
+            ref_source, ref_key = self.source, self.pending[digest]
+        else:
+            original = self.db.execute(
+                "SELECT source, key FROM fetched WHERE digest = ?", (digest,)
+            ).fetchone()
+            if original is None:
+                self.pending[digest] = cdx_row_key(row)
+                return True
+            ref_source, ref_key = original
+        with self.db:
+            self.db.execute(
+                "INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.source,
+                    cdx_row_key(row),
+                    row.get("url"),
+                    row.get("timestamp"),
+                    digest,
+                    ref_source,
+                    ref_key,
+                ),
+            )
+        return False
+
+    def add(self, row: CrawlResultDict) -> None:
+        """Record that row has been downloaded for the current source"""
+        digest = row.get("digest")
+        if not digest:
+            return
+        with self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO fetched VALUES (?, ?, ?, ?, ?)",
+                (
+                    digest,
+                    self.source,
+                    cdx_row_key(row),
+                    row.get("url"),
+                    row.get("timestamp"),
+                ),
+            )
+        self.pending.pop(digest, None)
+
+    def num_references(self, source: str) -> int:
+        (count,) = self.db.execute(
+            "SELECT count(*) FROM refs WHERE source = ?", (source,)
+        ).fetchone()
+        return count
@@ -0,0 +1,191 @@
+"""Limits on the size of records and the time spent extracting each
+
+A few crawled pages are enormous or malformed, and can take minutes to
+parse. Records over a size limit are not extracted, and extraction of a
+record is abandoned when it exceeds a time budget, so a single page can't
+stall extraction.
+Records that aren't extracted are listed in a quarantine file alongside the
+output with their size and the time spent, so they can be looked at or
+extracted separately later.
+
+Time budgets use SIGALRM, so they're only enforced on Unix in the main thread
+of a process, which is where extraction workers run.
+"""
+import json
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from job_pipeline.lib.io import pathlike
+
+# JSON lines, without a .jsonl extension that would make it look like data
+QUARANTINE_SUFFIX = ".quarantine"
+
+DEFAULT_MAX_RECORD_SIZE = 8 * 1024**2
+DEFAULT_RECORD_TIME_BUDGET = 60.0
+
+# Outcomes of extracting a record
+EXTRACTED = "extracted"
+# Not extracted because of the HTTP status or Content-Type of the response
+FILTERED = "filtered"
+# Not extracted because of the content of the record; see prefilter_markers
+SKIPPED = "skipped"
+OVERSIZED = "oversized"
+TIMED_OUT = "timed_out"
+
+
+class TimeBudgetExceeded(BaseException):
+    """Raised by the alarm of time_limit
+
+    A BaseException so that an extractor's own `except Exception` handlers
+    can't swallow it and carry on past the time budget.
+    """
+
+
+class RecordOutcome(NamedTuple):
+    uri: str
+    view_date: str
+    size: int
+    seconds: float
+    status: str
+    data: List[Dict[Any, Any]]
+
+
+def quarantine_path(output_path: pathlike) -> Path:
+    return Path(str(output_path) + QUARANTINE_SUFFIX)
+
+
+def _raise_time_budget_exceeded(signum, frame):
+    raise TimeBudgetExceeded()
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Generator[None, None, None]:
+    """Raise TimeBudgetExceeded in the block if it takes more than seconds
+
+    Not enforced if seconds is None or outside the main thread.
+    """
+    if (
+        seconds is None
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_time_budget_exceeded)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def guarded_extract(
+    extract: Callable[[Any], List[Dict[Any, Any]]],
+    record: Any,
+    uri: str,
+    view_date: str,
+    size: int,
+    max_size: Optional[int],
+    time_budget: Optional[float],
+) -> RecordOutcome:
+    """Extract record of size bytes unless it's too large or too slow"""
+    if max_size is not None and size > max_size:
+        return RecordOutcome(uri, view_date, size, 0.0, OVERSIZED, [])
+    start = time.perf_counter()
+    try:
+        with time_limit(time_budget):
+            data = extract(record)
+    except TimeBudgetExceeded:
+        seconds = time.perf_counter() - start
+        return RecordOutcome(uri, view_date, size, seconds, TIMED_OUT, [])
+    seconds = time.perf_counter() - start
+    return RecordOutcome(uri, view_date, size, seconds, EXTRACTED, data)
+
+
+class ExtractStats:
+    """Counts and timings of the records extracted to an output
+
+    Records that weren't extracted because they were oversized or timed out
+    are written to the quarantine file of the output, if there is one, and
+    their URIs and view dates are kept in quarantined.
+    """
+
+    def __init__(self, output_path: Optional[pathlike] = None, append: bool = False):
+        self.counts = {
+            EXTRACTED: 0,
+            FILTERED: 0,
+            SKIPPED: 0,
+            OVERSIZED: 0,
+            TIMED_OUT: 0,
+        }
+        self.seconds = 0.0
+        self.slowest: Optional[RecordOutcome] = None
+        self.quarantined: List[Tuple[str, str]] = []
+        self.quarantine_path: Optional[Path] = None
+        self._quarantine: Optional[IO[str]] = None
+        if output_path is not None:
+            self.quarantine_path = quarantine_path(output_path)
+            if not append and self.quarantine_path.exists():
+                self.quarantine_path.unlink()
+
+    def add(self, outcome: RecordOutcome) -> List[Dict[Any, Any]]:
+        """Record the outcome of a record, returning its data"""
+        self.counts[outcome.status] += 1
+        self.seconds += outcome.seconds
+        if self.slowest is None or outcome.seconds > self.slowest.seconds:
+            self.slowest = outcome
+        if outcome.status in (OVERSIZED, TIMED_OUT):
+            self.quarantined.append((outcome.uri, outcome.view_date))
+            logging.warning(
+                "Quarantined %s record %s of %d bytes after %.1fs",
+                outcome.status,
+                outcome.uri,
+                outcome.size,
+                outcome.seconds,
+            )
+            if self.quarantine_path is not None:
+                if self._quarantine is None:
+                    self._quarantine = open(self.quarantine_path, "a")
+                entry = outcome._asdict()
+                del entry["data"]
+                self._quarantine.write(json.dumps(entry) + "\n")
+                self._quarantine.flush()
+        return outcome.data
+
+    def close(self) -> None:
+        if self._quarantine is not None:
+            self._quarantine.close()
+            self._quarantine = None
+
+    def log(self) -> None:
+        num_quarantined = self.counts[OVERSIZED] + self.counts[TIMED_OUT]
+        logging.info(
+            "Extracted %d records in %.1fs; quarantined %d oversized and "
+            "%d timed out records",
+            self.counts[EXTRACTED],
+            self.seconds,
+            self.counts[OVERSIZED],
+            self.counts[TIMED_OUT],
+        )
+        if self.slowest is not None and self.slowest.seconds > 0:
+            logging.info(
+                "Slowest record %s took %.1fs", self.slowest.uri, self.slowest.seconds
+            )
+        if num_quarantined and self.quarantine_path is not None:
+            logging.info("Quarantined records are listed in %s", self.quarantine_path)
@@ -1,56 +1,112 @@
+"""Extracting objects embedded in the scripts of a page
+
+Pages such as Seek and Gumtree assign their data to a variable as a large
+JavaScript object literal, e.g. `REDUX_DATA = {...};`.
+The object is almost always valid JSON, or JSON with undefined values, so it
+is decoded with the json module where possible, and only parsed as JavaScript
+with demjson when that fails.
+The page can be UTF-8 bytes, in which case only the part from the object on
+is decoded.
+See scripts/bench_extractlib.py for timings.
+"""
 import json
 import logging
-from typing import Any, Dict, Optional
+import re
+from typing import Any, Dict, Iterable, Match, Optional, Tuple, Union
 
 import demjson
 
+# Strings, quoted with " or ', and braces; everything else is skipped.
+# A lone quote is an unterminated string.
+_BRACE_TOKENS = re.compile(
+    r"""
+    "[^"\\]*(?:\\.[^"\\]*)*"
+  | '[^'\\]*(?:\\.[^'\\]*)*'
+  | (?P<brace>[{}])
+  | (?P<quote>["'])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_UNDEFINED_TOKENS = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"|(?P<undefined>\bundefined\b)', re.DOTALL
+)
+_OBJECT_START = re.compile(r"\s*\{")
+_JSON_DECODER = json.JSONDecoder()
+
 
 class ParseError(Exception):
     pass
 
 
-def extract_braces(text: str) -> str:
+def find_braces(text: str, pos: int = 0) -> Tuple[int, int]:
+    """Bounds (start, end) of the first balanced braces in text at or after pos
+
+    Braces inside quoted strings are ignored.
+    """
     depth = 0
-    inquote = False
-    escape = False
     start = None
-    for idx, char in enumerate(text):
-        if escape:
-            escape = False
-            continue
-        if char == '"':
+    for match in _BRACE_TOKENS.finditer(text, pos):
+        brace = match.group("brace")
+        if brace is None:
+            if match.group("quote") is not None:
+                raise ParseError("Unterminated string")
             if start is None:
                 raise ParseError("Unexpected quote")
-            inquote = not inquote
-        if char == "\\":
-            escape = True
-        if (not inquote) and char == "{":
+        elif brace == "{":
             if start is None:
-                start = idx
+                start = match.start()
             depth += 1
-        if (not inquote) and char == "}":
+        else:
             if start is None:
                 raise ParseError("Unexpected close brace")
             depth -= 1
-            if depth <= 0:
-                break
-    else:
-        raise ParseError("Unexpected end of stream")
-    return text[start : idx + 1]
+            if depth == 0:
+                return start, match.end()
+    raise ParseError("Unexpected end of stream")
 
 
-def parse_js_obj(text: str, init: str) -> Optional[Dict[Any, Any]]:
-    idx = text.find(init)
-    if idx < 0:
-        return None
+def extract_braces(text: str) -> str:
+    start, end = find_braces(text)
+    return text[start:end]
+
+
+def _undefined_token_to_null(match: Match) -> str:
+    return "null" if match.group("undefined") else match.group(0)
+
+
+def parse_js_obj(
+    text: Union[str, bytes], init: Union[str, bytes]
+) -> Optional[Dict[Any, Any]]:
+    """Parse the object following the first occurrence of init in text"""
+    if isinstance(text, bytes):
+        init_bytes = init.encode("utf-8") if isinstance(init, str) else init
+        idx = text.find(init_bytes)
+        if idx < 0:
+            return None
+        # Decode the rest of the page without copying the bytes first
+        text = str(memoryview(text)[idx + len(init_bytes) :], "utf-8")
+        idx = 0
+    else:
+        assert isinstance(init, str)
+        idx = text.find(init)
+        if idx < 0:
+            return None
+        idx += len(init)
+    obj_start = _OBJECT_START.match(text, idx)
+    if obj_start is not None:
+        try:
+            return _JSON_DECODER.raw_decode(text, obj_start.end() - 1)[0]
+        except json.decoder.JSONDecodeError:
+            pass
     try:
-        match_text = extract_braces(text[idx:])
+        start, end = find_braces(text, idx)
     except ParseError as e:
         logging.warning("Error parsing object: %s", e)
         return None
+    match_text = text[start:end]
     try:
         # 20x faster
-        data = json.loads(match_text)
+        data = json.loads(_UNDEFINED_TOKENS.sub(_undefined_token_to_null, match_text))
     except json.decoder.JSONDecodeError:
         logging.debug("Defaulting to demjson")
         data = demjson.decode(match_text)
@@ -58,6 +114,39 @@ def parse_js_obj(text: str, init: str) -> Optional[Dict[Any, Any]]:
     return data
 
 
+def project_fields(data: Any, paths: Iterable[str]) -> Any:
+    """Only the parts of data at the given dotted paths, e.g. advertiser.name
+
+    A path through a list applies the rest of the path to each item.
+    Paths missing from data are left out.
+    """
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+            if node is None:
+                break
+        else:
+            node[leaf] = None
+    return _project(data, tree)
+
+
+def _project(data: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [_project(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: _project(data[key], subtree)
+        for key, subtree in tree.items()
+        if key in data
+    }
+
+
 def undefined_to_none(dj):
     if isinstance(dj, dict):
         return {k: undefined_to_none(v) for k, v in dj.items()}
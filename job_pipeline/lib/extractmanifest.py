@@ -0,0 +1,78 @@
+"""Manifest of the records extracted to an output file
+
+The manifest alongside an output (see manifest_path) records the version of
+the extract implementation that wrote it, the fields it kept and the filters
+that chose which records to extract, the keys of every record that has been
+extracted to it, whether or not it gave any data, and the size of the output
+when it was written.
+Extraction can then add only the records that aren't in the manifest to an
+existing output, and redo it when the extract version, fields or filters
+change.
+Quarantined records (see lib.extractguard) are listed separately with the
+limits they exceeded, and are tried again once the limits change.
+An output whose size doesn't match its manifest was changed outside
+extraction and has no usable manifest.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from job_pipeline.lib.io import AtomicFileWriter, pathlike
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+class ExtractManifest(NamedTuple):
+    extract_version: int
+    output_size: int
+    records: List[str]
+    # Fields of the data kept by extract, or None for all of it
+    extract_fields: Optional[List[str]] = None
+    # Settings deciding which records are extracted, as JSON; records they
+    # rejected are listed in records too
+    extract_filters: Optional[Dict[str, Any]] = None
+    # Keys of records that weren't extracted because they exceeded the limits
+    quarantined: List[str] = []
+    # Limits on the size of records and the time spent extracting each, as JSON
+    extract_limits: Optional[Dict[str, Any]] = None
+
+
+def manifest_path(output_path: pathlike) -> Path:
+    return Path(str(output_path) + MANIFEST_SUFFIX)
+
+
+def read_manifest(output_path: pathlike) -> Optional[ExtractManifest]:
+    """The manifest of output_path, or None if it is missing or out of date"""
+    try:
+        with open(manifest_path(output_path), "r", encoding="utf-8") as f:
+            manifest = ExtractManifest(**json.load(f))
+        output_size = os.path.getsize(output_path)
+    except FileNotFoundError:
+        return None
+    if manifest.output_size != output_size:
+        return None
+    return manifest
+
+
+def write_manifest(
+    output_path: pathlike,
+    extract_version: int,
+    records: List[str],
+    extract_fields: Optional[List[str]] = None,
+    extract_filters: Optional[Dict[str, Any]] = None,
+    quarantined: Optional[List[str]] = None,
+    extract_limits: Optional[Dict[str, Any]] = None,
+):
+    """Write the manifest of output_path, which must be completely written"""
+    manifest = ExtractManifest(
+        extract_version,
+        os.path.getsize(output_path),
+        sorted(records),
+        extract_fields,
+        extract_filters,
+        sorted(quarantined or []),
+        extract_limits,
+    )
+    with AtomicFileWriter(manifest_path(output_path), "w") as f:
+        json.dump(manifest._asdict(), f)
@@ -0,0 +1,326 @@
+"""Offline geocoding against an in-memory gazetteer
+
+An alternative to the Placeholder service for normalise.Geocoder (see
+normalise.set_gazetteer) that needs no server and answers in microseconds.
+The gazetteer is a CSV of places with columns id, parent_id, name, placetype
+and alt_names (separated by |), which can be built from a Who's on First
+SQLite distribution with read_wof_sqlite, for example of Australia and New
+Zealand; ids are Who's on First ids, so results match Placeholder's.
+
+Text is split into comma separated parts, and each part into the longest
+runs of tokens that name a place. Of the places named, the one with the
+most other parts of the text among its ancestors is chosen, preferring
+places named earlier in the text and then more specific placetypes, as in
+"Carlton, VIC 3053".
+Names are matched ignoring case, accents and punctuation; languages other
+than that of the gazetteer aren't supported.
+"""
+import csv
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from job_pipeline.lib.io import pathlike
+from job_pipeline.lib.normalised import LOCATION_PLACETYPES
+
+GAZETTEER_FIELDS = ["id", "parent_id", "name", "placetype", "alt_names"]
+WOF_COUNTRIES = ("AU", "NZ")
+
+# Outcomes of comparing geocoders on a location
+SAME = "same"
+DIFFERENT = "different"
+REFERENCE_ONLY = "reference_only"
+CANDIDATE_ONLY = "candidate_only"
+NEITHER = "neither"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+Tokens = Tuple[str, ...]
+
+
+class Place(NamedTuple):
+    id: int
+    parent_id: Optional[int]
+    name: str
+    placetype: str
+    alt_names: Tuple[str, ...] = ()
+
+
+def tokenize(text: str) -> Tokens:
+    """Lower case tokens of text without accents or punctuation"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return tuple(_TOKEN_RE.findall(text))
+
+
+class Gazetteer:
+    """Index of places by the tokens of their names"""
+
+    def __init__(self, places: Iterable[Place]):
+        self.places: Dict[int, Place] = {place.id: place for place in places}
+        self._names: Dict[Tokens, List[int]] = {}
+        # Every leading run of tokens of a name, to stop matching early
+        self._prefixes: Set[Tokens] = set()
+        for place in self.places.values():
+            for name in (place.name, *place.alt_names):
+                tokens = tokenize(name)
+                if not tokens:
+                    continue
+                ids = self._names.setdefault(tokens, [])
+                if place.id not in ids:
+                    ids.append(place.id)
+                for end in range(1, len(tokens)):
+                    self._prefixes.add(tokens[:end])
+        self._lineages: Dict[int, List[Place]] = {}
+
+    @classmethod
+    def from_csv(cls, path: pathlike) -> "Gazetteer":
+        return cls(read_gazetteer(path))
+
+    def lineage(self, place_id: int) -> List[Place]:
+        """The place and its ancestors, from the place up"""
+        lineage = self._lineages.get(place_id)
+        if lineage is None:
+            lineage = []
+            seen: Set[int] = set()
+            next_id: Optional[int] = place_id
+            while next_id is not None and next_id in self.places:
+                if next_id in seen:
+                    break
+                seen.add(next_id)
+                place = self.places[next_id]
+                lineage.append(place)
+                next_id = place.parent_id
+            self._lineages[place_id] = lineage
+        return lineage
+
+    def match(self, text: str) -> List[List[int]]:
+        """The ids of the places named by each run of tokens of text"""
+        matches = []
+        for part in text.split(","):
+            tokens = tokenize(part)
+            start = 0
+            while start < len(tokens):
+                longest = None
+                end = start + 1
+                while end <= len(tokens):
+                    run = tokens[start:end]
+                    if run in self._names:
+                        longest = end
+                    if run not in self._prefixes:
+                        break
+                    end += 1
+                if longest is None:
+                    start += 1
+                else:
+                    matches.append(self._names[tokens[start:longest]])
+                    start = longest
+        return matches
+
+    def search(
+        self, text: str, filter_country_ids: Optional[Iterable[int]] = None
+    ) -> Optional[Place]:
+        """The place best matching text, in one of the countries if given"""
+        matches = self.match(text)
+        countries = set(filter_country_ids) if filter_country_ids else None
+        best = None
+        best_key: Tuple[int, int, int] = (-1, 0, 0)
+        for index, ids in enumerate(matches):
+            for place_id in ids:
+                lineage = self.lineage(place_id)
+                ancestors = {place.id for place in lineage[1:]}
+                if countries is not None and not any(
+                    place.placetype == "country" and place.id in countries
+                    for place in lineage
+                ):
+                    continue
+                score = sum(
+                    1
+                    for other_index, other_ids in enumerate(matches)
+                    if other_index != index and ancestors.intersection(other_ids)
+                )
+                key = (score, -index, _granularity(lineage[0].placetype))
+                if key > best_key:
+                    best, best_key = lineage[0], key
+        return best
+
+    def geocode(
+        self, text: str, filter_country_ids: Optional[Iterable[int]] = None
+    ) -> Dict[str, Any]:
+        """Fields of the place best matching text, as from Geocoder.geocode"""
+        place = self.search(text, filter_country_ids)
+        if place is None:
+            return {}
+        return {
+            "loc_id": place.id,
+            **{
+                "loc_" + ancestor.placetype: ancestor.name
+                for ancestor in self.lineage(place.id)
+            },
+        }
+
+
+def _granularity(placetype: str) -> int:
+    try:
+        return LOCATION_PLACETYPES.index(placetype)
+    except ValueError:
+        return -1
+
+
+def read_gazetteer(path: pathlike) -> List[Place]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [
+            Place(
+                int(row["id"]),
+                int(row["parent_id"]) if row["parent_id"] else None,
+                row["name"],
+                row["placetype"],
+                tuple(name for name in row.get("alt_names", "").split("|") if name),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def write_gazetteer(path: pathlike, places: Iterable[Place]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(GAZETTEER_FIELDS)
+        for place in places:
+            writer.writerow(
+                [
+                    place.id,
+                    "" if place.parent_id is None else place.parent_id,
+                    place.name,
+                    place.placetype,
+                    "|".join(place.alt_names),
+                ]
+            )
+
+
+def read_wof_sqlite(
+    path: pathlike, countries: Iterable[str] = WOF_COUNTRIES
+) -> List[Place]:
+    """Current places of the placetypes Placeholder uses in countries
+
+    path is a Who's on First SQLite distribution, with the spr and names
+    tables. The ancestors of the places outside countries, such as their
+    continent, are included so lineages are complete, as in Placeholder.
+    Alternative names are English and unknown language names, and
+    abbreviations of the place from its properties when the distribution
+    includes the geojson table.
+    """
+    db = sqlite3.connect(str(path))
+    try:
+        countries = list(countries)
+        placetypes = list(LOCATION_PLACETYPES)
+        wanted = (
+            f"placetype IN ({','.join('?' * len(placetypes))}) "
+            "AND is_current != 0 AND is_deprecated = 0 AND is_superseded = 0"
+        )
+        rows = db.execute(
+            "SELECT id, parent_id, name, placetype FROM spr "
+            f"WHERE country IN ({','.join('?' * len(countries))}) AND {wanted}",
+            countries + placetypes,
+        ).fetchall()
+        seen = {row[0] for row in rows}
+        ancestors = rows
+        while ancestors:
+            parent_ids = list(
+                {
+                    parent_id
+                    for _, parent_id, _, _ in ancestors
+                    if parent_id and parent_id > 0
+                }
+                - seen
+            )
+            if not parent_ids:
+                break
+            seen.update(parent_ids)
+            ancestors = db.execute(
+                "SELECT id, parent_id, name, placetype FROM spr "
+                f"WHERE id IN ({','.join('?' * len(parent_ids))}) AND {wanted}",
+                parent_ids + placetypes,
+            ).fetchall()
+            rows.extend(ancestors)
+        alt_names: Dict[int, List[str]] = {}
+        for place_id, name in db.execute(
+            "SELECT id, name FROM names WHERE language IN ('eng', 'unk')"
+        ):
+            alt_names.setdefault(place_id, []).append(name)
+        has_geojson = db.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name = 'geojson'"
+        ).fetchone()[0]
+        if has_geojson:
+            for place_id, abbreviation in db.execute(
+                "SELECT id, json_extract(body, '$.properties.\"wof:abbreviation\"') "
+                "FROM geojson"
+            ):
+                if abbreviation:
+                    alt_names.setdefault(place_id, []).append(abbreviation)
+    finally:
+        db.close()
+    places = []
+    for place_id, parent_id, name, placetype in rows:
+        names = [
+            alt_name
+            for alt_name in dict.fromkeys(alt_names.get(place_id, []))
+            if alt_name != name
+        ]
+        places.append(
+            Place(
+                place_id,
+                parent_id if parent_id and parent_id > 0 else None,
+                name,
+                placetype,
+                tuple(names),
+            )
+        )
+    return places
+
+
+def compare_geocoders(
+    locations: Iterable[str],
+    reference: Callable[[str], Dict[str, Any]],
+    candidate: Callable[[str], Dict[str, Any]],
+) -> Counter:
+    """Count how the results of two geocoders compare on locations
+
+    Results are the same when they have the same loc_id and names of the
+    place and its ancestors (the loc_* fields), or both are empty.
+    """
+    outcomes: Counter = Counter()
+    for location in locations:
+        expected = _location_fields(reference(location))
+        actual = _location_fields(candidate(location))
+        if not expected and not actual:
+            outcomes[NEITHER] += 1
+        elif not actual:
+            outcomes[REFERENCE_ONLY] += 1
+        elif not expected:
+            outcomes[CANDIDATE_ONLY] += 1
+        elif expected == actual:
+            outcomes[SAME] += 1
+        else:
+            outcomes[DIFFERENT] += 1
+    return outcomes
+
+
+def _location_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in result.items() if key.startswith("loc_")}
+
+
+def agreement_rate(outcomes: Counter) -> float:
+    total = sum(outcomes.values())
+    return (outcomes[SAME] + outcomes[NEITHER]) / total if total else 0.0
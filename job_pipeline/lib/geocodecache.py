@@ -0,0 +1,201 @@
+"""Persistent on-disk cache of geocoding results
+
+Job ads repeat the same few thousand location strings, so geocoding results
+are kept in SQLite across runs and shared by every process using the same
+file; see normalise.set_geocode_cache.
+Entries expire after a time to live, so changes to the gazetteer are picked
+up eventually, and the oldest entries are evicted when there are more than a
+maximum number.
+
+Hit and miss counts are kept in the database too, so lookups made by worker
+processes are included in the statistics of a run. Each process adds its
+counts at least every STATS_INTERVAL lookups, on every miss, on close and
+when a worker process exits normally.
+"""
+import json
+import os
+import sqlite3
+import time
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Any, Dict, Iterator, MutableMapping, Optional, Tuple
+
+from job_pipeline.lib.io import pathlike
+
+DEFAULT_GEOCODE_CACHE_ENTRIES = 1_000_000
+DEFAULT_GEOCODE_CACHE_TTL = 90 * 24 * 60 * 60.0
+
+# Number of insertions between checks of the size of the cache
+EVICT_INTERVAL = 1000
+STATS_INTERVAL = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    key TEXT PRIMARY KEY, result TEXT, created REAL
+);
+CREATE INDEX IF NOT EXISTS geocodes_by_created ON geocodes (created);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER);
+INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0);
+"""
+
+
+class GeocodeCache(MutableMapping[Tuple, Dict[str, Any]]):
+    """SQLite mapping of geocode keys to results
+
+    Keys are tuples of JSON values, with lists as tuples. The cache can be
+    passed to other processes, which open their own connection to the file.
+    """
+
+    def __init__(
+        self,
+        path: pathlike,
+        max_entries: int = DEFAULT_GEOCODE_CACHE_ENTRIES,
+        ttl: Optional[float] = DEFAULT_GEOCODE_CACHE_TTL,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._unsaved_hits = 0
+        self._unsaved_misses = 0
+        self._inserts = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._evict()
+        self._start_stats = self.saved_stats()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # A connection can't be used from a forked process; open another
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(str(self.path), timeout=60)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            with self._db:
+                self._db.executescript(_SCHEMA)
+            if self._pid is not None:
+                # Opened in a worker process; save its counts when it exits
+                Finalize(self, self.save_stats, exitpriority=10)
+            self._pid = os.getpid()
+            self._unsaved_hits = 0
+            self._unsaved_misses = 0
+        return self._db
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_db"] = None
+        return state
+
+    def close(self) -> None:
+        if self._db is not None and self._pid == os.getpid():
+            self.save_stats()
+            self._db.close()
+        self._db = None
+
+    def __enter__(self) -> "GeocodeCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def _expiry(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def __getitem__(self, key: Tuple) -> Dict[str, Any]:
+        row = self.db.execute(
+            "SELECT result FROM geocodes WHERE key = ? AND created >= ?",
+            (json.dumps(key), self._expiry()),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            self._unsaved_misses += 1
+            self.save_stats()
+            raise KeyError(key)
+        self.hits += 1
+        self._unsaved_hits += 1
+        if self._unsaved_hits >= STATS_INTERVAL:
+            self.save_stats()
+        return json.loads(row[0])
+
+    def __setitem__(self, key: Tuple, result: Dict[str, Any]) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?)",
+                (json.dumps(key), json.dumps(result), time.time()),
+            )
+        self._inserts += 1
+        if self._inserts % EVICT_INTERVAL == 0:
+            self._evict()
+
+    def __delitem__(self, key: Tuple) -> None:
+        with self.db:
+            cursor = self.db.execute(
+                "DELETE FROM geocodes WHERE key = ?", (json.dumps(key),)
+            )
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        cursor = self.db.execute(
+            "SELECT key FROM geocodes WHERE created >= ?", (self._expiry(),)
+        )
+        for (key,) in cursor:
+            yield tuple(
+                tuple(value) if isinstance(value, list) else value
+                for value in json.loads(key)
+            )
+
+    def __len__(self) -> int:
+        (count,) = self.db.execute(
+            "SELECT count(*) FROM geocodes WHERE created >= ?", (self._expiry(),)
+        ).fetchone()
+        return count
+
+    def _evict(self) -> None:
+        """Delete expired entries, then the oldest beyond max_entries"""
+        with self.db:
+            self.db.execute("DELETE FROM geocodes WHERE created < ?", (self._expiry(),))
+            (count,) = self.db.execute("SELECT count(*) FROM geocodes").fetchone()
+            if count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM geocodes WHERE key IN "
+                    "(SELECT key FROM geocodes ORDER BY created LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def save_stats(self) -> None:
+        """Add the lookups of this process since the last save to the database"""
+        if not (self._unsaved_hits or self._unsaved_misses):
+            return
+        with self.db:
+            self.db.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'hits'",
+                (self._unsaved_hits,),
+            )
+            self.db.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'misses'",
+                (self._unsaved_misses,),
+            )
+        self._unsaved_hits = 0
+        self._unsaved_misses = 0
+
+    def saved_stats(self) -> Tuple[int, int]:
+        """Hits and misses of every process using the cache"""
+        stats = dict(self.db.execute("SELECT name, value FROM stats"))
+        return stats["hits"], stats["misses"]
+
+    def run_stats(self) -> Tuple[int, int]:
+        """Hits and misses of every process since this cache was opened"""
+        self.save_stats()
+        hits, misses = self.saved_stats()
+        return hits - self._start_stats[0], misses - self._start_stats[1]
+
+    def __repr__(self) -> str:
+        hits, misses = self.run_stats()
+        hit_rate = hits / (hits + misses) if hits + misses else 0.0
+        return (
+            f"GeocodeCache(path={str(self.path)!r}, hits={hits}, "
+            f"misses={misses}, hit_rate={hit_rate:.1%})"
+        )
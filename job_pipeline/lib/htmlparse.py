@@ -0,0 +1,347 @@
+"""Parsing HTML pages for extraction with CSS selectors
+
+Datasources extract from the tree returned by parse_html with the subset of
+the BeautifulSoup interface implemented by LxmlNode: select, select_one,
+get_text, next_siblings and str for the HTML of an element.
+
+The html5lib backend is BeautifulSoup with html5lib, which repairs broken
+markup exactly as a browser would but is very slow. It is the default.
+The lxml backend is many times faster, and opt in.
+It decodes pages like html5lib and adjusts the tree where libxml2 repairs
+common mistakes differently, such as content misplaced in tables.
+Other mistakes libxml2 can't be made to repair like html5lib, since it has
+already dropped or moved the tags: end tags without a matching start tag
+(as in <p>a<div>b</div>c</p>), a heading inside another heading, and a
+paragraph inside inline elements (as in <span>a<p>b</span>c). Pages with
+any of these are parsed with html5lib instead, so both backends extract the
+same data, but pages with other badly broken markup can still give
+different trees.
+"""
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple, Union
+
+import bs4
+import webencodings
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EncodingDetector
+from lxml import etree
+from lxml.cssselect import CSSSelector
+
+HTML_PARSERS: Tuple[str, ...] = ("lxml", "html5lib")
+DEFAULT_HTML_PARSER = "html5lib"
+
+# Void elements and multi valued attributes as BeautifulSoup defines them
+_SOUP_BUILDER = HTMLTreeBuilder()
+# Bytes at the start of a page html5lib searches for a meta charset
+_META_CHARSET_BYTES = 1024
+# Encoding html5lib decodes a page with when nothing else declares one
+_DEFAULT_ENCODING = "windows-1252"
+# Elements html5lib closes when another of them starts inside
+_HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+# Inline elements whose end tag html5lib ignores while a paragraph in them is
+# open, where libxml2 closes both
+_PHRASING_TAGS = (
+    "a",
+    "abbr",
+    "b",
+    "big",
+    "cite",
+    "code",
+    "em",
+    "font",
+    "i",
+    "label",
+    "nobr",
+    "s",
+    "small",
+    "span",
+    "strike",
+    "strong",
+    "sub",
+    "sup",
+    "tt",
+    "u",
+)
+# Elements whose text BeautifulSoup does not escape
+_CDATA_TAGS = {"script", "style"}
+# Elements that can't have content in HTML5, though libxml2 may nest some
+_VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "keygen",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+# Elements html5lib drops a leading newline from
+_LEADING_NEWLINE_TAGS = {"pre", "textarea", "listing"}
+# Children html5lib keeps in each part of a table; it moves anything else,
+# and any text that isn't whitespace, in front of the table
+_TABLE_CHILDREN = {
+    "table": {"caption", "colgroup", "col", "thead", "tbody", "tfoot", "tr", "form"},
+    "thead": {"tr"},
+    "tbody": {"tr"},
+    "tfoot": {"tr"},
+    "tr": {"td", "th"},
+}
+_TABLE_ANYWHERE = {"script", "style", "template"}
+# Children of a table that end an implied tbody
+_TABLE_SECTIONS = {"caption", "colgroup", "col", "thead", "tbody", "tfoot"}
+
+
+def declared_encoding(html: bytes) -> Optional[webencodings.Encoding]:
+    """The encoding declared by a meta element at the start of a page
+
+    As in html5lib, a declared UTF-16 page is decoded as UTF-8, since its meta
+    element couldn't have been read as ASCII otherwise.
+    """
+    label = EncodingDetector.find_declared_encoding(
+        html[:_META_CHARSET_BYTES], is_html=True
+    )
+    encoding = webencodings.lookup(label) if label else None
+    if encoding is not None and encoding.name in ("utf-16be", "utf-16le"):
+        encoding = webencodings.lookup("utf-8")
+    return encoding
+
+
+def decode_html(html: Union[bytes, str]) -> str:
+    """Decode a page with the encoding html5lib would detect
+
+    That is the encoding of a byte order mark, then of a meta element, then
+    windows-1252.
+    """
+    if isinstance(html, str):
+        return html
+    encoding = declared_encoding(html) or _DEFAULT_ENCODING
+    return webencodings.decode(html, encoding, "replace")[0]
+
+
+def _add_text_before(element: etree._Element, text: str) -> None:
+    previous = element.getprevious()
+    if previous is not None:
+        previous.tail = (previous.tail or "") + text
+    else:
+        parent = element.getparent()
+        assert parent is not None
+        parent.text = (parent.text or "") + text
+
+
+def _foster_parent(table: etree._Element, part: etree._Element) -> None:
+    """Move content misplaced in part of table in front of table"""
+    if part.text and part.text.strip():
+        _add_text_before(table, part.text)
+        part.text = None
+    for child in list(part):
+        allowed = (
+            isinstance(child, etree._Comment)
+            or child.tag in _TABLE_ANYWHERE
+            or child.tag in _TABLE_CHILDREN[part.tag]
+        )
+        if allowed:
+            if child.tag in _TABLE_CHILDREN:
+                _foster_parent(table, child)
+            if child.tail and child.tail.strip():
+                _add_text_before(table, child.tail)
+                child.tail = None
+            continue
+        tail, child.tail = child.tail, None
+        if tail and not tail.strip():
+            # Whitespace stays where it is
+            _add_text_before(child, tail)
+            tail = None
+        table.addprevious(child)
+        if tail:
+            _add_text_before(table, tail)
+
+
+def _insert_implied_tbody(table: etree._Element) -> None:
+    tbody = None
+    for child in list(table):
+        if child.tag == "tr":
+            if tbody is None:
+                tbody = etree.Element("tbody")
+                child.addprevious(tbody)
+            # Whitespace after the row moves with it, as in html5lib
+            tbody.append(child)
+        elif child.tag in _TABLE_SECTIONS:
+            tbody = None
+        elif tbody is not None and isinstance(child, etree._Comment):
+            tbody.append(child)
+
+
+def _empty_void_element(element: etree._Element) -> None:
+    """Move anything inside a void element to after it"""
+    children = list(element)
+    tail = element.tail or ""
+    element.tail, element.text = element.text, None
+    last = element
+    for child in children:
+        last.addnext(child)
+        last = child
+    last.tail = (last.tail or "") + tail
+
+
+def repair_tree(root: etree._Element) -> None:
+    """Change how libxml2 repaired markup to how html5lib would have"""
+    for table in list(root.iter("table")):
+        _foster_parent(table, table)
+        _insert_implied_tbody(table)
+    for element in list(root.iter(*_VOID_TAGS)):
+        if element.text or len(element):
+            _empty_void_element(element)
+    for element in root.iter(*_LEADING_NEWLINE_TAGS):
+        if element.text and element.text.startswith("\n"):
+            element.text = element.text[1:]
+
+
+@lru_cache(maxsize=None)
+def _css_selector(selector: str) -> CSSSelector:
+    return CSSSelector(selector, translator="html")
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _quote_attribute(value: str) -> str:
+    value = _escape(value)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+
+def _attribute_value(tag: str, name: str, value: str) -> str:
+    list_attributes = _SOUP_BUILDER.cdata_list_attributes
+    if name in list_attributes.get("*", ()) or name in list_attributes.get(tag, ()):
+        return " ".join(value.split())
+    return value
+
+
+def _serialise(element: etree._Element, out: List[str]) -> None:
+    """Write the HTML of element as str of a BeautifulSoup Tag does"""
+    if isinstance(element, etree._Comment):
+        out.append(f"<!--{element.text or ''}-->")
+    elif isinstance(element, etree._ProcessingInstruction):
+        # html5lib parses processing instructions as comments
+        out.append(f"<!--?{element.target} {element.text or ''}-->")
+    else:
+        tag = element.tag
+        out.append("<" + tag)
+        for name, value in sorted(element.attrib.items()):
+            value = _attribute_value(tag, name, value)
+            out.append(f" {name}={_quote_attribute(value)}")
+        if (
+            not element.text
+            and len(element) == 0
+            and _SOUP_BUILDER.can_be_empty_element(tag)
+        ):
+            out.append("/>")
+            return
+        out.append(">")
+        escape = tag not in _CDATA_TAGS
+        if element.text:
+            out.append(_escape(element.text) if escape else element.text)
+        for child in element:
+            _serialise(child, out)
+            if child.tail:
+                out.append(_escape(child.tail) if escape else child.tail)
+        out.append(f"</{tag}>")
+
+
+class LxmlNode:
+    """An lxml element with the part of the BeautifulSoup Tag interface
+    used by datasources"""
+
+    __slots__ = ("element",)
+
+    def __init__(self, element: etree._Element):
+        self.element = element
+
+    def _select(self, selector: str) -> Iterator["LxmlNode"]:
+        # Like BeautifulSoup only match descendants, not the element itself
+        for element in _css_selector(selector)(self.element):
+            if element is not self.element:
+                yield LxmlNode(element)
+
+    def select(self, selector: str) -> List["LxmlNode"]:
+        return list(self._select(selector))
+
+    def select_one(self, selector: str) -> Optional["LxmlNode"]:
+        return next(self._select(selector), None)
+
+    def get_text(self) -> str:
+        return "".join(self.element.itertext())
+
+    @property
+    def next_siblings(self) -> Iterator[Union[str, "LxmlNode"]]:
+        """Following strings and elements; comments are strings of their text"""
+        if self.element.tail:
+            yield self.element.tail
+        for sibling in self.element.itersiblings():
+            if isinstance(sibling, (etree._Comment, etree._ProcessingInstruction)):
+                yield sibling.text or ""
+            else:
+                yield LxmlNode(sibling)
+            if sibling.tail:
+                yield sibling.tail
+
+    def __str__(self) -> str:
+        out: List[str] = []
+        _serialise(self.element, out)
+        return "".join(out)
+
+    def __repr__(self) -> str:
+        return f"LxmlNode({self.element!r})"
+
+
+def repairable(root: etree._Element, parser: etree.HTMLParser) -> bool:
+    """Whether repair_tree can make the tree of a page match html5lib's"""
+    if any(error.type_name == "ERR_TAG_NAME_MISMATCH" for error in parser.error_log):
+        return False
+    for heading in root.iter(*_HEADING_TAGS):
+        if next(heading.iterdescendants(*_HEADING_TAGS), None) is not None:
+            return False
+    for paragraph in root.iter("p"):
+        if next(paragraph.iterancestors(*_PHRASING_TAGS), None) is not None:
+            return False
+    return True
+
+
+# A parsed page from either backend
+HtmlNode = Union[LxmlNode, bs4.BeautifulSoup]
+
+
+def parse_lxml(html: Union[bytes, str]) -> HtmlNode:
+    """Parse with lxml, or html5lib if libxml2 repaired the page differently"""
+    # html5lib drops null characters from text
+    text = decode_html(html).replace("\x00", "")
+    parser = etree.HTMLParser(encoding="utf-8")
+    root = etree.fromstring(text.encode("utf-8"), parser)
+    if root is None:
+        root = etree.Element("html")
+    elif not repairable(root, parser):
+        return bs4.BeautifulSoup(html, "html5lib")
+    repair_tree(root)
+    return LxmlNode(root)
+
+
+def parse_html(html: Union[bytes, str], parser: str = DEFAULT_HTML_PARSER) -> HtmlNode:
+    if parser == "lxml":
+        return parse_lxml(html)
+    elif parser == "html5lib":
+        return bs4.BeautifulSoup(html, "html5lib")
+    else:
+        raise ValueError(
+            f"Unknown HTML parser {parser}; expected one of {HTML_PARSERS}"
+        )
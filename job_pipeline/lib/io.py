@@ -34,3 +34,82 @@ class AtomicFileWriter:
                 self.filehandle.close()
             finally:
                 os.unlink(self.temp_filename)
+
+
+class ResumableFileWriter:
+    """Appends to a file that is moved to filename only on successful completion
+
+    Unlike AtomicFileWriter the temporary file is kept on failure, alongside a
+    journal of the keys of the items completely written to it (see commit).
+    Reopening the same filename truncates any partially written item and
+    resumes from the last committed one; done holds the committed keys.
+
+    If resume is False any previous partial output is discarded, and the
+    temporary file is removed on failure.
+    """
+
+    def __init__(
+        self,
+        filename: pathlike,
+        resume: bool = True,
+        temp_filename: typing.Optional[pathlike] = None,
+    ):
+        self.filename = filename
+        self.resume = resume
+        if temp_filename is None:
+            self.temp_filename = str(filename) + ".tmp"
+        else:
+            self.temp_filename = str(temp_filename)
+        self.journal_filename = self.temp_filename + ".journal"
+        self.done: typing.Set[str] = set()
+
+    def _read_journal(self) -> int:
+        """Read committed keys from the journal, returning the committed size
+
+        The journal is truncated to its last complete entry, so later entries
+        aren't appended to a partially written one.
+        """
+        size = 0
+        if not os.path.exists(self.journal_filename):
+            return size
+        complete = 0
+        with open(self.journal_filename, "rb") as journal:
+            for line in journal:
+                # A crash can leave a partially written final line
+                if not line.endswith(b"\n"):
+                    break
+                key, _, position = line.decode("utf-8").rstrip("\n").rpartition("\t")
+                self.done.add(key)
+                size = int(position)
+                complete += len(line)
+        os.truncate(self.journal_filename, complete)
+        return size
+
+    def __enter__(self):
+        size = self._read_journal() if self.resume else 0
+        if size == 0:
+            self.done = set()
+        self.filehandle = open(self.temp_filename, "ab")
+        self.filehandle.truncate(size)
+        self.filehandle.seek(size)
+        self.journal = open(self.journal_filename, "a" if size else "w")
+        return self
+
+    def commit(self, key: str) -> None:
+        """Record that everything written so far completes the item key"""
+        self.filehandle.flush()
+        self.journal.write(f"{key}\t{self.filehandle.tell()}\n")
+        self.journal.flush()
+        self.done.add(key)
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        try:
+            self.filehandle.close()
+        finally:
+            self.journal.close()
+        if exc_type is None:
+            os.replace(self.temp_filename, self.filename)
+            os.unlink(self.journal_filename)
+        elif not self.resume:
+            os.unlink(self.temp_filename)
+            os.unlink(self.journal_filename)
@@ -1,11 +1,28 @@
-import functools
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from multiprocessing import Manager
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
 
 import mistletoe
 import requests
 from bs4 import BeautifulSoup
 from html2text import HTML2Text
+from requests.adapters import HTTPAdapter
+
+from job_pipeline.lib.gazetteer import Gazetteer
+from job_pipeline.lib.geocodecache import GeocodeCache
+from job_pipeline.lib.parallel import chunked
 
 
 def datetime_from_iso_utc(t):
@@ -53,8 +70,65 @@ WOF_AUS = 85632793
 WOF_NZ = 85633345
 
 
+GeocodeKey = Tuple[str, str, Any, Any]
+
+# Maximum number of concurrent requests to Placeholder when resolving deferred
+# geocodes, and the number of records they are resolved for at a time
+DEFAULT_GEOCODE_CONCURRENCY = 8
+DEFAULT_GEOCODE_BATCH_SIZE = 1024
+# Field of a normalised record holding the key of a deferred geocode
+DEFERRED_GEOCODE_FIELD = "_deferred_geocode"
+
+# Results of Geocoder.geocode shared by every Geocoder in the process; an
+# in-memory dict unless a persistent GeocodeCache is set
+_GEOCODE_CACHE: MutableMapping[GeocodeKey, Dict[str, Any]] = {}
+_DEFER_GEOCODING = False
+# Offline gazetteer used by Geocoder instead of Placeholder, if set
+_GAZETTEER: Optional[Gazetteer] = None
+_SESSION: Optional[requests.Session] = None
+_SESSION_PID: Optional[int] = None
+
+
+def geocode_cache() -> MutableMapping[GeocodeKey, Dict[str, Any]]:
+    return _GEOCODE_CACHE
+
+
+def set_geocode_cache(cache: MutableMapping[GeocodeKey, Dict[str, Any]]) -> None:
+    """Use cache for the results of Geocoder.geocode in this process"""
+    global _GEOCODE_CACHE
+    _GEOCODE_CACHE = cache
+
+
+@contextmanager
+def shared_geocode_cache() -> (
+    Generator[MutableMapping[GeocodeKey, Dict[str, Any]], None, None]
+):
+    """A geocode cache that can be shared with worker processes
+
+    Pass it to set_geocode_cache in each worker. A GeocodeCache is shared
+    through its database; otherwise this is a copy of the cache, and results
+    found by any worker are added back to the cache of this process on exit.
+    """
+    if isinstance(_GEOCODE_CACHE, GeocodeCache):
+        yield _GEOCODE_CACHE
+        return
+    with Manager() as manager:
+        cache = manager.dict(_GEOCODE_CACHE)
+        try:
+            yield cache
+        finally:
+            _GEOCODE_CACHE.update(cache.items())
+
+
 class Geocoder:
-    """Wrapper around Placeholder geocoder"""
+    """Wrapper around Placeholder geocoder
+
+    When a gazetteer is set (see set_gazetteer) it is used instead of
+    Placeholder, without caching or deferring; lang is ignored.
+    While geocoding is deferred (see deferred_geocoding) results that aren't
+    cached are looked up later by resolve_deferred_geocodes, so the result of
+    geocode must only be merged into a normalised record.
+    """
 
     def __init__(
         self,
@@ -66,28 +140,128 @@ class Geocoder:
         self.lang = lang
         self.filter_country_ids = filter_country_ids
 
-    @functools.lru_cache(maxsize=128)
     def geocode(self, loc, lang=None, filter_country_ids=None):
         lang = lang or self.lang
         filter_country_ids = filter_country_ids or self.filter_country_ids
-        params = {"text": loc}
-        if lang:
-            params["lang"] = lang
-
-        r = requests.get(self.uri, params=params)
-        r.raise_for_status()
-        places = r.json()
-        for place in places:
-            for l in place["lineage"]:
-                if (not filter_country_ids) or (
-                    "country" in l and l["country"]["id"] in filter_country_ids
-                ):
-                    return {
-                        "loc_id": place["id"],
-                        **{"loc_" + key: value["name"] for key, value in l.items()},
-                    }
-        # Fail
-        return {}
+        if filter_country_ids:
+            filter_country_ids = tuple(filter_country_ids)
+        if _GAZETTEER is not None:
+            return _GAZETTEER.geocode(loc, filter_country_ids)
+        key = (self.uri, loc, lang, filter_country_ids)
+        result = _GEOCODE_CACHE.get(key)
+        if result is None:
+            if _DEFER_GEOCODING:
+                return {DEFERRED_GEOCODE_FIELD: key}
+            result = placeholder_geocode(key)
+            _GEOCODE_CACHE[key] = result
+        # Callers may add to the result
+        return dict(result)
+
+
+def geocode_session() -> requests.Session:
+    """A session for Placeholder requests, reusing connections in this process"""
+    global _SESSION, _SESSION_PID
+    if _SESSION is None or _SESSION_PID != os.getpid():
+        _SESSION = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=DEFAULT_GEOCODE_CONCURRENCY)
+        _SESSION.mount("http://", adapter)
+        _SESSION.mount("https://", adapter)
+        _SESSION_PID = os.getpid()
+    return _SESSION
+
+
+def placeholder_geocode(key: GeocodeKey) -> Dict[str, Any]:
+    """Look up a key of the geocode cache on the Placeholder server"""
+    uri, loc, lang, filter_country_ids = key
+    params = {"text": loc}
+    if lang:
+        params["lang"] = lang
+
+    r = geocode_session().get(uri, params=params)
+    r.raise_for_status()
+    places = r.json()
+    for place in places:
+        for l in place["lineage"]:
+            if (not filter_country_ids) or (
+                "country" in l and l["country"]["id"] in filter_country_ids
+            ):
+                return {
+                    "loc_id": place["id"],
+                    **{"loc_" + key: value["name"] for key, value in l.items()},
+                }
+    # Fail
+    return {}
+
+
+def set_geocoding_deferred(deferred: bool) -> None:
+    global _DEFER_GEOCODING
+    _DEFER_GEOCODING = deferred
+
+
+def gazetteer() -> Optional[Gazetteer]:
+    return _GAZETTEER
+
+
+def set_gazetteer(gazetteer: Optional[Gazetteer]) -> None:
+    """Geocode with gazetteer in this process, or Placeholder if None"""
+    global _GAZETTEER
+    _GAZETTEER = gazetteer
+
+
+def init_geocoding(
+    cache: MutableMapping[GeocodeKey, Dict[str, Any]],
+    deferred: bool,
+    gazetteer: Optional[Gazetteer] = None,
+) -> None:
+    """Set up geocoding in a worker process"""
+    set_geocode_cache(cache)
+    set_geocoding_deferred(deferred)
+    set_gazetteer(gazetteer)
+
+
+@contextmanager
+def deferred_geocoding() -> Generator[None, None, None]:
+    """Defer uncached lookups of Geocoder.geocode in this process"""
+    previous = _DEFER_GEOCODING
+    set_geocoding_deferred(True)
+    try:
+        yield
+    finally:
+        set_geocoding_deferred(previous)
+
+
+def resolve_deferred_geocodes(
+    data: Iterable[Dict[str, Any]],
+    batch_size: int = DEFAULT_GEOCODE_BATCH_SIZE,
+    concurrency: int = DEFAULT_GEOCODE_CONCURRENCY,
+) -> Generator[Dict[str, Any], None, None]:
+    """Merge the results of deferred geocodes into data, in order
+
+    The distinct uncached locations of each batch of records are looked up
+    with up to concurrency requests at a time.
+    """
+    # Worker processes may not see results added to the cache by this one
+    # until they finish, and defer the same location again
+    results: Dict[GeocodeKey, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(concurrency) as executor:
+        for batch in chunked(data, batch_size):
+            missing = list(
+                {
+                    datum[DEFERRED_GEOCODE_FIELD]
+                    for datum in batch
+                    if DEFERRED_GEOCODE_FIELD in datum
+                }
+                - results.keys()
+            )
+            # The cache may only be usable from this thread; update it here
+            for key, result in zip(missing, executor.map(placeholder_geocode, missing)):
+                _GEOCODE_CACHE[key] = result
+                results[key] = result
+            for datum in batch:
+                key = datum.pop(DEFERRED_GEOCODE_FIELD, None)
+                if key is not None:
+                    datum.update(results[key])
+                yield datum
 
 
 def location_jsonld(data, default_country="AU"):
@@ -0,0 +1,92 @@
+"""Writing normalised data to Feather files in bounded memory
+
+Normalised records are converted to Arrow record batches of a fixed schema
+and written to the Feather (Arrow IPC file) format one batch at a time, so
+memory use depends on the batch size rather than the number of records.
+Every output has the same columns, with nulls for fields a datasource
+doesn't produce. Unlike the DataFrames written before:
+
+- fields that aren't in the schema are dropped, with a warning naming each
+  one; a datasource producing other fields extends normalised_schema
+- a source with no records gives a Feather file with no rows rather than
+  no file, so it isn't normalised again on the next run
+"""
+import logging
+from itertools import islice
+from typing import Any, Dict, Iterable, Set
+
+import pyarrow as pa
+
+from job_pipeline.lib.io import AtomicFileWriter, pathlike
+
+NORMALISE_BATCH_SIZE = 1024
+
+# Placetypes of Who's on First that Placeholder gives in a lineage
+LOCATION_PLACETYPES = [
+    "continent",
+    "empire",
+    "country",
+    "dependency",
+    "macroregion",
+    "region",
+    "macrocounty",
+    "county",
+    "localadmin",
+    "locality",
+    "borough",
+    "macrohood",
+    "neighbourhood",
+    "postalcode",
+]
+
+NORMALISED_SCHEMA = pa.schema(
+    [
+        ("title", pa.string()),
+        ("description", pa.string()),
+        ("uri", pa.string()),
+        ("view_date", pa.timestamp("us", tz="UTC")),
+        ("org", pa.string()),
+        ("salary_raw", pa.string()),
+        ("salary_min", pa.float64()),
+        ("salary_max", pa.float64()),
+        # Hours in the salary period; see lib.salary.Period
+        ("salary_hours", pa.float64()),
+        ("location_raw", pa.string()),
+        ("loc_id", pa.int64()),
+        *[("loc_" + placetype, pa.string()) for placetype in LOCATION_PLACETYPES],
+        ("processor", pa.string()),
+        ("source", pa.string()),
+    ]
+)
+
+
+def write_normalised(
+    path: pathlike,
+    data: Iterable[Dict[str, Any]],
+    schema: pa.Schema = NORMALISED_SCHEMA,
+    batch_size: int = NORMALISE_BATCH_SIZE,
+) -> int:
+    """Write data to a Feather file at path, returning the number of records
+
+    Fields that aren't in the schema are dropped with a warning.
+    """
+    names = set(schema.names)
+    unknown: Set[str] = set()
+    num_records = 0
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with AtomicFileWriter(path) as f:
+        with pa.ipc.new_file(f, schema, options=options) as writer:
+            iterator = iter(data)
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                for datum in batch:
+                    for field in datum.keys() - names - unknown:
+                        logging.warning(
+                            "Dropping unknown field %s from %s", field, path
+                        )
+                        unknown.add(field)
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                num_records += len(batch)
+    return num_records
@@ -0,0 +1,86 @@
+"""Process pools for CPU bound stages of the pipeline"""
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+# Function being mapped in a worker process
+_WORKER_FUNCTION: Optional[Callable[[Any], Any]] = None
+
+
+def _init_worker(
+    func: Callable[[Any], Any],
+    initializer: Optional[Callable[..., None]],
+    initargs: Tuple[Any, ...],
+) -> None:
+    global _WORKER_FUNCTION
+    _WORKER_FUNCTION = func
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _map_chunk(chunk: List[Any]) -> List[Any]:
+    assert _WORKER_FUNCTION is not None
+    return [_WORKER_FUNCTION(item) for item in chunk]
+
+
+def chunked(items: Iterable[T], size: int) -> Generator[List[T], None, None]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(
+    func: Callable[[T], U],
+    items: Iterable[T],
+    workers: int = 1,
+    chunksize: int = 1,
+    window: Optional[int] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+) -> Generator[U, None, None]:
+    """Map func over items in a pool of worker processes, preserving order
+
+    func is sent to each worker once, when it starts, rather than with every
+    item.
+    Unlike Pool.imap, items are consumed from the calling thread, so they can
+    come from generators holding thread bound resources such as SQLite
+    connections or event loops.
+    At most window chunks of chunksize items are in flight at once.
+    Each worker calls initializer(*initargs) when it starts.
+    With one worker func is applied in this process, without initializer.
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    if window is None:
+        window = 2 * workers
+    with Pool(
+        workers, initializer=_init_worker, initargs=(func, initializer, initargs)
+    ) as pool:
+        pending: Deque[Any] = deque()
+        for chunk in chunked(items, chunksize):
+            pending.append(pool.apply_async(_map_chunk, (chunk,)))
+            if len(pending) >= window:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+        # Let workers exit normally, running their exit handlers
+        pool.close()
+        pool.join()
@@ -0,0 +1,178 @@
+"""Local cache of byte ranges fetched from Common Crawl
+
+Ranges are appended to large pack files, with an SQLite index mapping
+(filename, offset, length) to a location in a pack, so caching millions of
+records doesn't create millions of files.
+When the cache exceeds its maximum size the least recently used packs are
+deleted whole; reading any range in a pack counts as using the pack.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from job_pipeline.lib.io import pathlike
+
+DEFAULT_CACHE_SIZE = 20 * 1024**3
+DEFAULT_PACK_SIZE = 256 * 1024**2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ranges (
+    filename TEXT, offset INTEGER, length INTEGER,
+    pack INTEGER, pack_offset INTEGER,
+    PRIMARY KEY (filename, offset, length)
+);
+CREATE INDEX IF NOT EXISTS ranges_by_pack ON ranges (pack);
+CREATE TABLE IF NOT EXISTS packs (
+    pack INTEGER PRIMARY KEY, size INTEGER, last_access REAL
+);
+"""
+
+
+class RangeCache:
+    """Size capped cache of byte ranges of remote files"""
+
+    def __init__(
+        self,
+        path: pathlike,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        pack_size: int = DEFAULT_PACK_SIZE,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.pack_size = pack_size
+        self.hits = 0
+        self.misses = 0
+        # Used from the fetching event loop and from threads calling fetch_cc
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(
+            str(self.path / "index.sqlite"), check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(_SCHEMA)
+        # Always start a new pack so packs are only ever appended by one writer
+        self._pack = self._reserve_pack()
+        self._pack_file: Optional[BinaryIO] = None
+        self._pack_offset = 0
+
+    def _reserve_pack(self) -> int:
+        """Record a new empty pack, so no other cache on the path writes to it"""
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO packs (size, last_access) VALUES (0, ?)", (time.time(),)
+            )
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
+
+    def _pack_path(self, pack: int) -> Path:
+        return self.path / f"pack-{pack:06d}.bin"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pack_file is not None:
+                self._pack_file.close()
+            else:
+                # Nothing was written to the reserved pack
+                with self.db:
+                    self.db.execute(
+                        "DELETE FROM packs WHERE pack = ? AND size = 0", (self._pack,)
+                    )
+            self.db.close()
+
+    def __enter__(self) -> "RangeCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def get(self, filename: str, offset: int, length: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self.db.execute(
+                "SELECT pack, pack_offset FROM ranges "
+                "WHERE filename = ? AND offset = ? AND length = ?",
+                (filename, offset, length),
+            ).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+            pack, pack_offset = entry
+            try:
+                with open(self._pack_path(pack), "rb") as f:
+                    f.seek(pack_offset)
+                    content = f.read(length)
+            except FileNotFoundError:
+                content = b""
+            if len(content) != length:
+                # Pack removed or truncated outside the cache
+                self.db.execute("DELETE FROM ranges WHERE pack = ?", (pack,))
+                self.db.commit()
+                self.misses += 1
+                return None
+            with self.db:
+                self.db.execute(
+                    "UPDATE packs SET last_access = ? WHERE pack = ?",
+                    (time.time(), pack),
+                )
+            self.hits += 1
+            return content
+
+    def put(self, filename: str, offset: int, length: int, content: bytes) -> None:
+        assert len(content) == length
+        with self._lock:
+            if self._pack_file is not None and self._pack_offset >= self.pack_size:
+                self._pack_file.close()
+                self._pack_file = None
+                self._pack = self._reserve_pack()
+            if self._pack_file is None:
+                self._pack_file = open(self._pack_path(self._pack), "ab")
+                self._pack_offset = self._pack_file.tell()
+            pack_offset = self._pack_offset
+            self._pack_file.write(content)
+            # Before indexing it, so other caches on the path can read it
+            self._pack_file.flush()
+            self._pack_offset += length
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?, ?)",
+                    (filename, offset, length, self._pack, pack_offset),
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO packs VALUES (?, ?, ?)",
+                    (self._pack, self._pack_offset, time.time()),
+                )
+            self._evict()
+
+    def size(self) -> int:
+        (size,) = self.db.execute("SELECT coalesce(sum(size), 0) FROM packs").fetchone()
+        return size
+
+    def _evict(self) -> None:
+        """Delete least recently used packs until the cache fits max_size"""
+        size = self.size()
+        if size <= self.max_size:
+            return
+        packs = self.db.execute(
+            "SELECT pack, size FROM packs WHERE pack != ? ORDER BY last_access",
+            (self._pack,),
+        ).fetchall()
+        for pack, pack_size in packs:
+            if size <= self.max_size:
+                break
+            with self.db:
+                self.db.execute("DELETE FROM ranges WHERE pack = ?", (pack,))
+                self.db.execute("DELETE FROM packs WHERE pack = ?", (pack,))
+            try:
+                os.unlink(self._pack_path(pack))
+            except FileNotFoundError:
+                pass
+            size -= pack_size
+
+    def __repr__(self) -> str:
+        return (
+            f"RangeCache(path={str(self.path)!r}, hits={self.hits}, "
+            f"misses={self.misses})"
+        )
@@ -0,0 +1,209 @@
+"""Adaptive limits on concurrent requests to a server
+
+Rather than each request backing off on its own, all requests to a server
+share one AdaptiveLimiter.
+It allows more requests in flight while they succeed (additive increase) and
+halves the limit when the server throttles them (multiplicative decrease),
+so the request rate settles just under what the server tolerates.
+Each retry of a request also waits an exponentially growing, jittered delay,
+so retries of many requests don't arrive at the server together.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import PreparedRequest
+from urllib3.util.retry import Retry
+
+# Responses indicating the server is overloaded
+THROTTLE_STATUSES: Set[int] = {429, 500, 502, 503, 504}
+DEFAULT_MAX_ATTEMPTS = 11
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the number of concurrent requests
+
+    The limit starts at initial and doubles each round trip (slow start) until
+    the first throttled request; after that it grows by about one per round
+    trip.
+    Each throttled request multiplies the limit by decrease, at most once per
+    cooldown seconds, and pauses all new requests for pause seconds.
+    Retries wait backoff_delay(attempt), which doubles from backoff seconds
+    up to max_backoff.
+    """
+
+    def __init__(
+        self,
+        initial: float = 16,
+        minimum: float = 1,
+        maximum: float = 512,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        pause: float = 1.0,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        assert minimum <= initial <= maximum
+        self._limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.pause = pause
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self.slow_start = True
+        self.successes = 0
+        self.throttles = 0
+        self._last_decrease = float("-inf")
+        self._paused_until = float("-inf")
+        self._condition = threading.Condition()
+        # Futures of acquire_async calls waiting for a release
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+
+    @property
+    def limit(self) -> int:
+        """Current maximum number of concurrent requests"""
+        return int(self._limit)
+
+    def _wait_time(self) -> float:
+        """Seconds until a request may start, or 0 if it can start now"""
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        if self.in_flight < self.limit:
+            return 0.0
+        # Wait for a release
+        return float("inf")
+
+    def try_acquire(self) -> Optional[float]:
+        """Start a request if allowed, otherwise return how long to wait"""
+        with self._condition:
+            wait = self._wait_time()
+            if wait == 0:
+                self.in_flight += 1
+                return None
+            return wait
+
+    def acquire(self) -> None:
+        """Block until a request may start"""
+        with self._condition:
+            while True:
+                wait = self._wait_time()
+                if wait == 0:
+                    self.in_flight += 1
+                    return
+                self._condition.wait(None if wait == float("inf") else wait)
+
+    async def acquire_async(self) -> None:
+        """Wait on the running event loop until a request may start"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                wait = self._wait_time()
+                if wait == 0:
+                    self.in_flight += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._waiters.add(waiter)
+            try:
+                await asyncio.wait(
+                    {waiter[1]}, timeout=None if wait == float("inf") else wait
+                )
+            finally:
+                with self._condition:
+                    self._waiters.discard(waiter)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after the given failed attempt
+
+        The delay is between half and all of backoff * 2 ** (attempt - 1),
+        capped at max_backoff.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def release(self, throttled: bool = False) -> None:
+        """Finish a request, recording whether the server throttled it"""
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttles += 1
+                self.slow_start = False
+                self._paused_until = now + self.pause
+                if now - self._last_decrease >= self.cooldown:
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.successes += 1
+                increase = 1.0 if self.slow_start else 1.0 / self._limit
+                self._limit = min(self.maximum, self._limit + increase)
+            self._condition.notify_all()
+            for loop, future in self._waiters:
+                loop.call_soon_threadsafe(_wake, future)
+
+    def __repr__(self) -> str:
+        return (
+            f"AdaptiveLimiter(limit={self.limit}, in_flight={self.in_flight}, "
+            f"successes={self.successes}, throttles={self.throttles})"
+        )
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveAdapter(HTTPAdapter):
+    """HTTPAdapter that limits and retries requests through an AdaptiveLimiter
+
+    Throttled responses and connection errors are retried up to max_attempts
+    times in total, after the limiter's backoff delay.
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        **kwargs,
+    ):
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        # Retries are handled here, not by urllib3
+        kwargs.setdefault("max_retries", Retry(total=0, read=False))
+        super().__init__(**kwargs)
+
+    def send(
+        self,
+        request: PreparedRequest,
+        stream: bool = False,
+        timeout: Union[None, float, Tuple[Optional[float], Optional[float]]] = None,
+        verify: Union[bool, str] = True,
+        cert: Union[None, str, Tuple[str, str]] = None,
+        proxies: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.acquire()
+            response = None
+            throttled = True
+            try:
+                response = super().send(request, stream, timeout, verify, cert, proxies)
+                throttled = response.status_code in THROTTLE_STATUSES
+            except requests.ConnectionError:
+                if attempt == self.max_attempts:
+                    raise
+            finally:
+                self.limiter.release(throttled)
+            if response is not None:
+                if not throttled or attempt == self.max_attempts:
+                    return response
+                response.close()
+            time.sleep(self.limiter.backoff_delay(attempt))
+        raise AssertionError("Unreachable")
@@ -0,0 +1,167 @@
+"""Reading and writing extracted data in a format chosen by file extension
+
+- .jsonl: one JSON object per line
+- .jsonl.zst: JSON lines compressed with zstandard; the file may be several
+  concatenated zstd frames
+- .arrow: an Arrow IPC stream of batches with a single column holding each
+  object as JSON, with the batches compressed with zstd
+
+JSON is encoded with orjson when it is installed, falling back to the json
+module, and .jsonl.zst needs zstandard. Either way NaN and infinities are
+written as null, since JSON has no representation of them.
+"""
+import json
+import math
+from io import BufferedReader
+from itertools import islice
+from pathlib import Path
+from types import ModuleType
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+import pyarrow as pa
+
+from job_pipeline.lib.io import AtomicFileWriter, pathlike
+
+orjson: Optional[ModuleType]
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+DATA_EXTENSIONS = (".jsonl", ".jsonl.zst", ".arrow")
+DEFAULT_DATA_EXTENSION = ".jsonl"
+
+ZSTD_LEVEL = 3
+ARROW_BATCH_SIZE = 1024
+_ARROW_SCHEMA = pa.schema([("json", pa.large_binary())])
+
+
+def dumps(datum: Any) -> bytes:
+    """Encode datum as a line of JSON
+
+    orjson writes non-ASCII characters as UTF-8 rather than escaping them and
+    has no spaces between items; both decode to the same data as json.dumps.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                datum, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            )
+        except TypeError:
+            # e.g. integers too large for 64 bits
+            pass
+    try:
+        line = json.dumps(datum, allow_nan=False)
+    except ValueError:
+        line = json.dumps(_null_nonfinite(datum), allow_nan=False)
+    return (line + "\n").encode("utf-8")
+
+
+def _null_nonfinite(datum: Any) -> Any:
+    """datum with NaN and infinite floats replaced by None, as orjson writes"""
+    if isinstance(datum, float):
+        return datum if math.isfinite(datum) else None
+    if isinstance(datum, dict):
+        return {key: _null_nonfinite(value) for key, value in datum.items()}
+    if isinstance(datum, (list, tuple)):
+        return [_null_nonfinite(value) for value in datum]
+    return datum
+
+
+def loads(line: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def data_extension(path: pathlike) -> str:
+    """The data format of path from its extensions"""
+    name = Path(path).name
+    for extension in sorted(DATA_EXTENSIONS, key=len, reverse=True):
+        if name.endswith(extension):
+            return extension
+    raise ValueError(
+        f"Unknown data format for {path}; expected one of {DATA_EXTENSIONS}"
+    )
+
+
+def _write_jsonl(f: IO[bytes], data: Iterable[Any]) -> None:
+    for datum in data:
+        f.write(dumps(datum))
+
+
+def _read_jsonl(f: IO[bytes]) -> Iterator[Any]:
+    for line in f:
+        yield loads(line)
+
+
+def _write_jsonl_zst(f: IO[bytes], data: Iterable[Any]) -> None:
+    import zstandard
+
+    with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(
+        f, closefd=False
+    ) as writer:
+        _write_jsonl(writer, data)
+
+
+def _read_jsonl_zst(f: IO[bytes]) -> Iterator[Any]:
+    import zstandard
+
+    reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+    yield from _read_jsonl(BufferedReader(reader))
+
+
+def _write_arrow(f: IO[bytes], data: Iterable[Any]) -> None:
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(f, _ARROW_SCHEMA, options=options) as writer:
+        iterator = iter(data)
+        while True:
+            batch = [dumps(datum) for datum in islice(iterator, ARROW_BATCH_SIZE)]
+            if not batch:
+                break
+            writer.write_batch(
+                pa.record_batch(
+                    [pa.array(batch, pa.large_binary())], schema=_ARROW_SCHEMA
+                )
+            )
+
+
+def _read_arrow(f: IO[bytes]) -> Iterator[Any]:
+    for batch in pa.ipc.open_stream(f):
+        for line in batch.column(0).to_pylist():
+            yield loads(line)
+
+
+_WRITERS: Dict[str, Callable[[IO[bytes], Iterable[Any]], None]] = {
+    ".jsonl": _write_jsonl,
+    ".jsonl.zst": _write_jsonl_zst,
+    ".arrow": _write_arrow,
+}
+_READERS: Dict[str, Callable[[IO[bytes]], Iterator[Any]]] = {
+    ".jsonl": _read_jsonl,
+    ".jsonl.zst": _read_jsonl_zst,
+    ".arrow": _read_arrow,
+}
+
+
+def write_data(path: pathlike, data: Iterable[Any]) -> None:
+    """Write data to path in the format of its extension, only on success"""
+    writer = _WRITERS[data_extension(path)]
+    with AtomicFileWriter(path) as f:
+        writer(f, data)
+
+
+def read_data(path: pathlike) -> Generator[Any, None, None]:
+    """Read data written by write_data"""
+    reader = _READERS[data_extension(path)]
+    with open(path, "rb") as f:
+        yield from reader(f)
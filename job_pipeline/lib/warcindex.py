@@ -0,0 +1,140 @@
+"""Sidecar index of the records of a gzipped WARC file
+
+Every record of a downloaded WARC is a separate gzip member, so a record can
+be read by seeking to its member and decompressing only that.
+The index lists the offset and compressed length of each member with its
+target URI and date, in a tab separated file alongside the WARC (see
+warc_index_path) whose first line holds the size of the WARC it indexes.
+
+With the index any shard of the records can be read independently, so one
+large WARC can be extracted by many processes, and single URIs can be looked
+up without reading the whole file.
+"""
+import os
+from io import BytesIO
+from pathlib import Path
+from typing import Generator, Iterable, List, NamedTuple, Optional
+
+from warcio.archiveiterator import ArchiveIterator
+from warcio.recordloader import ArcWarcRecord
+
+from job_pipeline.lib.io import AtomicFileWriter, pathlike
+
+WARC_INDEX_SUFFIX = ".idx"
+
+
+class WarcIndexEntry(NamedTuple):
+    offset: int
+    length: int
+    uri: str
+    date: str
+
+
+def capture_key(uri: str, date: str) -> str:
+    """Identifier of the capture of a record, independent of its location"""
+    return f"{uri} {date}"
+
+
+def warc_entry_key(entry: WarcIndexEntry) -> str:
+    return capture_key(entry.uri, entry.date)
+
+
+def parse_warc_record(content: bytes) -> ArcWarcRecord:
+    archive_iterator = ArchiveIterator(BytesIO(content))
+    # Assume exactly one record
+    return next(archive_iterator)
+
+
+def warc_index_path(path: pathlike) -> Path:
+    return Path(str(path) + WARC_INDEX_SUFFIX)
+
+
+def warc_member_entry(content: bytes, offset: int) -> WarcIndexEntry:
+    """Index entry for a gzip member holding a single WARC record at offset"""
+    headers = parse_warc_record(content).rec_headers
+    return WarcIndexEntry(
+        offset,
+        len(content),
+        headers["WARC-Target-URI"],
+        headers["WARC-Date"],
+    )
+
+
+def scan_warc(path: pathlike) -> List[WarcIndexEntry]:
+    """Index the records of a WARC by reading it from start to finish"""
+    entries = []
+    with open(path, "rb") as stream:
+        archive_iterator = ArchiveIterator(stream)
+        for record in archive_iterator:
+            entries.append(
+                WarcIndexEntry(
+                    archive_iterator.get_record_offset(),
+                    archive_iterator.get_record_length(),
+                    record.rec_headers["WARC-Target-URI"],
+                    record.rec_headers["WARC-Date"],
+                )
+            )
+    return entries
+
+
+def write_warc_index(path: pathlike, entries: Iterable[WarcIndexEntry]) -> None:
+    with AtomicFileWriter(warc_index_path(path), "wb") as f:
+        f.write(f"{os.path.getsize(path)}\n".encode("utf-8"))
+        for entry in entries:
+            line = f"{entry.offset}\t{entry.length}\t{entry.date}\t{entry.uri}\n"
+            f.write(line.encode("utf-8"))
+
+
+def read_warc_index(path: pathlike) -> Optional[List[WarcIndexEntry]]:
+    """The index of the WARC at path, or None if it is missing or out of date"""
+    try:
+        with open(warc_index_path(path), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    if not lines or lines[0] != str(os.path.getsize(path)):
+        return None
+    entries = []
+    for line in lines[1:]:
+        offset, length, date, uri = line.split("\t", 3)
+        entries.append(WarcIndexEntry(int(offset), int(length), uri, date))
+    return entries
+
+
+def load_warc_index(path: pathlike) -> List[WarcIndexEntry]:
+    """The index of the WARC at path, building it if needed"""
+    entries = read_warc_index(path)
+    if entries is None:
+        entries = scan_warc(path)
+        write_warc_index(path, entries)
+    return entries
+
+
+def read_warc_members(
+    path: pathlike, entries: Iterable[WarcIndexEntry]
+) -> Generator[bytes, None, None]:
+    """The gzip member of each entry, read by seeking to it"""
+    with open(path, "rb") as f:
+        for entry in entries:
+            f.seek(entry.offset)
+            content = f.read(entry.length)
+            if len(content) != entry.length:
+                raise ValueError(
+                    f"Expected {entry.length} bytes at {entry.offset} of {path}, "
+                    f"got {len(content)}"
+                )
+            yield content
+
+
+def read_warc_entries(
+    path: pathlike, entries: Iterable[WarcIndexEntry]
+) -> Generator[ArcWarcRecord, None, None]:
+    """The record of each entry of the index of the WARC at path"""
+    for content in read_warc_members(path, entries):
+        yield parse_warc_record(content)
+
+
+def lookup_uri(path: pathlike, uri: str) -> List[ArcWarcRecord]:
+    """The records of the WARC at path with target uri"""
+    entries = [entry for entry in load_warc_index(path) if entry.uri == uri]
+    return list(read_warc_entries(path, entries))
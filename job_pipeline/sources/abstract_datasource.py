@@ -1,12 +1,38 @@
-import json
 import logging
 from abc import ABC, abstractmethod
+from contextlib import ExitStack
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, Generator, Optional
+from typing import Any, Dict, Generator, Iterable, List, Optional
 
-import pandas as pd
+import pyarrow as pa
 
-from job_pipeline.lib.io import AtomicFileWriter
+from job_pipeline.lib.normalise import (
+    DEFAULT_GEOCODE_CONCURRENCY,
+    deferred_geocoding,
+    gazetteer,
+    init_geocoding,
+    resolve_deferred_geocodes,
+    shared_geocode_cache,
+)
+from job_pipeline.lib.normalised import (
+    NORMALISE_BATCH_SIZE,
+    NORMALISED_SCHEMA,
+    write_normalised,
+)
+from job_pipeline.lib.parallel import parallel_map
+from job_pipeline.lib.serialize import (
+    DATA_EXTENSIONS,
+    DEFAULT_DATA_EXTENSION,
+    data_extension,
+    read_data,
+    write_data,
+)
+
+# Number of records sent to an extraction worker at a time
+DEFAULT_EXTRACT_CHUNKSIZE = 16
+# Number of records sent to a normalisation worker at a time
+DEFAULT_NORMALISE_CHUNKSIZE = 64
 
 
 def ensure_extension(path: Path, extension: Optional[str]) -> Path:
@@ -37,10 +63,23 @@ def get_base_stem(path: Path) -> str:
     return name[:-suffix_len]
 
 
-def read_jsonl(filename: Path) -> Generator[Dict[Any, Any], None, None]:
-    with open(filename, "r") as f:
-        for line in f:
-            yield json.loads(line)
+def find_data(source_dir: Path) -> Dict[str, Path]:
+    """Extracted data in source_dir in any format by name
+
+    If a name has been extracted in several formats the newest is used.
+    """
+    paths: Dict[str, Path] = {}
+    for extension in DATA_EXTENSIONS:
+        for path in source_dir.glob("*" + extension):
+            if data_extension(path) != extension:
+                continue
+            name = get_base_stem(path)
+            if name in paths:
+                logging.warning("Found %s and %s; using the newest", paths[name], path)
+                if paths[name].stat().st_mtime >= path.stat().st_mtime:
+                    continue
+            paths[name] = path
+    return paths
 
 
 def module_name(name):
@@ -54,6 +93,19 @@ class AbstractDatasource(ABC):
     sources: Dict[str, str]
 
     raw_extension: Optional[str] = None
+    # Format of extracted data; see lib.serialize
+    extract_extension: str = DEFAULT_DATA_EXTENSION
+    # Whether read_records splits a source into more than one record, so
+    # extracting it with several workers is worthwhile
+    splits_records: bool = False
+    # Normalised data is written in batches of this many records with this
+    # schema; see lib.normalised
+    normalised_schema: pa.Schema = NORMALISED_SCHEMA
+    normalise_batch_size: int = NORMALISE_BATCH_SIZE
+    # Geocode the distinct uncached locations of each batch with up to
+    # geocode_concurrency requests at a time; see lib.normalise.Geocoder
+    defer_geocoding: bool = True
+    geocode_concurrency: int = DEFAULT_GEOCODE_CONCURRENCY
 
     @abstractmethod
     def download_one(self, path: Path, source: str) -> None:
@@ -75,49 +127,138 @@ class AbstractDatasource(ABC):
         """Extract data from one raw downloaded source"""
         pass
 
+    def read_records(self, path: Path) -> Iterable[Any]:
+        """Split a raw source into records that can be extracted independently
+
+        By default the whole source is a single record; datasources that
+        override this should set splits_records.
+        """
+        return [path]
+
+    def extract_record(self, record: Any) -> List[Dict[Any, Any]]:
+        """Extract data from one record of read_records"""
+        return list(self.extract_one(record))
+
+    def extract_parallel(
+        self, path: Path, workers: int, chunksize: int = DEFAULT_EXTRACT_CHUNKSIZE
+    ) -> Iterable[Dict[Any, Any]]:
+        """Equivalent of extract_one with records extracted by a pool of workers
+
+        Data is returned in the same order as extract_one.
+        """
+        return chain.from_iterable(
+            parallel_map(
+                self.extract_record, self.read_records(path), workers, chunksize
+            )
+        )
+
     def extract_all(
-        self, source_dir: Path, dest_dir: Path, overwrite: bool = False
+        self,
+        source_dir: Path,
+        dest_dir: Path,
+        overwrite: bool = False,
+        workers: int = 1,
     ) -> None:
         dest_dir.mkdir(parents=True, exist_ok=True)
         for source_path in source_dir.glob("*" + (self.raw_extension or "")):
             name = get_base_stem(source_path)
-            dest_path = ensure_extension(dest_dir / name, ".jsonl")
-            if overwrite or not dest_path.exists():
-                logging.info(f"Extracting {source_path} to {dest_path}")
-                with AtomicFileWriter(dest_path) as output:
-                    for datum in self.extract_one(source_path):
-                        line = json.dumps(datum) + "\n"
-                        output.write(line.encode("utf-8"))
+            dest_path = ensure_extension(dest_dir / name, self.extract_extension)
+            self.extract_file(source_path, dest_path, overwrite, workers)
+
+    def extract_file(
+        self,
+        source_path: Path,
+        dest_path: Path,
+        overwrite: bool = False,
+        workers: int = 1,
+    ) -> None:
+        """Extract one raw source to dest_path, unless it already exists"""
+        if overwrite or not dest_path.exists():
+            logging.info(f"Extracting {source_path} to {dest_path}")
+            data: Iterable[Dict[Any, Any]]
+            # A single record would be extracted by one worker and sent back
+            # whole, so stream it here instead
+            if workers > 1 and self.splits_records:
+                data = self.extract_parallel(source_path, workers)
             else:
-                logging.info(f"Skipping {source_path}; {dest_path} exists")
+                data = self.extract_one(source_path)
+            write_data(dest_path, data)
+        else:
+            logging.info(f"Skipping {source_path}; {dest_path} exists")
 
     @abstractmethod
     def normalise(self, *args, **kwargs) -> Dict[str, Any]:
         pass
 
     def normalise_all(
-        self, source_dir: Path, dest_dir: Path, overwrite: bool = False
+        self,
+        source_dir: Path,
+        dest_dir: Path,
+        overwrite: bool = False,
+        workers: int = 1,
     ) -> None:
         dest_dir.mkdir(parents=True, exist_ok=True)
-        for source_path in source_dir.glob("*.jsonl"):
-            name = get_base_stem(source_path)
+        for name, source_path in find_data(source_dir).items():
             dest_path = ensure_extension(dest_dir / name, ".feather")
 
             if overwrite or not dest_path.exists():
                 logging.info(f"Normalising {source_path}")
-                source_data = read_jsonl(source_path)
-
-                normalised_data = [self.normalise(**datum) for datum in source_data]
+                self.normalise_file(source_path, dest_path, name, workers)
+            else:
+                logging.info(f"Skipping normalising {source_path} - {dest_path} exists")
 
-                for datum in normalised_data:
-                    datum["processor"] = self.name
-                    datum["source"] = name
+    def normalise_file(
+        self, source_path: Path, dest_path: Path, source: str, workers: int = 1
+    ) -> None:
+        """Normalise the extracted data at source_path to dest_path
 
-                # Is there a more sensible output format??
-                if normalised_data:
-                    df = pd.DataFrame(normalised_data)
-                    df.to_feather(dest_path)
-                else:
-                    logging.warning("No data output for %s", dest_path)
+        With several workers records are normalised by a pool of processes,
+        in the same order, sharing a geocode cache.
+        With defer_geocoding uncached locations are geocoded concurrently in
+        batches after normalising, rather than one at a time as they're found.
+        Fields not in normalised_schema are dropped, and a source without
+        records is written as an empty file; see lib.normalised.
+        """
+        with ExitStack() as stack:
+            source_data = read_data(source_path)
+            normalised_data: Iterable[Dict[str, Any]]
+            if self.defer_geocoding:
+                stack.enter_context(deferred_geocoding())
+            if workers > 1:
+                cache = stack.enter_context(shared_geocode_cache())
+                normalised_data = parallel_map(
+                    self.normalise_record,
+                    source_data,
+                    workers,
+                    DEFAULT_NORMALISE_CHUNKSIZE,
+                    initializer=init_geocoding,
+                    initargs=(cache, self.defer_geocoding, gazetteer()),
+                )
             else:
-                logging.info(f"Skipping normalising {source_path} - {dest_path} exists")
+                normalised_data = map(self.normalise_record, source_data)
+            if self.defer_geocoding:
+                normalised_data = resolve_deferred_geocodes(
+                    normalised_data,
+                    self.normalise_batch_size,
+                    self.geocode_concurrency,
+                )
+            num_records = write_normalised(
+                dest_path,
+                self.label_normalised(normalised_data, source),
+                self.normalised_schema,
+                self.normalise_batch_size,
+            )
+        if not num_records:
+            logging.warning("No data output for %s", dest_path)
+
+    def normalise_record(self, datum: Dict[Any, Any]) -> Dict[str, Any]:
+        """Normalise one extracted datum"""
+        return self.normalise(**datum)
+
+    def label_normalised(
+        self, normalised_data: Iterable[Dict[str, Any]], source: str
+    ) -> Generator[Dict[str, Any], None, None]:
+        for normalised in normalised_data:
+            normalised["processor"] = self.name
+            normalised["source"] = source
+            yield normalised
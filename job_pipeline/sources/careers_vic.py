@@ -2,8 +2,6 @@ import logging
 import re
 from typing import Any, Dict, List, Union
 
-import bs4
-
 from job_pipeline.lib.normalise import (
     WOF_AUS,
     WOF_NZ,
@@ -50,7 +48,7 @@ class Datasource(CommonCrawlDatasource):
     query = "careers.vic.gov.au/job/*"
 
     def extract(self, html: Union[bytes, str], uri, view_date) -> List[Dict[Any, Any]]:
-        soup = bs4.BeautifulSoup(html, "html5lib")
+        soup = self.parse_html(html)
         data = {}
         for info in soup.select(".txt-info"):
             key = info.select_one(".txt-bold")
@@ -60,13 +58,13 @@ class Datasource(CommonCrawlDatasource):
             value = "".join(str(s).strip() for s in key.next_siblings)
             data[key_text] = value
 
-            title_tag = soup.select_one(".txt-title")
-            if not title_tag:
-                logging.warning("Missing title tag in %s", uri)
-                title = None
-            else:
-                title = str(title_tag.get_text())
-            description = str(soup.select_one(".txt-pre-line") or "")
+        title_tag = soup.select_one(".txt-title")
+        if not title_tag:
+            logging.warning("Missing title tag in %s", uri)
+            title = None
+        else:
+            title = str(title_tag.get_text())
+        description = str(soup.select_one(".txt-pre-line") or "")
         return [
             {
                 "title": title,
@@ -1,19 +1,93 @@
 import logging
-from io import BytesIO
-from multiprocessing import Pool
+import zlib
+from contextlib import ExitStack, contextmanager
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, Generator, List
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Sized,
+    Tuple,
+    Union,
+)
 
 from tqdm import tqdm
 from warcio.archiveiterator import ArchiveIterator
 from warcio.recordloader import ArcWarcRecord
-from warcio.warcwriter import WARCWriter
 
-from job_pipeline.lib.cc import CrawlResultDict, cdx_query, fetch_cc
-from job_pipeline.lib.io import AtomicFileWriter
-from job_pipeline.sources.abstract_datasource import AbstractDatasource
+from job_pipeline.lib.cc import (
+    CC_DATA_LIMITER,
+    CC_DATA_URL,
+    CrawlResultDict,
+    cdx_num_pages,
+    cdx_query,
+    cdx_query_page,
+    cdx_row_key,
+)
+from job_pipeline.lib.ccfetch import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_GAP,
+    fetch_all_ranges,
+)
+from job_pipeline.lib.cdxcache import DEFAULT_CDX_NTHREAD, CdxCache
+from job_pipeline.lib.cdxlocal import (
+    local_cdx_api,
+    local_cdx_num_pages,
+    local_cdx_query,
+    local_cdx_query_page,
+)
+from job_pipeline.lib.digestindex import DigestIndex
+from job_pipeline.lib.extractguard import (
+    DEFAULT_MAX_RECORD_SIZE,
+    DEFAULT_RECORD_TIME_BUDGET,
+    FILTERED,
+    OVERSIZED,
+    SKIPPED,
+    ExtractStats,
+    RecordOutcome,
+    guarded_extract,
+)
+from job_pipeline.lib.extractlib import project_fields
+from job_pipeline.lib.extractmanifest import read_manifest, write_manifest
+from job_pipeline.lib.htmlparse import (
+    DEFAULT_HTML_PARSER,
+    HtmlNode,
+    parse_html,
+)
+from job_pipeline.lib.io import AtomicFileWriter, ResumableFileWriter
+from job_pipeline.lib.parallel import parallel_map
+from job_pipeline.lib.rangecache import DEFAULT_CACHE_SIZE, RangeCache
+from job_pipeline.lib.serialize import read_data, write_data
+from job_pipeline.lib.warcindex import (
+    WarcIndexEntry,
+    capture_key,
+    load_warc_index,
+    parse_warc_record,
+    read_warc_entries,
+    read_warc_index,
+    warc_entry_key,
+    warc_member_entry,
+    write_warc_index,
+)
+from job_pipeline.sources.abstract_datasource import (
+    DEFAULT_EXTRACT_CHUNKSIZE,
+    AbstractDatasource,
+    ensure_extension,
+    get_base_stem,
+)
 
-_DEFAULT_NTHREAD = 32
+DIGEST_INDEX_NAME = "digests.sqlite"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Content, URI and date of a fetched page
+HtmlRecord = Tuple[bytes, str, str]
+# Path of a WARC and the index entries of some of its records
+WarcShard = Tuple[str, List[WarcIndexEntry]]
 
 
 def fetch_source_rows(
@@ -23,25 +97,44 @@ def fetch_source_rows(
     return list(cdx_query(api, query, query_filters))
 
 
-def fetch_cc_row(row: CrawlResultDict) -> bytes:
-    return fetch_cc(row["filename"], int(row["offset"]), int(row["length"]))
+def check_warc_member(content: bytes) -> None:
+    """Cheaply check content looks like a single gzipped WARC response
+
+    Only the first few hundred bytes are decompressed.
+    Raises ValueError otherwise.
+    """
+    if not content.startswith(GZIP_MAGIC):
+        raise ValueError("WARC record is not gzipped")
+    header = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(content[:1024], 512)
+    if not header.startswith(b"WARC/") or b"WARC-Type: response" not in header:
+        raise ValueError(f"Unexpected WARC record header: {header[:80]!r}")
 
 
-def fetch_all_cc(
-    sources: List[CrawlResultDict],
-    nthread: int = _DEFAULT_NTHREAD,
+def fetch_all_cc_content(
+    sources: Iterable[CrawlResultDict],
+    concurrency: int = DEFAULT_CONCURRENCY,
     disable_progress: bool = False,
-) -> Generator[ArcWarcRecord, None, None]:
-    with Pool(nthread) as p:
-        for content in tqdm(
-            p.imap_unordered(fetch_cc_row, sources),
-            total=len(sources),
-            disable=disable_progress,
-        ):
-            archive_iterator = ArchiveIterator(BytesIO(content))
-            # Assume exactly one record
-            warc = next(archive_iterator)
-            yield warc
+    max_gap: Optional[int] = DEFAULT_MAX_GAP,
+    presorted: bool = False,
+    total: Optional[int] = None,
+    base_url: str = CC_DATA_URL,
+    cache: Optional[RangeCache] = None,
+) -> Generator[Tuple[CrawlResultDict, bytes], None, None]:
+    """Fetch the raw WARC content of each CDX row as it arrives"""
+    if total is None and isinstance(sources, Sized):
+        total = len(sources)
+    yield from tqdm(
+        fetch_all_ranges(
+            sources,
+            concurrency,
+            base_url,
+            max_gap=max_gap,
+            presorted=presorted,
+            cache=cache,
+        ),
+        total=total,
+        disable=disable_progress,
+    )
 
 
 def read_warc_responses(
@@ -53,13 +146,75 @@ def read_warc_responses(
             yield record
 
 
+def html_record(warc: ArcWarcRecord) -> HtmlRecord:
+    """Read the content, URI and date of a WARC response"""
+    html = warc.content_stream().read()
+    uri = warc.rec_headers["WARC-Target-URI"]
+    view_date = warc.rec_headers["WARC-Date"]
+
+    assert uri is not None
+    assert view_date is not None
+    return html, uri, view_date
+
+
+def _optional_list(values: Optional[Iterable[str]]) -> Optional[List[str]]:
+    return None if values is None else list(values)
+
+
 class CommonCrawlDatasource(AbstractDatasource):
 
     query: str
     query_filters: List[str] = []
-    # Number of threads for parallel
-    nthread: int = _DEFAULT_NTHREAD
+    data_url: str = CC_DATA_URL
+    # Maximum number of concurrent requests to Common Crawl
+    concurrency: int = DEFAULT_CONCURRENCY
+    # Fetch records in the same file separated by at most this many bytes in
+    # one request; None to fetch every record separately
+    max_range_gap: Optional[int] = DEFAULT_MAX_GAP
     disable_progress: bool = False
+    splits_records: bool = True
+    # Keep partial downloads on failure and resume them on the next download
+    resumable: bool = True
+    # Skip records whose payload digest has already been downloaded from any
+    # source; they are recorded as references in the digest index instead.
+    # Skipped captures are not extracted, so their URI and view date are lost
+    deduplicate: bool = False
+    # SQLite cache of CDX index queries; None to always query the index server
+    cdx_cache_path: Optional[Path] = Path("./data/00_cache/cdx.sqlite")
+    # Local mirror of data.commoncrawl.org with the cc-index/collections of
+    # each source, queried instead of the index server; None to use the server
+    cdx_local_path: Optional[Path] = None
+    # Number of CDX index pages to query in parallel
+    cdx_nthread: int = DEFAULT_CDX_NTHREAD
+    # Local cache of fetched records, e.g. for iterating on query_filters
+    range_cache_path: Optional[Path] = None
+    # Maximum size in bytes of the local cache of fetched records
+    range_cache_size: int = DEFAULT_CACHE_SIZE
+    # HTML parser backend for parse_html; "lxml" is faster, see lib.htmlparse
+    html_parser: str = DEFAULT_HTML_PARSER
+    # Only extract records containing every one of these byte strings,
+    # ignoring case; other records are skipped without being parsed
+    prefilter_markers: Tuple[bytes, ...] = ()
+    # Only extract HTTP responses with these statuses and Content-Types,
+    # checked before reading the payload; None to extract any
+    accepted_statuses: Optional[Tuple[str, ...]] = ("200",)
+    accepted_mime_types: Optional[Tuple[str, ...]] = (
+        "text/html",
+        "application/xhtml+xml",
+    )
+    # Records larger than this many bytes are quarantined without extracting
+    # them; None for no limit. See lib.extractguard
+    max_record_size: Optional[int] = DEFAULT_MAX_RECORD_SIZE
+    # Records taking longer than this many seconds to extract are abandoned
+    # and quarantined; None for no limit
+    record_time_budget: Optional[float] = DEFAULT_RECORD_TIME_BUDGET
+    # Increase when extract changes, so every record is extracted again
+    extract_version: int = 1
+    # Dotted paths of the extracted data that normalise uses; extract only
+    # keeps these, or everything if None. See lib.extractlib.project_fields
+    extract_fields: Optional[List[str]] = None
+    # Keep all the extracted data regardless of extract_fields, e.g. for research
+    extract_full: bool = False
 
     raw_extension = ".warc.gz"
 
@@ -84,28 +239,543 @@ class CommonCrawlDatasource(AbstractDatasource):
     }
 
     def fetch_source_rows(self, source: str) -> List[CrawlResultDict]:
+        if self.cdx_local_path is not None:
+            api = local_cdx_api(self.cdx_local_path, source)
+            return list(local_cdx_query(api, self.query, self.query_filters))
         return fetch_source_rows(source, self.query, self.query_filters)
 
+    @contextmanager
+    def open_source_rows(
+        self, source: str
+    ) -> Generator[Tuple[Iterable[CrawlResultDict], bool], None, None]:
+        """Context returning the CDX rows of source and whether they are sorted"""
+        if self.cdx_cache_path is None:
+            yield self.fetch_source_rows(source), False
+        else:
+            assert self.query.endswith("*")
+            api, num_pages_fn, page_fn = source, cdx_num_pages, cdx_query_page
+            if self.cdx_local_path is not None:
+                # Pages of the local index are cached under the local path
+                api = local_cdx_api(self.cdx_local_path, source)
+                num_pages_fn, page_fn = local_cdx_num_pages, local_cdx_query_page
+            with CdxCache(self.cdx_cache_path) as cache:
+                source_rows = cache.query(
+                    api,
+                    self.query,
+                    self.query_filters,
+                    self.cdx_nthread,
+                    num_pages_fn,
+                    page_fn,
+                )
+                yield source_rows, True
+
+    @contextmanager
+    def open_range_cache(self) -> Generator[Optional[RangeCache], None, None]:
+        """Context returning the local cache of fetched records, if enabled"""
+        if self.range_cache_path is None:
+            yield None
+        else:
+            with RangeCache(self.range_cache_path, self.range_cache_size) as cache:
+                yield cache
+            logging.info(f"Record cache: {cache}")
+
     def download_one(self, path: Path, source: str) -> None:
         logging.info(f"Fetching {source} for {self.name}")
-        source_rows = self.fetch_source_rows(source)
-        with AtomicFileWriter(path) as output:
-            writer = WARCWriter(output, gzip=True)
-            logging.info(f"Downloading {source}")
-            for warc in fetch_all_cc(source_rows, self.nthread, self.disable_progress):
-                writer.write_record(warc)
+        with self.open_source_rows(source) as (source_rows, presorted):
+            with self.open_range_cache() as cache:
+                self._download_rows(path, source, source_rows, presorted, cache)
+        logging.info(f"Common Crawl request limit: {CC_DATA_LIMITER}")
+
+    def _download_rows(
+        self,
+        path: Path,
+        source: str,
+        source_rows: Iterable[CrawlResultDict],
+        presorted: bool = False,
+        cache: Optional[RangeCache] = None,
+    ) -> None:
+        # Index entries of the records written, if the download isn't resumed
+        index: Optional[List[WarcIndexEntry]] = None
+        with ResumableFileWriter(path, resume=self.resumable) as output:
+            if output.done:
+                logging.info(f"Resuming {source} after {len(output.done)} records")
+            else:
+                index = []
+            total = None
+            if isinstance(source_rows, Sized):
+                total = max(len(source_rows) - len(output.done), 0)
+            pending_rows = (
+                row for row in source_rows if cdx_row_key(row) not in output.done
+            )
+            digests = None
+            if self.deduplicate:
+                digests = self._open_digest_index(path, output.done)
+                pending_rows = (row for row in pending_rows if digests.claim(row))
+            try:
+                logging.info(f"Downloading {source}")
+                for row, content in fetch_all_cc_content(
+                    pending_rows,
+                    self.concurrency,
+                    self.disable_progress,
+                    self.max_range_gap,
+                    presorted,
+                    total=total,
+                    base_url=self.data_url,
+                    cache=cache,
+                ):
+                    # Each record is fetched as a complete gzip member that
+                    # can be appended as is, without recompressing
+                    check_warc_member(content)
+                    if index is not None:
+                        offset = output.filehandle.tell()
+                        index.append(warc_member_entry(content, offset))
+                    output.filehandle.write(content)
+                    output.commit(cdx_row_key(row))
+                    if digests is not None:
+                        digests.add(row)
+            finally:
+                if digests is not None:
+                    logging.info(
+                        "Skipped %d records already downloaded in %s",
+                        digests.num_references(get_base_stem(path)),
+                        self.name,
+                    )
+                    digests.close()
+        # Resumed downloads are indexed when first read; see load_warc_index
+        if index is not None:
+            write_warc_index(path, index)
+
+    def _open_digest_index(self, path: Path, done: Set[str]) -> DigestIndex:
+        """Open the digest index shared by all sources downloaded alongside path"""
+        raw_dir = path.parent
+        digests = DigestIndex(raw_dir / DIGEST_INDEX_NAME)
+        # Forget sources whose downloads have been removed
+        raw_extension = self.raw_extension or ""
+        digests.prune(
+            get_base_stem(source_path)
+            for pattern in ("*" + raw_extension, "*" + raw_extension + ".tmp")
+            for source_path in raw_dir.glob(pattern)
+        )
+        digests.start_source(get_base_stem(path), done)
+        return digests
 
     def extract(self, html: bytes, uri: str, view_date: str) -> List[Dict[Any, Any]]:
         pass
 
-    def extract_one(self, path: Path) -> Generator[Dict[Any, Any], None, None]:
-        for warc in read_warc_responses(path):
-            html = warc.content_stream().read()
-            uri = warc.rec_headers["WARC-Target-URI"]
-            view_date = warc.rec_headers["WARC-Date"]
+    def project(self, data: Any) -> Any:
+        """The parts of extracted data that are kept; see extract_fields"""
+        fields = self.projected_fields()
+        if fields is None:
+            return data
+        return project_fields(data, fields)
+
+    def projected_fields(self) -> Optional[List[str]]:
+        return None if self.extract_full else self.extract_fields
+
+    def extract_limits(self) -> Dict[str, Optional[float]]:
+        """The limits that quarantine records, as in a manifest"""
+        return {
+            "max_record_size": self.max_record_size,
+            "record_time_budget": self.record_time_budget,
+        }
+
+    def extract_filters(self) -> Dict[str, Optional[List[str]]]:
+        """The settings deciding which records are extracted, as in a manifest"""
+        return {
+            "accepted_statuses": _optional_list(self.accepted_statuses),
+            "accepted_mime_types": _optional_list(self.accepted_mime_types),
+            "prefilter_markers": [
+                marker.decode("latin-1") for marker in self.prefilter_markers
+            ],
+        }
+
+    def parse_html(self, html: Union[bytes, str]) -> HtmlNode:
+        return parse_html(html, self.html_parser)
+
+    def is_candidate(self, html: bytes) -> bool:
+        """Whether html may contain data, from a search of the raw bytes"""
+        if not self.prefilter_markers:
+            return True
+        html = html.lower()
+        return all(marker.lower() in html for marker in self.prefilter_markers)
+
+    def prefilter_records(
+        self, records: Iterable[HtmlRecord]
+    ) -> Generator[HtmlRecord, None, None]:
+        """The records that are candidates for extraction; see is_candidate"""
+        num_records = 0
+        num_skipped = 0
+        for record in records:
+            num_records += 1
+            if self.is_candidate(record[0]):
+                yield record
+            else:
+                num_skipped += 1
+        self.log_prefilter(num_skipped, num_records)
+
+    def log_prefilter(self, num_skipped: int, num_records: int) -> None:
+        if self.prefilter_markers:
+            logging.info(
+                "Skipped %d of %d records without all of %s",
+                num_skipped,
+                num_records,
+                self.prefilter_markers,
+            )
+
+    def accept_response(self, warc: ArcWarcRecord) -> bool:
+        """Whether to extract a response, from its HTTP headers alone"""
+        http_headers = warc.http_headers
+        if http_headers is None:
+            return False
+        if (
+            self.accepted_statuses is not None
+            and http_headers.get_statuscode() not in self.accepted_statuses
+        ):
+            return False
+        if self.accepted_mime_types is not None:
+            content_type = http_headers.get_header("Content-Type") or ""
+            mime = content_type.split(";")[0].strip().lower()
+            if mime not in self.accepted_mime_types:
+                return False
+        return True
 
-            assert uri is not None
-            assert view_date is not None
+    def filter_responses(
+        self, warcs: Iterable[ArcWarcRecord]
+    ) -> Generator[ArcWarcRecord, None, None]:
+        """The responses to extract; see accept_response
 
-            for result in self.extract(html, uri, view_date):
+        The payloads of other responses are never read.
+        """
+        num_records = 0
+        num_filtered = 0
+        for warc in warcs:
+            num_records += 1
+            if self.accept_response(warc):
+                yield warc
+            else:
+                num_filtered += 1
+        self.log_filtered(num_filtered, num_records)
+
+    def log_filtered(self, num_filtered: int, num_records: int) -> None:
+        if num_filtered:
+            logging.info(
+                "Skipped %d of %d responses by HTTP status or Content-Type",
+                num_filtered,
+                num_records,
+            )
+
+    def read_records(self, path: Path) -> Generator[HtmlRecord, None, None]:
+        """Read the records to extract from a downloaded WARC"""
+        return self.prefilter_records(
+            html_record(warc)
+            for warc in self.filter_responses(read_warc_responses(path))
+        )
+
+    def extract_record(self, record: HtmlRecord) -> List[Dict[Any, Any]]:
+        html, uri, view_date = record
+        return self.extract(html, uri, view_date)
+
+    def extract_one(self, path: Path) -> Generator[Dict[Any, Any], None, None]:
+        for record in self.read_records(path):
+            for result in self.extract_record(record):
                 yield result
+
+    def extract_record_guarded(self, record: HtmlRecord) -> RecordOutcome:
+        """Extract a record within max_record_size and record_time_budget"""
+        html, uri, view_date = record
+        return guarded_extract(
+            self.extract_record,
+            record,
+            uri,
+            view_date,
+            len(html),
+            self.max_record_size,
+            self.record_time_budget,
+        )
+
+    def extract_response(self, warc: ArcWarcRecord) -> RecordOutcome:
+        """Extract a WARC response, reading its payload only if it is accepted"""
+        # Check the headers before reading, and so decompressing, the payload
+        uri = warc.rec_headers["WARC-Target-URI"]
+        view_date = warc.rec_headers["WARC-Date"]
+        if not self.accept_response(warc):
+            status = FILTERED
+        elif self.max_record_size is not None and warc.length > self.max_record_size:
+            status = OVERSIZED
+        else:
+            record = html_record(warc)
+            if self.is_candidate(record[0]):
+                return self.extract_record_guarded(record)
+            status = SKIPPED
+        return RecordOutcome(uri, view_date, warc.length, 0.0, status, [])
+
+    def extract_shard(self, shard: WarcShard) -> List[RecordOutcome]:
+        """Extract each record of a shard of a WARC, reading only those records"""
+        path, entries = shard
+        return [
+            self.extract_response(warc) for warc in read_warc_entries(path, entries)
+        ]
+
+    def extract_entries(
+        self,
+        path: Path,
+        entries: List[WarcIndexEntry],
+        workers: int = 1,
+        chunksize: int = DEFAULT_EXTRACT_CHUNKSIZE,
+        stats: Optional[ExtractStats] = None,
+    ) -> Generator[Dict[Any, Any], None, None]:
+        """Extract the records of the WARC at path with the given index entries
+
+        Records are read in shards of chunksize, and with more than one worker
+        each worker reads and decompresses its own shards.
+        Data is returned in the order of entries.
+        The outcome of each record is added to stats.
+        """
+        if stats is None:
+            stats = ExtractStats()
+        shards = (
+            (str(path), entries[start : start + chunksize])
+            for start in range(0, len(entries), chunksize)
+        )
+        for outcomes in parallel_map(self.extract_shard, shards, workers):
+            for outcome in outcomes:
+                yield from stats.add(outcome)
+        self.log_filtered(stats.counts[FILTERED], len(entries))
+        self.log_prefilter(stats.counts[SKIPPED], len(entries) - stats.counts[FILTERED])
+
+    def extract_parallel(
+        self, path: Path, workers: int, chunksize: int = DEFAULT_EXTRACT_CHUNKSIZE
+    ) -> Generator[Dict[Any, Any], None, None]:
+        """Equivalent of extract_one with shards of records extracted by workers
+
+        Shards are located with the index of the WARC, which is built if it
+        doesn't exist.
+        """
+        return self.extract_entries(path, load_warc_index(path), workers, chunksize)
+
+    def extract_unindexed(
+        self,
+        path: Path,
+        done: Set[str],
+        entries: List[WarcIndexEntry],
+        stats: ExtractStats,
+    ) -> Generator[Dict[Any, Any], None, None]:
+        """Extract the records of the WARC at path not in done in one pass
+
+        The index entry of every record is added to entries as it is read,
+        and the index is written once the whole WARC has been read.
+        """
+        num_records = 0
+        with open(path, "rb") as stream:
+            archive_iterator = ArchiveIterator(stream)
+            for warc in archive_iterator:
+                uri = warc.rec_headers["WARC-Target-URI"]
+                date = warc.rec_headers["WARC-Date"]
+                outcome = None
+                if capture_key(uri, date) not in done:
+                    outcome = self.extract_response(warc)
+                # Known only once the record has been read to the end
+                offset = archive_iterator.get_record_offset()
+                length = archive_iterator.get_record_length()
+                entries.append(WarcIndexEntry(offset, length, uri, date))
+                if outcome is not None:
+                    num_records += 1
+                    yield from stats.add(outcome)
+        write_warc_index(path, entries)
+        self.log_filtered(stats.counts[FILTERED], num_records)
+        self.log_prefilter(stats.counts[SKIPPED], num_records - stats.counts[FILTERED])
+
+    def extract_file(
+        self,
+        source_path: Path,
+        dest_path: Path,
+        overwrite: bool = False,
+        workers: int = 1,
+    ) -> None:
+        """Extract the records of a WARC not yet extracted to dest_path
+
+        The records already extracted are listed in the manifest of
+        dest_path, and new data is added to the end of it.
+        If extract_version, the projected fields or the filters of
+        extract_filters have changed since, or overwrite is set, or dest_path
+        has no manifest, every record is extracted again. Quarantined records
+        are extracted again when extract_limits have changed.
+        A WARC without an index is indexed first when extracting with several
+        workers, and otherwise indexed while its records are extracted.
+        """
+        entries = read_warc_index(source_path)
+        if entries is None and workers > 1:
+            entries = load_warc_index(source_path)
+        manifest = None
+        if not overwrite and dest_path.exists():
+            manifest = read_manifest(dest_path)
+            if manifest is None:
+                logging.info(f"Extracting {dest_path} again; it has no manifest")
+            elif manifest.extract_version != self.extract_version:
+                logging.info(
+                    f"Extracting {dest_path} again; extract version changed from "
+                    f"{manifest.extract_version} to {self.extract_version}"
+                )
+                manifest = None
+            elif manifest.extract_fields != self.projected_fields():
+                logging.info(f"Extracting {dest_path} again; extract fields changed")
+                manifest = None
+            elif manifest.extract_filters != self.extract_filters():
+                logging.info(f"Extracting {dest_path} again; extract filters changed")
+                manifest = None
+        done = set(manifest.records) if manifest is not None else set()
+        # Quarantined records are tried again when the limits change
+        quarantined: Set[str] = set()
+        if manifest is not None and manifest.quarantined:
+            if manifest.extract_limits == self.extract_limits():
+                quarantined = set(manifest.quarantined)
+            else:
+                logging.info(
+                    f"Extracting {len(manifest.quarantined)} quarantined records "
+                    f"of {source_path} again; extract limits changed"
+                )
+        skip = done | quarantined
+        if entries is not None:
+            pending = [entry for entry in entries if warc_entry_key(entry) not in skip]
+            if manifest is not None and not pending:
+                logging.info(f"Skipping {source_path}; {dest_path} is up to date")
+                return
+            logging.info(
+                f"Extracting {len(pending)} of {len(entries)} records "
+                f"of {source_path} to {dest_path}"
+            )
+        else:
+            logging.info(f"Extracting {source_path} to {dest_path}")
+
+        # Records still quarantined are listed when extracting new ones
+        stats = ExtractStats(dest_path, append=bool(quarantined))
+        data: Iterable[Dict[Any, Any]]
+        if entries is not None:
+            data = self.extract_entries(source_path, pending, workers, stats=stats)
+        else:
+            entries = []
+            data = self.extract_unindexed(source_path, skip, entries, stats)
+        if manifest is not None:
+            data = chain(read_data(dest_path), data)
+        try:
+            write_data(dest_path, data)
+        finally:
+            stats.close()
+        stats.log()
+        quarantined.update(capture_key(*key) for key in stats.quarantined)
+        done.update(warc_entry_key(entry) for entry in entries)
+        write_manifest(
+            dest_path,
+            self.extract_version,
+            list(done - quarantined),
+            self.projected_fields(),
+            self.extract_filters(),
+            list(quarantined),
+            self.extract_limits(),
+        )
+
+    def stream_one(
+        self,
+        dest_path: Path,
+        source: str,
+        raw_path: Optional[Path] = None,
+        workers: int = 1,
+    ) -> None:
+        """Fetch source and extract it to dest_path in a single pass
+
+        Fetched records are extracted as they arrive by a pool of workers
+        without first being written to disk.
+        If raw_path is given the fetched records are also written there, and
+        indexed and added to the digest index as by download_one, so that
+        extract_file finds dest_path up to date.
+        Streaming neither resumes nor deduplicates against earlier downloads.
+        """
+        logging.info(f"Streaming {source} for {self.name}")
+        # Keys of every fetched record, and index entries of the raw output
+        keys: List[str] = []
+        index: List[WarcIndexEntry] = []
+        with ExitStack() as stack:
+            source_rows, presorted = stack.enter_context(self.open_source_rows(source))
+            cache = stack.enter_context(self.open_range_cache())
+            raw_output = None
+            digests = None
+            if raw_path is not None:
+                raw_output = stack.enter_context(AtomicFileWriter(raw_path))
+                if self.deduplicate:
+                    digests = stack.enter_context(
+                        self._open_digest_index(raw_path, set())
+                    )
+
+            def fetch_responses() -> Generator[ArcWarcRecord, None, None]:
+                for row, content in fetch_all_cc_content(
+                    source_rows,
+                    self.concurrency,
+                    self.disable_progress,
+                    self.max_range_gap,
+                    presorted,
+                    base_url=self.data_url,
+                    cache=cache,
+                ):
+                    if raw_output is not None:
+                        check_warc_member(content)
+                    warc = parse_warc_record(content)
+                    uri = warc.rec_headers["WARC-Target-URI"]
+                    view_date = warc.rec_headers["WARC-Date"]
+                    if raw_output is not None:
+                        offset = raw_output.tell()
+                        index.append(
+                            WarcIndexEntry(offset, len(content), uri, view_date)
+                        )
+                        raw_output.write(content)
+                    if digests is not None:
+                        digests.add(row)
+                    keys.append(capture_key(uri, view_date))
+                    yield warc
+
+            records = map(html_record, self.filter_responses(fetch_responses()))
+
+            outcomes = parallel_map(
+                self.extract_record_guarded,
+                self.prefilter_records(records),
+                workers,
+                DEFAULT_EXTRACT_CHUNKSIZE,
+            )
+            stats = ExtractStats(dest_path)
+            try:
+                write_data(dest_path, chain.from_iterable(map(stats.add, outcomes)))
+            finally:
+                stats.close()
+            stats.log()
+        if raw_path is not None:
+            write_warc_index(raw_path, index)
+        quarantined = {capture_key(*key) for key in stats.quarantined}
+        write_manifest(
+            dest_path,
+            self.extract_version,
+            list(set(keys) - quarantined),
+            self.projected_fields(),
+            self.extract_filters(),
+            list(quarantined),
+            self.extract_limits(),
+        )
+
+    def stream(
+        self,
+        dest_dir: Path,
+        raw_dir: Optional[Path] = None,
+        overwrite: bool = False,
+        workers: int = 1,
+    ) -> None:
+        """Fetch and extract every source into dest_dir; see stream_one"""
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        if raw_dir is not None:
+            raw_dir.mkdir(parents=True, exist_ok=True)
+        for source_name, source_key in self.sources.items():
+            dest_path = ensure_extension(dest_dir / source_name, self.extract_extension)
+            raw_path = None
+            if raw_dir is not None:
+                raw_path = ensure_extension(raw_dir / source_name, self.raw_extension)
+            if overwrite or not dest_path.exists():
+                self.stream_one(dest_path, source_key, raw_path, workers)
+            else:
+                logging.info(f"Skipping {source_name}; {dest_path} exists")
@@ -1,8 +1,6 @@
 import logging
 from typing import Union
 
-import bs4
-
 from job_pipeline.lib.normalise import (
     WOF_AUS,
     WOF_NZ,
@@ -45,7 +43,7 @@ class Datasource(CommonCrawlDatasource):
     query = "iworkfor.nsw.gov.au/job/*"
 
     def extract(self, html: Union[bytes, str], uri, view_date):
-        soup = bs4.BeautifulSoup(html, "html5lib")
+        soup = self.parse_html(html)
         body = soup.select_one("tbody")
         # Some pages are missing a body; e.g. CC-MAIN-2018-17
         if not body:
@@ -7,6 +7,7 @@ from job_pipeline.sources.commoncrawl_datasource import CommonCrawlDatasource
 
 class Datasource(CommonCrawlDatasource):
     name = module_name(__name__)
+    prefilter_markers = (b"itemtype", b"JobPosting")
 
     def extract(self, html: bytes, base_url: str, view_date):
         data = extruct.extract(html, base_url, syntaxes=["microdata"])["microdata"]
@@ -4,6 +4,7 @@ from typing import Union
 
 import bs4
 
+from job_pipeline.lib.htmlparse import LxmlNode
 from job_pipeline.lib.normalise import (
     WOF_AUS,
     WOF_NZ,
@@ -38,7 +39,7 @@ class Datasource(CommonCrawlDatasource):
     query = "probonoaustralia.com.au/jobs/*"
 
     def extract(self, html: Union[bytes, str], uri, view_date):
-        soup = bs4.BeautifulSoup(html, "html5lib")
+        soup = self.parse_html(html)
         infos = soup.select(".org-basic-info > div > p.org-add")
         data = {}
         for info in infos:
@@ -48,7 +49,11 @@ class Datasource(CommonCrawlDatasource):
                 continue
             schema_key = key.get_text().strip()
             value = "".join(
-                str(s.get_text() if isinstance(s, bs4.element.Tag) else s).strip()
+                (
+                    s.get_text()
+                    if isinstance(s, (bs4.element.Tag, LxmlNode))
+                    else str(s)
+                ).strip()
                 for s in key.next_siblings
             )
             data[schema_key] = value
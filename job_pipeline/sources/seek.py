@@ -18,16 +18,25 @@ class Datasource(CommonCrawlDatasource):
     name = module_name(__name__)
     query = "seek.com.au/job/*"
     query_filters = ["!~url:.*/apply/*"]
+    extract_fields = [
+        "title",
+        "mobileAdTemplate",
+        "advertiser.description",
+        "salary",
+        "locationHierarchy.suburb",
+        "locationHierarchy.city",
+        "locationHierarchy.state",
+        "locationHierarchy.nation",
+    ]
 
     def extract(self, html: bytes, uri, view_date):
-        text = html.decode("utf-8")
-        obj = parse_js_obj(text, JS_STR_REDUX)
+        obj = parse_js_obj(html, JS_STR_REDUX)
         if obj is None:
             return []
         else:
             return [
                 {
-                    "data": obj["jobdetails"]["result"],
+                    "data": self.project(obj["jobdetails"]["result"]),
                     "uri": uri,
                     "view_date": view_date,
                 }
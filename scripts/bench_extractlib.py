@@ -0,0 +1,93 @@
+"""Micro-benchmark of extractlib.parse_js_obj on synthetic Seek-like pages
+
+Usage: python scripts/bench_extractlib.py [number of jobs in the object]
+"""
+import json
+import sys
+import timeit
+
+import demjson
+
+from job_pipeline.lib.extractlib import (
+    extract_braces,
+    find_braces,
+    parse_js_obj,
+)
+
+INIT = "REDUX_DATA ="
+
+
+def char_loop_braces(text: str) -> str:
+    """The previous extract_braces, scanning one character at a time"""
+    depth = 0
+    inquote = False
+    escape = False
+    start = None
+    for idx, char in enumerate(text):
+        if escape:
+            escape = False
+            continue
+        if char == '"':
+            inquote = not inquote
+        if char == "\\":
+            escape = True
+        if (not inquote) and char == "{":
+            if start is None:
+                start = idx
+            depth += 1
+        if (not inquote) and char == "}":
+            depth -= 1
+            if depth <= 0:
+                break
+    return text[start : idx + 1]
+
+
+def make_page(num_jobs: int, javascript: bool = False) -> bytes:
+    jobs = [
+        {
+            "id": i,
+            "title": f"Project Officer {i} – “Digital” {{team}}",
+            "mobileAdTemplate": '<p class="x">Apply by 1/2 \\ "soon"</p>' * 20,
+            "locationHierarchy": {"suburb": "Carlton", "city": "Melbourne"},
+            "salary": None,
+            "tags": list(range(20)),
+        }
+        for i in range(num_jobs)
+    ]
+    data = json.dumps({"jobdetails": {"result": jobs[0]}, "related": jobs})
+    if javascript:
+        data = data.replace("null", "undefined")
+    script = "<script>window.REDUX_DATA = " + data + ";</script>"
+    html = "<html><head>" + "<meta name=x>" * 200 + "</head><body>"
+    html += "<div>Some listing text</div>" * 2000 + script + "</body></html>"
+    return html.encode("utf-8")
+
+
+def bench(name: str, func, number: int = 5) -> None:
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"{name:40} {seconds * 1000:9.2f} ms")
+
+
+def main(num_jobs: int = 500) -> None:
+    for javascript in (False, True):
+        html = make_page(num_jobs, javascript)
+        text = html.decode("utf-8")
+        idx = text.find(INIT)
+        kind = "JavaScript" if javascript else "JSON"
+        print(f"{kind} page of {len(html) / 1024**2:.1f} MiB")
+        bench("character loop bounds (previous)", lambda: char_loop_braces(text[idx:]))
+        bench("find_braces", lambda: find_braces(text, idx))
+        bench(
+            "decode + parse_js_obj str",
+            lambda: parse_js_obj(html.decode("utf-8"), INIT),
+        )
+        bench("parse_js_obj bytes", lambda: parse_js_obj(html, INIT))
+        bench(
+            "demjson (previous fallback)",
+            lambda: demjson.decode(extract_braces(text[idx:])),
+            1,
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""Benchmark of geocoding records against a stub Placeholder server
+
+Compares geocoding each record as it's normalised with deferring lookups
+and resolving the distinct locations of each batch concurrently.
+
+Usage: PYTHONPATH=. python scripts/bench_geocode.py [records] [distinct locations] [ms delay]
+"""
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from job_pipeline.lib.normalise import (
+    WOF_AUS,
+    Geocoder,
+    deferred_geocoding,
+    resolve_deferred_geocodes,
+    set_geocode_cache,
+)
+from tests.placeholderserver import make_place, serve_placeholder
+
+
+class UnpooledGeocoder(Geocoder):
+    """The previous Geocoder, making a new connection for every request"""
+
+    def geocode(self, loc, lang=None, filter_country_ids=None):
+        r = requests.get(self.uri, params={"text": loc})
+        r.raise_for_status()
+        for place in r.json():
+            for lineage in place["lineage"]:
+                return {
+                    "loc_id": place["id"],
+                    **{"loc_" + k: v["name"] for k, v in lineage.items()},
+                }
+        return {}
+
+
+def bench(name: str, func: Callable[[], List[Dict[str, Any]]], num_records: int):
+    set_geocode_cache({})
+    start = time.perf_counter()
+    data = func()
+    seconds = time.perf_counter() - start
+    assert len(data) == num_records
+    print(f"{name:45} {num_records / seconds:10.0f} records/s")
+
+
+def main(num_records: int = 5000, num_locations: int = 500, delay_ms: float = 2):
+    locations = [f"Place {i}, VIC" for i in range(num_locations)]
+    places = {loc: [make_place(i, loc, "Victoria")] for i, loc in enumerate(locations)}
+    records = [locations[(i * 7919) % num_locations] for i in range(num_records)]
+    with serve_placeholder(places, delay=delay_ms / 1000) as server:
+        geocoder = Geocoder(server.uri, filter_country_ids=(WOF_AUS,))
+        unpooled = UnpooledGeocoder(server.uri)
+        # The previous lru_cache of 128 entries rarely hit with many locations
+        bench(
+            "requests.get per record (previous, uncached)",
+            lambda: [unpooled.geocode(loc) for loc in records[:1000]],
+            1000,
+        )
+        bench(
+            "inline with session and cache",
+            lambda: [geocoder.geocode(loc) for loc in records],
+            num_records,
+        )
+
+        def deferred():
+            with deferred_geocoding():
+                data = [geocoder.geocode(loc) for loc in records]
+            return list(resolve_deferred_geocodes(data))
+
+        bench("deferred, batched and concurrent", deferred, num_records)
+
+
+if __name__ == "__main__":
+    main(*[kind(arg) for kind, arg in zip((int, int, float), sys.argv[1:])])
@@ -0,0 +1,24 @@
+"""Build a gazetteer CSV for offline geocoding from Who's on First
+
+Usage: python scripts/build_gazetteer.py WOF_SQLITE OUTPUT_CSV [COUNTRY ...]
+
+WOF_SQLITE is a Who's on First SQLite distribution, e.g. the admin data of
+Australia and New Zealand; countries default to AU and NZ.
+"""
+import sys
+
+from job_pipeline.lib.gazetteer import (
+    WOF_COUNTRIES,
+    read_wof_sqlite,
+    write_gazetteer,
+)
+
+
+def main(wof_path: str, output_path: str, *countries: str) -> None:
+    places = read_wof_sqlite(wof_path, countries or WOF_COUNTRIES)
+    write_gazetteer(output_path, places)
+    print(f"Wrote {len(places)} places to {output_path}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
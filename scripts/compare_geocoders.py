@@ -0,0 +1,74 @@
+"""Agreement of the offline gazetteer with Placeholder on normalised data
+
+Usage: python scripts/compare_geocoders.py GAZETTEER_CSV [NORMALISED_DIR]
+
+Geocodes the distinct location_raw values of the normalised Feather files
+with both backends, as the Australian sources do, and reports how often they
+agree and the time per lookup. Placeholder must be running on localhost:3000;
+its results are cached in the usual geocode cache.
+Some sources fix up location_raw before geocoding, so it isn't exactly the
+text they geocode.
+"""
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from job_pipeline.lib.gazetteer import (
+    Gazetteer,
+    agreement_rate,
+    compare_geocoders,
+)
+from job_pipeline.lib.geocodecache import GeocodeCache
+from job_pipeline.lib.normalise import (
+    WOF_AUS,
+    WOF_NZ,
+    Geocoder,
+    set_geocode_cache,
+)
+
+FILTER_COUNTRY_IDS = (WOF_AUS, WOF_NZ)
+
+
+def main(
+    gazetteer_path: str,
+    normalised_dir: str = "./data/03_secondary",
+    cache_path: str = "./data/00_cache/geocode.sqlite",
+) -> None:
+    locations = sorted(
+        {
+            location
+            for path in Path(normalised_dir).glob("*/*.feather")
+            for location in pd.read_feather(path, columns=["location_raw"])
+            .location_raw.dropna()
+            .unique()
+        }
+    )
+    start = time.perf_counter()
+    gazetteer = Gazetteer.from_csv(gazetteer_path)
+    print(
+        f"Loaded {len(gazetteer.places)} places in {time.perf_counter() - start:.1f}s"
+    )
+
+    start = time.perf_counter()
+    for location in locations:
+        gazetteer.geocode(location, FILTER_COUNTRY_IDS)
+    seconds = time.perf_counter() - start
+    print(f"Gazetteer: {seconds / max(len(locations), 1) * 1e6:.1f} µs per lookup")
+
+    with GeocodeCache(cache_path) as cache:
+        set_geocode_cache(cache)
+        placeholder = Geocoder(lang="en", filter_country_ids=FILTER_COUNTRY_IDS)
+        outcomes = compare_geocoders(
+            locations,
+            placeholder.geocode,
+            lambda location: gazetteer.geocode(location, FILTER_COUNTRY_IDS),
+        )
+    for outcome, count in outcomes.most_common():
+        print(f"{outcome:15} {count:8}")
+    print(f"Agreement on {len(locations)} locations: {agreement_rate(outcomes):.1%}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,134 @@
+"""Fake Common Crawl data server for tests"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, Generator, List, Tuple
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)")
+
+
+def make_warc(
+    pages: List[Tuple], filename: str = "crawl.warc.gz"
+) -> Tuple[bytes, List[Dict[str, str]]]:
+    """Write pages of (uri, html) to a gzipped WARC and return it with CDX rows
+
+    A page may also give its HTTP status line and Content-Type, as in
+    (uri, html, "404 Not Found", "text/html"); by default "200 OK" and
+    "text/html".
+    """
+    output = BytesIO()
+    writer = WARCWriter(output, gzip=True)
+    rows = []
+    for idx, (uri, html, *response) in enumerate(pages):
+        status, mime = response or ("200 OK", "text/html")
+        offset = output.tell()
+        http_headers = StatusAndHeaders(
+            status, [("Content-Type", mime)], protocol="HTTP/1.1"
+        )
+        record = writer.create_warc_record(
+            uri,
+            "response",
+            payload=BytesIO(html),
+            http_headers=http_headers,
+            warc_headers_dict={"WARC-Date": "2021-10-16T12:00:00Z"},
+        )
+        writer.write_record(record)
+        rows.append(
+            {
+                "urlkey": uri,
+                "timestamp": "20211016120000",
+                "url": uri,
+                "filename": filename,
+                "offset": str(offset),
+                "length": str(output.tell() - offset),
+                "digest": f"DIGEST{idx}",
+                "status": status.split()[0],
+                "mime": mime.split(";")[0],
+            }
+        )
+    return output.getvalue(), rows
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    files: Dict[str, bytes]
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        data = server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+        with server.lock:
+            server.ranges.append(self.headers.get("Range"))
+        match = RANGE_RE.fullmatch(self.headers.get("Range", ""))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            body = data[start : end + 1]
+            self.send_response(206)
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThrottlingHandler(RangeHandler):
+    """Returns 503 when more than server.capacity requests are in flight"""
+
+    delay = 0.01
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            overloaded = server.in_flight > server.capacity
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(self.delay)
+            if overloaded:
+                with server.lock:
+                    server.throttled += 1
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                super().do_GET()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@contextmanager
+def serve_files(
+    files: Dict[str, bytes], handler=RangeHandler
+) -> Generator[ThreadingHTTPServer, None, None]:
+    """Serve files over HTTP with Range support; server.url is the base URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.files = files  # type: ignore
+    server.requests = 0  # type: ignore
+    server.ranges = []  # type: ignore
+    server.in_flight = 0  # type: ignore
+    server.max_in_flight = 0  # type: ignore
+    server.throttled = 0  # type: ignore
+    server.capacity = float("inf")  # type: ignore
+    server.lock = threading.Lock()  # type: ignore
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"  # type: ignore
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
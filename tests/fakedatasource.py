@@ -0,0 +1,28 @@
+"""Fake Common Crawl datasources for tests
+
+They fetch the given CDX rows of each source from base_url, such as the URL
+of a tests.ccserver server, instead of querying the index.
+"""
+from job_pipeline.sources.commoncrawl_datasource import CommonCrawlDatasource
+
+
+class FakeDatasource(CommonCrawlDatasource):
+    name = "fake"
+    query = "example.com/job/*"
+    cdx_cache_path = None
+    disable_progress = True
+
+    def __init__(self, base_url, rows):
+        self.data_url = base_url
+        self.rows = rows
+
+    def fetch_source_rows(self, source):
+        return self.rows[source]
+
+    def normalise(self, *args, **kwargs):
+        return {}
+
+
+class UriDatasource(FakeDatasource):
+    def extract(self, html, uri, view_date):
+        return [{"uri": uri, "text": html.decode("utf-8")}]
@@ -0,0 +1,81 @@
+"""Fake Placeholder geocoding server for tests"""
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Generator, List
+from urllib.parse import parse_qs, urlparse
+
+WOF_AUS = 85632793
+
+
+def make_place(place_id: int, locality: str, region: str) -> Dict[str, Any]:
+    """A Placeholder result for a locality in a region of Australia"""
+    return {
+        "id": place_id,
+        "name": locality,
+        "placetype": "locality",
+        "lineage": [
+            {
+                "country": {"id": WOF_AUS, "name": "Australia"},
+                "region": {"id": place_id + 1, "name": region},
+                "locality": {"id": place_id, "name": locality},
+            }
+        ],
+    }
+
+
+class PlaceholderHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != "/parser/search":
+            self.send_error(404)
+            return
+        text = parse_qs(url.query).get("text", [""])[0]
+        with server.lock:
+            server.queries[text] += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        body = json.dumps(server.places.get(text, [])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve_placeholder(
+    places: Dict[str, List[Dict[str, Any]]], delay: float = 0.0
+) -> Generator[ThreadingHTTPServer, None, None]:
+    """Serve places by search text; server.uri is the search endpoint
+
+    Each response takes delay seconds. server.queries counts the requests for
+    each text, and server.max_in_flight is the most handled at once.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlaceholderHandler)
+    server.places = places  # type: ignore
+    server.queries = Counter()  # type: ignore
+    server.delay = delay  # type: ignore
+    server.in_flight = 0  # type: ignore
+    server.max_in_flight = 0  # type: ignore
+    server.lock = threading.Lock()  # type: ignore
+    server.uri = (  # type: ignore
+        f"http://127.0.0.1:{server.server_address[1]}/parser/search"
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,41 @@
+import json
+
+import job_pipeline.sources.abstract_datasource as abstract_datasource
+from job_pipeline.lib.serialize import read_data
+from job_pipeline.sources.abstract_datasource import AbstractDatasource
+
+
+class JsonLinesDatasource(AbstractDatasource):
+    """A datasource whose sources can't be split into records, like Kaggle"""
+
+    name = "jsonlines"
+    sources = {"jobs": "jobs"}
+    raw_extension = ".jsonl"
+
+    def download_one(self, path, source):
+        pass
+
+    def extract_one(self, path):
+        with open(path) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def normalise(self, **kwargs):
+        return kwargs
+
+
+def test_extract_unsplit_source_streams(tmp_path, monkeypatch):
+    def parallel_map(*args, **kwargs):
+        raise AssertionError("A single record shouldn't be sent to a worker")
+
+    monkeypatch.setattr(abstract_datasource, "parallel_map", parallel_map)
+    data = [{"uri": f"https://example.com/job/{i}"} for i in range(5)]
+    (tmp_path / "raw").mkdir()
+    with open(tmp_path / "raw" / "jobs.jsonl", "w") as f:
+        f.writelines(json.dumps(datum) + "\n" for datum in data)
+
+    datasource = JsonLinesDatasource()
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=4)
+
+    output = list(read_data(tmp_path / "extract" / "jobs.jsonl"))
+    assert output == data
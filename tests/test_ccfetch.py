@@ -0,0 +1,77 @@
+from io import BytesIO
+
+import pytest
+from warcio.archiveiterator import ArchiveIterator
+
+from job_pipeline.lib.ccfetch import fetch_all_ranges, plan_ranges
+from tests.ccserver import make_warc, serve_files
+
+PAGES = [
+    (f"https://example.com/job/{i}", f"<p>Job {i}</p>".encode()) for i in range(50)
+]
+
+
+def test_fetch_all_ranges():
+    data, rows = make_warc(PAGES)
+    with serve_files({"crawl.warc.gz": data}) as server:
+        results = list(fetch_all_ranges(rows, concurrency=8, base_url=server.url))
+    assert len(results) == len(rows)
+    for row, content in results:
+        record = next(ArchiveIterator(BytesIO(content)))
+        assert record.rec_headers["WARC-Target-URI"] == row["url"]
+
+
+def test_fetch_all_ranges_error():
+    data, rows = make_warc(PAGES)
+    rows[10] = {**rows[10], "filename": "missing.warc.gz"}
+    with serve_files({"crawl.warc.gz": data}) as server:
+        with pytest.raises(Exception):
+            list(fetch_all_ranges(rows, concurrency=4, base_url=server.url))
+
+
+def test_fetch_all_ranges_early_close():
+    data, rows = make_warc(PAGES)
+    with serve_files({"crawl.warc.gz": data}) as server:
+        results = fetch_all_ranges(rows, concurrency=4, base_url=server.url)
+        next(results)
+        results.close()
+
+
+def row(filename, offset, length):
+    return {"filename": filename, "offset": str(offset), "length": str(length)}
+
+
+def test_plan_ranges_coalesces_nearby():
+    rows = [row("b", 0, 10), row("a", 110, 10), row("a", 0, 100), row("a", 200, 10)]
+    spans = plan_ranges(rows, max_gap=10)
+    assert [(s.filename, s.start, s.end, len(s.rows)) for s in spans] == [
+        ("a", 0, 120, 2),
+        ("a", 200, 210, 1),
+        ("b", 0, 10, 1),
+    ]
+
+
+def test_plan_ranges_max_span():
+    rows = [row("a", 10 * i, 10) for i in range(10)]
+    spans = plan_ranges(rows, max_gap=0, max_span=30)
+    assert [len(s.rows) for s in spans] == [3, 3, 3, 1]
+
+
+def test_plan_ranges_no_coalesce():
+    rows = [row("a", 10 * i, 10) for i in range(10)]
+    assert len(plan_ranges(rows, max_gap=None)) == 10
+
+
+def test_fetch_all_ranges_coalesced():
+    data, rows = make_warc(PAGES)
+    # Skip some records to leave gaps
+    rows = rows[::2]
+    with serve_files({"crawl.warc.gz": data}) as server:
+        results = list(
+            fetch_all_ranges(rows, concurrency=4, base_url=server.url, max_gap=1024)
+        )
+        assert server.requests == 1
+    assert sorted(r["url"] for r, _ in results) == sorted(r["url"] for r in rows)
+    for row_, content in results:
+        record = next(ArchiveIterator(BytesIO(content)))
+        assert record.rec_headers["WARC-Target-URI"] == row_["url"]
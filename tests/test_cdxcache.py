@@ -0,0 +1,76 @@
+from job_pipeline.lib.cdxcache import CdxCache
+
+API = "https://index.commoncrawl.org/CC-MAIN-2021-43-index"
+
+
+class FakeIndex:
+    def __init__(self, num_pages=3, rows_per_page=4):
+        self.pages = num_pages
+        self.rows_per_page = rows_per_page
+        self.num_pages_calls = 0
+        self.page_calls = []
+
+    def num_pages(self, api, query, filters):
+        self.num_pages_calls += 1
+        return self.pages
+
+    def query_page(self, api, query, page, filters):
+        self.page_calls.append(page)
+        return [
+            {
+                "url": f"https://example.com/{page}/{i}",
+                "filename": f"file-{i % 2}.warc.gz",
+                "offset": str(1000 * page + i),
+                "length": "10",
+            }
+            for i in range(self.rows_per_page)
+        ]
+
+
+def run_query(cache, index):
+    return cache.query(
+        API,
+        "example.com/*",
+        ["!~url:.*/apply/*"],
+        num_pages_fn=index.num_pages,
+        page_fn=index.query_page,
+    )
+
+
+def test_cdx_cache_sorted(tmp_path):
+    index = FakeIndex()
+    with CdxCache(tmp_path / "cdx.sqlite") as cache:
+        rows = run_query(cache, index)
+        assert len(rows) == 12
+        keys = [(row["filename"], int(row["offset"])) for row in rows]
+    assert keys == sorted(keys)
+    assert sorted(index.page_calls) == [0, 1, 2]
+
+
+def test_cdx_cache_not_requeried(tmp_path):
+    with CdxCache(tmp_path / "cdx.sqlite") as cache:
+        run_query(cache, FakeIndex())
+    index = FakeIndex()
+    with CdxCache(tmp_path / "cdx.sqlite") as cache:
+        rows = list(run_query(cache, index))
+    assert len(rows) == 12
+    assert index.num_pages_calls == 0
+    assert index.page_calls == []
+
+
+def test_cdx_cache_keeps_pages_on_error(tmp_path):
+    class FlakyIndex(FakeIndex):
+        def query_page(self, api, query, page, filters):
+            if page == 1:
+                raise IOError("Server error")
+            return super().query_page(api, query, page, filters)
+
+    with CdxCache(tmp_path / "cdx.sqlite") as cache:
+        try:
+            run_query(cache, FlakyIndex())
+        except IOError:
+            pass
+        index = FakeIndex()
+        rows = run_query(cache, index)
+        assert index.page_calls == [1]
+        assert len(rows) == 12
@@ -0,0 +1,150 @@
+import gzip
+import json
+
+import pytest
+
+from job_pipeline.lib.cdxcache import CdxCache
+from job_pipeline.lib.cdxlocal import (
+    cdx_filter,
+    local_cdx_api,
+    local_cdx_num_pages,
+    local_cdx_query,
+    local_cdx_query_page,
+    parse_cdx_line,
+    surt_key,
+)
+
+API = "https://index.commoncrawl.org/CC-MAIN-2022-05-index"
+
+
+def cdx_row(host, path, status="200", mime="text/html"):
+    urlkey = ",".join(reversed(host.split("."))) + ")" + path
+    return {
+        "urlkey": urlkey,
+        "timestamp": "20220120000000",
+        "url": f"https://{host}{path}",
+        "mime": mime,
+        "status": status,
+        "digest": urlkey.upper(),
+        "length": "1000",
+        "offset": "0",
+        "filename": "crawl-data/CC-MAIN-2022-05/segments/warc/00000.warc.gz",
+    }
+
+
+def make_index(root, rows, block_size=3, shard_size=2):
+    """Write rows as a local CDX index with blocks of block_size lines"""
+    indexes = local_cdx_api(root, API)
+    (root / "cc-index/collections/CC-MAIN-2022-05/indexes").mkdir(parents=True)
+    rows = sorted(rows, key=lambda row: (row["urlkey"], row["timestamp"]))
+    blocks = [rows[i : i + block_size] for i in range(0, len(rows), block_size)]
+    cluster = []
+    for shard_num in range(0, len(blocks), shard_size):
+        shard = f"cdx-{shard_num // shard_size:05d}.gz"
+        with open(f"{indexes}/{shard}", "wb") as f:
+            for block in blocks[shard_num : shard_num + shard_size]:
+                lines = "".join(
+                    f"{row['urlkey']} {row['timestamp']} "
+                    + json.dumps(
+                        {
+                            k: v
+                            for k, v in row.items()
+                            if k not in ("urlkey", "timestamp")
+                        }
+                    )
+                    + "\n"
+                    for row in block
+                )
+                data = gzip.compress(lines.encode("utf-8"))
+                first = block[0]
+                cluster.append(
+                    f"{first['urlkey']} {first['timestamp']}\t{shard}\t"
+                    f"{f.tell()}\t{len(data)}\t{len(cluster) + 1}\n"
+                )
+                f.write(data)
+    with open(f"{indexes}/cluster.idx", "w") as f:
+        f.writelines(cluster)
+    return indexes
+
+
+ROWS = (
+    [cdx_row("aaa.com.au", f"/job/{i}") for i in range(5)]
+    + [cdx_row("seek.com.au", f"/job/{i}") for i in range(10)]
+    + [cdx_row("seek.com.au", f"/job/{i}/apply") for i in range(3)]
+    + [cdx_row("seek.com.au", "/job/99", status="404")]
+    + [cdx_row("seek.com.au", "/jobs"), cdx_row("zzz.com.au", "/job/1")]
+)
+
+
+@pytest.mark.parametrize(
+    "query,key",
+    [
+        ("seek.com.au/job/*", "au,com,seek)/job/"),
+        ("https://www.Seek.com.au/job/*", "au,com,seek)/job/"),
+        ("careers.vic.gov.au/*", "au,gov,vic,careers)/"),
+        ("seek.com.au/job/1", "au,com,seek)/job/1 "),
+    ],
+)
+def test_surt_key(query, key):
+    assert surt_key(query) == key
+
+
+@pytest.mark.parametrize(
+    "filter_string,matches",
+    [
+        ("=status:200", True),
+        ("=status:20", False),
+        ("!=status:200", False),
+        ("~url:seek", True),
+        ("~url:.*seek", False),
+        ("url:.*seek", True),
+        ("url:seek", False),
+        ("!~url:/apply", True),
+        ("statuscode:2..", True),
+        ("~com,seek", True),
+    ],
+)
+def test_cdx_filter(filter_string, matches):
+    row = cdx_row("seek.com.au", "/job/1")
+    line = f"{row['urlkey']} {row['timestamp']} {json.dumps(row)}"
+    assert cdx_filter(filter_string)(row, line) == matches
+
+
+def test_parse_cdx_line():
+    row = cdx_row("seek.com.au", "/job/1")
+    fields = {k: v for k, v in row.items() if k not in ("urlkey", "timestamp")}
+    line = f"{row['urlkey']} {row['timestamp']} {json.dumps(fields)}"
+    parsed = parse_cdx_line((line[:-1] + ', "languages": "eng"}').encode())
+    assert parsed == {**row, "mime-detected": "", "redirect": ""}
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 100])
+def test_local_cdx_query(tmp_path, block_size):
+    api = make_index(tmp_path, ROWS, block_size)
+    query = "www.seek.com.au/job/*"
+    results = list(local_cdx_query(api, query, ["!~url:/apply"]))
+    assert sorted(row["url"] for row in results) == sorted(
+        f"https://seek.com.au/job/{i}" for i in range(10)
+    )
+    # Only blocks that can contain the query are read
+    assert local_cdx_num_pages(api, query) <= 19 // block_size + 2
+
+
+def test_local_cdx_query_missing(tmp_path):
+    api = make_index(tmp_path, ROWS)
+    assert list(local_cdx_query(api, "example.com/*")) == []
+    assert list(local_cdx_query(api, "zzzz.com.au/*")) == []
+
+
+def test_cdx_cache_local_query(tmp_path):
+    api = make_index(tmp_path / "mirror", ROWS)
+    with CdxCache(tmp_path / "cdx.sqlite") as cache:
+        results = cache.query(
+            api,
+            "aaa.com.au/job/*",
+            num_pages_fn=local_cdx_num_pages,
+            page_fn=local_cdx_query_page,
+        )
+        assert sorted(row["url"] for row in results) == [
+            f"https://aaa.com.au/job/{i}" for i in range(5)
+        ]
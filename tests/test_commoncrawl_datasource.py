@@ -0,0 +1,312 @@
+import gzip
+import json
+import logging
+
+import pytest
+
+from job_pipeline.lib.cc import cdx_row_key
+from job_pipeline.lib.digestindex import DigestIndex
+from job_pipeline.lib.extractmanifest import read_manifest
+from job_pipeline.lib.warcindex import read_warc_index, scan_warc
+from job_pipeline.sources.commoncrawl_datasource import (
+    DIGEST_INDEX_NAME,
+    check_warc_member,
+    read_warc_responses,
+)
+from tests.ccserver import RANGE_RE, RangeHandler, make_warc, serve_files
+from tests.fakedatasource import FakeDatasource, UriDatasource
+
+
+def test_download_deduplicates_across_sources(tmp_path):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(6)]
+    data, rows = make_warc(pages)
+    # The second crawl recaptures jobs 2 and 3 unchanged
+    recaptured = [{**row, "timestamp": "20211201000000"} for row in rows[2:4]]
+    datasource = FakeDatasource(
+        None, {"crawl-2": rows[:4], "crawl-1": recaptured + rows[4:]}
+    )
+    datasource.sources = {"crawl-2": "crawl-2", "crawl-1": "crawl-1"}
+    datasource.deduplicate = True
+    with serve_files({"crawl.warc.gz": data}) as server:
+        datasource.data_url = server.url
+        datasource.download(tmp_path)
+
+    def uris(name):
+        return [
+            record.rec_headers["WARC-Target-URI"]
+            for record in read_warc_responses(tmp_path / f"{name}.warc.gz")
+        ]
+
+    assert sorted(uris("crawl-2")) == [page[0] for page in pages[:4]]
+    assert sorted(uris("crawl-1")) == [page[0] for page in pages[4:]]
+
+
+def test_download_keeps_recaptures_by_default(tmp_path):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(6)]
+    data, rows = make_warc(pages)
+    recaptured = [{**row, "timestamp": "20211201000000"} for row in rows[2:4]]
+    datasource = FakeDatasource(
+        None, {"crawl-2": rows[:4], "crawl-1": recaptured + rows[4:]}
+    )
+    datasource.sources = {"crawl-2": "crawl-2", "crawl-1": "crawl-1"}
+    with serve_files({"crawl.warc.gz": data}) as server:
+        datasource.data_url = server.url
+        datasource.download(tmp_path)
+
+    uris = [
+        record.rec_headers["WARC-Target-URI"]
+        for record in read_warc_responses(tmp_path / "crawl-1.warc.gz")
+    ]
+    assert sorted(uris) == [page[0] for page in pages[2:]]
+    assert not (tmp_path / DIGEST_INDEX_NAME).exists()
+
+
+class FailingRangeHandler(RangeHandler):
+    """Fails requests for ranges starting at server.fail_offsets"""
+
+    def do_GET(self):
+        match = RANGE_RE.fullmatch(self.headers.get("Range", ""))
+        if match and int(match.group(1)) in self.server.fail_offsets:
+            self.send_error(404)
+            return
+        super().do_GET()
+
+
+def test_download_resumes_after_torn_journal(tmp_path):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(6)]
+    data, rows = make_warc(pages)
+    path = tmp_path / "crawl.warc.gz"
+    # A crash while writing the third record and its journal entry
+    offsets = [int(row["offset"]) for row in rows]
+    (tmp_path / "crawl.warc.gz.tmp").write_bytes(data[: offsets[2] + 10])
+    (tmp_path / "crawl.warc.gz.tmp.journal").write_text(
+        f"{cdx_row_key(rows[0])}\t{offsets[1]}\n"
+        f"{cdx_row_key(rows[1])}\t{offsets[2]}\n"
+        f"{cdx_row_key(rows[2])}\t"
+    )
+    datasource = FakeDatasource(None, {"crawl": rows})
+    datasource.max_range_gap = None
+    datasource.concurrency = 1
+    with serve_files({"crawl.warc.gz": data}, FailingRangeHandler) as server:
+        datasource.data_url = server.url
+        server.fail_offsets = {offsets[4]}
+        with pytest.raises(Exception):
+            datasource.download_one(path, "crawl")
+        assert not path.exists()
+        server.fail_offsets = set()
+        datasource.download_one(path, "crawl")
+
+    uris = [
+        record.rec_headers["WARC-Target-URI"] for record in read_warc_responses(path)
+    ]
+    assert sorted(uris) == [page[0] for page in pages]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_one(tmp_path, caplog, workers):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(20)]
+    data, rows = make_warc(pages)
+    datasource = UriDatasource(None, {"crawl": rows})
+    datasource.deduplicate = True
+    with serve_files({"crawl.warc.gz": data}) as server:
+        datasource.data_url = server.url
+        datasource.stream_one(
+            tmp_path / "crawl.jsonl", "crawl", tmp_path / "crawl.warc.gz", workers
+        )
+
+    output = [json.loads(line) for line in open(tmp_path / "crawl.jsonl")]
+    assert sorted((d["uri"], d["text"].encode()) for d in output) == sorted(pages)
+    assert list(datasource.extract_one(tmp_path / "crawl.warc.gz")) == output
+
+    # The raw output is indexed and the extract is up to date
+    assert read_warc_index(tmp_path / "crawl.warc.gz") == scan_warc(
+        tmp_path / "crawl.warc.gz"
+    )
+    with caplog.at_level(logging.INFO):
+        datasource.extract_file(
+            tmp_path / "crawl.warc.gz", tmp_path / "crawl.jsonl", workers=workers
+        )
+    assert "crawl.jsonl is up to date" in caplog.text
+    with DigestIndex(tmp_path / DIGEST_INDEX_NAME) as digests:
+        digests.start_source("crawl-2", set())
+        assert not any(digests.claim(row) for row in rows)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_extract_all(tmp_path, workers):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(50)]
+    data, rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = UriDatasource(None, {})
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [(d["uri"], d["text"].encode()) for d in output] == pages
+
+
+class CountingDatasource(UriDatasource):
+    def extract(self, html, uri, view_date):
+        with open(self.count_path, "a") as f:
+            f.write(uri + "\n")
+        return super().extract(html, uri, view_date)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_all_incremental(tmp_path, workers):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(9)]
+    raw_path = tmp_path / "raw" / "crawl.warc.gz"
+    dest_path = tmp_path / "extract" / "crawl.jsonl"
+    raw_path.parent.mkdir()
+    datasource = CountingDatasource(None, {})
+    datasource.count_path = tmp_path / "extracted.txt"
+
+    def extract_all(num_pages):
+        datasource.count_path.write_text("")
+        datasource.extract_all(raw_path.parent, dest_path.parent, workers=workers)
+        output = [json.loads(line) for line in open(dest_path)]
+        assert [(d["uri"], d["text"].encode()) for d in output] == pages[:num_pages]
+        return datasource.count_path.read_text().split()
+
+    data, _rows = make_warc(pages[:6])
+    raw_path.write_bytes(data)
+    assert len(extract_all(6)) == 6
+    assert extract_all(6) == []
+
+    # The WARC grows, e.g. when a download is resumed
+    data, _rows = make_warc(pages[6:])
+    with open(raw_path, "ab") as f:
+        f.write(data)
+    assert sorted(extract_all(9)) == [uri for uri, _html in pages[6:]]
+
+    datasource.extract_version = 2
+    assert len(extract_all(9)) == 9
+    assert extract_all(9) == []
+
+    datasource.extract_fields = ["title"]
+    assert len(extract_all(9)) == 9
+    datasource.extract_full = True
+    assert len(extract_all(9)) == 9
+    assert extract_all(9) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_prefilter_markers(tmp_path, caplog, workers):
+    pages = [
+        (
+            f"https://example.com/job/{i}",
+            f"Job {i}".encode() + b" JobPosting" * (i % 3 == 0),
+        )
+        for i in range(30)
+    ]
+    data, rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = UriDatasource(None, {})
+    datasource.prefilter_markers = (b"job ", b"jobposting")
+    with caplog.at_level(logging.INFO):
+        datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [(d["uri"], d["text"].encode()) for d in output] == pages[::3]
+    assert "Skipped 20 of 30 records" in caplog.text
+
+    datasource.prefilter_markers = (b"job ",)
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [(d["uri"], d["text"].encode()) for d in output] == pages
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_filter_responses(tmp_path, caplog, workers):
+    pages = [
+        ("https://example.com/job/1", b"Job 1"),
+        ("https://example.com/job/2", b"Gone", "404 Not Found", "text/html"),
+        ("https://example.com/job/3", b"PNG", "200 OK", "image/png"),
+        ("https://example.com/job/4", b"Job 4", "200 OK", "text/html; charset=utf-8"),
+        ("https://example.com/job/5", b"Moved", "301 Moved Permanently", "text/html"),
+        ("https://example.com/job/6", b"Job 6", "200 OK", "application/xhtml+xml"),
+    ]
+    expected = [(pages[i][0], pages[i][1]) for i in (0, 3, 5)]
+    data, rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = UriDatasource(None, {"crawl": rows})
+    with caplog.at_level(logging.INFO):
+        datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [(d["uri"], d["text"].encode()) for d in output] == expected
+    assert "Skipped 3 of 6 responses by HTTP status or Content-Type" in caplog.text
+    assert list(datasource.extract_one(tmp_path / "raw" / "crawl.warc.gz")) == output
+
+    with serve_files({"crawl.warc.gz": data}) as server:
+        datasource.data_url = server.url
+        datasource.stream_one(
+            tmp_path / "stream.jsonl", "crawl", tmp_path / "crawl.warc.gz", workers
+        )
+    output = [json.loads(line) for line in open(tmp_path / "stream.jsonl")]
+    assert sorted((d["uri"], d["text"].encode()) for d in output) == expected
+
+    datasource.accepted_statuses = None
+    datasource.accepted_mime_types = None
+    output = list(datasource.extract_one(tmp_path / "raw" / "crawl.warc.gz"))
+    assert len(output) == len(pages)
+    # Records filtered out before are extracted once the filters change
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [d["uri"] for d in output] == [page[0] for page in pages]
+
+
+def test_oversized_records_are_not_read(tmp_path):
+    pages = [(f"https://example.com/job/{i}", b"x" * 100 * i) for i in range(1, 4)]
+    data, rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = UriDatasource(None, {})
+    datasource.max_record_size = 150
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=2)
+
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert [d["uri"] for d in output] == [pages[0][0]]
+    quarantine = (tmp_path / "extract" / "crawl.jsonl.quarantine").read_text()
+    assert [json.loads(line)["status"] for line in quarantine.splitlines()] == [
+        "oversized",
+        "oversized",
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_quarantined_records_retried_when_limits_change(tmp_path, caplog, workers):
+    pages = [(f"https://example.com/job/{i}", b"x" * 100 * i) for i in range(1, 4)]
+    data, rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = UriDatasource(None, {})
+    datasource.max_record_size = 150
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    quarantine_path = tmp_path / "extract" / "crawl.jsonl.quarantine"
+    manifest = read_manifest(tmp_path / "extract" / "crawl.jsonl")
+    assert len(manifest.records) == 1 and len(manifest.quarantined) == 2
+
+    caplog.clear()
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+    assert "Quarantined" not in caplog.text
+    assert len(quarantine_path.read_text().splitlines()) == 2
+
+    datasource.max_record_size = 1000
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    output = [json.loads(line) for line in open(tmp_path / "extract" / "crawl.jsonl")]
+    assert sorted(d["uri"] for d in output) == [uri for uri, _ in pages]
+    assert not quarantine_path.exists()
+
+
+def test_check_warc_member():
+    data, rows = make_warc([("https://example.com/job/1", b"Job")])
+    check_warc_member(data)
+    with pytest.raises(ValueError):
+        check_warc_member(b"WARC/1.0\r\n")
+    with pytest.raises(ValueError):
+        check_warc_member(gzip.compress(b"<html></html>"))
@@ -0,0 +1,85 @@
+import json
+import time
+
+import pytest
+
+from job_pipeline.lib.extractguard import (
+    EXTRACTED,
+    OVERSIZED,
+    TIMED_OUT,
+    TimeBudgetExceeded,
+    guarded_extract,
+    quarantine_path,
+    time_limit,
+)
+from tests.ccserver import make_warc
+from tests.fakedatasource import UriDatasource
+
+
+def test_time_limit():
+    with pytest.raises(TimeBudgetExceeded):
+        with time_limit(0.05):
+            time.sleep(1)
+    with time_limit(0.5):
+        time.sleep(0.01)
+    # The timer is cancelled when the block finishes
+    time.sleep(0.6)
+
+
+def test_guarded_extract():
+    def extract(record):
+        time.sleep(record)
+        return [{"slept": record}]
+
+    outcome = guarded_extract(extract, 0.01, "u", "d", 10, 100, 1.0)
+    assert outcome.status == EXTRACTED
+    assert outcome.data == [{"slept": 0.01}]
+    assert guarded_extract(extract, 0.01, "u", "d", 101, 100, 1.0).status == OVERSIZED
+    outcome = guarded_extract(extract, 2, "u", "d", 10, None, 0.05)
+    assert outcome.status == TIMED_OUT
+    assert outcome.seconds < 1
+
+
+def test_guarded_extract_not_caught_by_extractor():
+    def extract(record):
+        try:
+            time.sleep(record)
+        except Exception:
+            pass
+        time.sleep(record)
+        return []
+
+    outcome = guarded_extract(extract, 1, "u", "d", 10, None, 0.05)
+    assert outcome.status == TIMED_OUT
+    assert outcome.seconds < 0.5
+
+
+class SlowDatasource(UriDatasource):
+    max_record_size = 1000
+    record_time_budget = 0.2
+
+    def extract(self, html, uri, view_date):
+        if b"slow" in html:
+            time.sleep(5)
+        return super().extract(html, uri, view_date)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_all_quarantines_records(tmp_path, workers):
+    pages = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(6)]
+    pages[1] = (pages[1][0], b"slow")
+    pages[4] = (pages[4][0], b"x" * 2000)
+    data, _rows = make_warc(pages)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "crawl.warc.gz").write_bytes(data)
+    datasource = SlowDatasource(None, {})
+    datasource.extract_all(tmp_path / "raw", tmp_path / "extract", workers=workers)
+
+    dest_path = tmp_path / "extract" / "crawl.jsonl"
+    output = [json.loads(line) for line in open(dest_path)]
+    assert [d["uri"] for d in output] == [pages[i][0] for i in (0, 2, 3, 5)]
+    quarantined = [json.loads(line) for line in open(quarantine_path(dest_path))]
+    assert [(q["uri"], q["status"]) for q in quarantined] == [
+        (pages[1][0], TIMED_OUT),
+        (pages[4][0], OVERSIZED),
+    ]
@@ -0,0 +1,77 @@
+import pytest
+
+from job_pipeline.lib.extractlib import (
+    ParseError,
+    extract_braces,
+    parse_js_obj,
+    project_fields,
+)
+
+PAGE = """<html><script>var x = "{";
+window.REDUX_DATA = {"a": {"b": "}\\"{"}, "c": [1, null], "d": "café"};
+</script></html>"""
+
+OBJECT = {"a": {"b": '}"{'}, "c": [1, None], "d": "café"}
+
+
+@pytest.mark.parametrize("page", [PAGE, PAGE.encode("utf-8")])
+def test_parse_js_obj(page):
+    assert parse_js_obj(page, "REDUX_DATA =") == OBJECT
+    assert parse_js_obj(page, "APP_DATA =") is None
+
+
+@pytest.mark.parametrize(
+    "js",
+    [
+        # Valid JSON except for undefined
+        '{"a": {"b": "}\\"{"}, "c": [1, undefined], "d": "café"}',
+        # Needs a JavaScript parser
+        "{a: {'b': '}\"{'}, \"c\": [1, undefined], d: 'café'}",
+        # Not directly after init
+        'JSON.parse({"a": {"b": "}\\"{"}, "c": [1, null], "d": "café"})',
+    ],
+)
+def test_parse_js_obj_javascript(js):
+    page = f"<script>window.APP_DATA = {js};</script><p>{{</p>"
+    assert parse_js_obj(page, "APP_DATA =") == OBJECT
+    assert parse_js_obj(page.encode("utf-8"), b"APP_DATA =") == OBJECT
+
+
+def test_parse_js_obj_unbalanced():
+    assert parse_js_obj('x = {"a": {"b": 1}', "x =") is None
+    assert parse_js_obj('x = {"a": "b}', "x =") is None
+
+
+def test_extract_braces():
+    assert extract_braces('  {"a": "{", "b": {"c": "\\\\"}} }') == (
+        '{"a": "{", "b": {"c": "\\\\"}}'
+    )
+    with pytest.raises(ParseError):
+        extract_braces('"a" {}')
+    with pytest.raises(ParseError):
+        extract_braces("} {}")
+
+
+def test_project_fields():
+    data = {
+        "title": "Ranger",
+        "advertiser": {"id": 1, "description": "NPWS"},
+        "attributes": [{"name": "Salary", "value": "$1", "id": 2}, "x"],
+        "location": {"suburb": "Katoomba", "state": "NSW"},
+        "blob": {"a": 1},
+    }
+    fields = [
+        "title",
+        "advertiser.description",
+        "attributes.name",
+        "attributes.value",
+        "location.suburb",
+        "location",
+        "missing.field",
+    ]
+    assert project_fields(data, fields) == {
+        "title": "Ranger",
+        "advertiser": {"description": "NPWS"},
+        "attributes": [{"name": "Salary", "value": "$1"}, "x"],
+        "location": {"suburb": "Katoomba", "state": "NSW"},
+    }
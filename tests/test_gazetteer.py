@@ -0,0 +1,178 @@
+import json
+import sqlite3
+
+import pytest
+
+from job_pipeline.lib.gazetteer import (
+    DIFFERENT,
+    NEITHER,
+    SAME,
+    Gazetteer,
+    Place,
+    agreement_rate,
+    compare_geocoders,
+    read_gazetteer,
+    read_wof_sqlite,
+    write_gazetteer,
+)
+from job_pipeline.lib.normalise import (
+    WOF_AUS,
+    WOF_NZ,
+    Geocoder,
+    set_gazetteer,
+    set_geocode_cache,
+)
+from tests.placeholderserver import serve_placeholder
+
+WOF_OCEANIA = 102191583
+
+PLACES = [
+    Place(WOF_OCEANIA, None, "Oceania", "continent"),
+    Place(WOF_AUS, WOF_OCEANIA, "Australia", "country", ("AU",)),
+    Place(WOF_NZ, WOF_OCEANIA, "New Zealand", "country", ("NZ",)),
+    Place(1, WOF_AUS, "Victoria", "region", ("VIC",)),
+    Place(2, WOF_AUS, "New South Wales", "region", ("NSW",)),
+    Place(3, WOF_NZ, "Northland", "region"),
+    Place(10, 1, "Carlton", "locality"),
+    Place(11, 2, "Carlton", "locality"),
+    Place(12, 1, "Melbourne", "locality", ("Melbourne CBD",)),
+    Place(13, 3, "Whangārei", "locality"),
+    Place(20, 1, "3053", "postalcode"),
+]
+
+
+@pytest.fixture
+def gazetteer():
+    return Gazetteer(PLACES)
+
+
+@pytest.mark.parametrize(
+    "text,place_id",
+    [
+        ("Carlton, VIC", 10),
+        ("carlton, new south wales, australia", 11),
+        ("Carlton VIC 3053", 10),
+        ("Carlton", 10),
+        ("Melbourne CBD, Melbourne, Victoria, Australia", 12),
+        ("Victoria, AU", 1),
+        ("WHANGAREI", 13),
+        ("3053", 20),
+        ("Somewhere, VIC", 1),
+        ("Somewhere", None),
+        ("", None),
+    ],
+)
+def test_search(gazetteer, text, place_id):
+    place = gazetteer.search(text)
+    assert (place and place.id) == place_id
+
+
+def test_geocode(gazetteer):
+    assert gazetteer.geocode("Carlton, NSW") == {
+        "loc_id": 11,
+        "loc_locality": "Carlton",
+        "loc_region": "New South Wales",
+        "loc_country": "Australia",
+        "loc_continent": "Oceania",
+    }
+    assert gazetteer.geocode("Carlton, VIC", [WOF_NZ]) == {}
+    assert gazetteer.geocode("Carlton, Northland", [WOF_NZ]) == {
+        "loc_id": 3,
+        "loc_region": "Northland",
+        "loc_country": "New Zealand",
+        "loc_continent": "Oceania",
+    }
+
+
+def test_gazetteer_csv(tmp_path):
+    write_gazetteer(tmp_path / "gazetteer.csv", PLACES)
+    assert read_gazetteer(tmp_path / "gazetteer.csv") == PLACES
+
+
+def test_read_wof_sqlite(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "wof.db"))
+    db.executescript("""
+        CREATE TABLE spr (
+            id INTEGER, parent_id INTEGER, name TEXT, placetype TEXT,
+            country TEXT, is_current INTEGER, is_deprecated INTEGER,
+            is_superseded INTEGER
+        );
+        CREATE TABLE names (id INTEGER, language TEXT, privateuse TEXT, name TEXT);
+        CREATE TABLE geojson (id INTEGER, body TEXT);
+        """)
+    db.executemany(
+        "INSERT INTO spr VALUES (?, ?, ?, ?, ?, ?, 0, 0)",
+        [
+            (WOF_OCEANIA, -1, "Oceania", "continent", "", 1),
+            (102191575, -1, "North America", "continent", "", 1),
+            (WOF_AUS, WOF_OCEANIA, "Australia", "country", "AU", 1),
+            (1, WOF_AUS, "Victoria", "region", "AU", -1),
+            (10, 1, "Carlton", "locality", "AU", 1),
+            (14, 1, "Old Carlton", "locality", "AU", 0),
+            (30, 1, "A Venue", "venue", "AU", 1),
+            (40, 102191575, "United States", "country", "US", 1),
+        ],
+    )
+    db.executemany(
+        "INSERT INTO names VALUES (?, ?, ?, ?)",
+        [
+            (WOF_AUS, "eng", "x_preferred", "Australia"),
+            (WOF_AUS, "fra", "x_preferred", "Australie"),
+            (1, "eng", "x_variant", "Victoria State"),
+        ],
+    )
+    db.executemany(
+        "INSERT INTO geojson VALUES (?, ?)",
+        [
+            (WOF_AUS, json.dumps({"properties": {"wof:abbreviation": "AU"}})),
+            (1, json.dumps({"properties": {"wof:abbreviation": "VIC"}})),
+            (10, json.dumps({"properties": {}})),
+        ],
+    )
+    db.commit()
+    db.close()
+    assert sorted(read_wof_sqlite(tmp_path / "wof.db")) == [
+        Place(1, WOF_AUS, "Victoria", "region", ("Victoria State", "VIC")),
+        Place(10, 1, "Carlton", "locality"),
+        Place(WOF_AUS, WOF_OCEANIA, "Australia", "country", ("AU",)),
+        Place(WOF_OCEANIA, None, "Oceania", "continent"),
+    ]
+
+
+def placeholder_places(gazetteer, texts):
+    """Placeholder results agreeing with gazetteer"""
+    places = {}
+    for text in texts:
+        place = gazetteer.search(text)
+        if place is not None:
+            lineage = {
+                ancestor.placetype: {"id": ancestor.id, "name": ancestor.name}
+                for ancestor in gazetteer.lineage(place.id)
+            }
+            places[text] = [{"id": place.id, "lineage": [lineage]}]
+    return places
+
+
+def test_compare_geocoders(gazetteer):
+    texts = ["Carlton, VIC", "Carlton, NSW", "Melbourne", "Carlton", "Somewhere"]
+    places = placeholder_places(gazetteer, texts)
+    # Placeholder prefers Carlton in New South Wales
+    places["Carlton, VIC"] = places["Carlton, NSW"]
+    # and names the same place's region differently
+    places["Carlton"][0]["lineage"][0]["region"]["name"] = "Victoria State"
+    set_geocode_cache({})
+    with serve_placeholder(places) as server:
+        geocoder = Geocoder(server.uri, filter_country_ids=(WOF_AUS,))
+        assert geocoder.geocode("Melbourne") == gazetteer.geocode("Melbourne")
+        outcomes = compare_geocoders(texts, geocoder.geocode, gazetteer.geocode)
+        assert outcomes == {SAME: 2, DIFFERENT: 2, NEITHER: 1}
+        assert agreement_rate(outcomes) == 0.6
+
+        queries = sum(server.queries.values())
+        set_gazetteer(gazetteer)
+        try:
+            assert geocoder.geocode("Carlton, VIC")["loc_id"] == 10
+            assert geocoder.geocode("Whangarei") == {}
+        finally:
+            set_gazetteer(None)
+        assert sum(server.queries.values()) == queries
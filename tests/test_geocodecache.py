@@ -0,0 +1,84 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+import job_pipeline.lib.geocodecache
+from job_pipeline.lib.geocodecache import GeocodeCache
+
+KEY = ("http://localhost:3000/parser/search", "Carlton, VIC", "en", (85632793,))
+RESULT = {"loc_id": 101, "loc_locality": "Carlton"}
+
+
+def test_geocode_cache_roundtrip(tmp_path):
+    with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+        assert cache.get(KEY) is None
+        cache[KEY] = RESULT
+        cache[KEY[:3] + (None,)] = {}
+        assert cache[KEY] == RESULT
+    with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+        assert cache.get(KEY) == RESULT
+        assert cache[KEY[:3] + (None,)] == {}
+        assert set(cache) == {KEY, KEY[:3] + (None,)}
+        del cache[KEY]
+        assert KEY not in cache
+        assert cache.run_stats() == (2, 1)
+        assert "hit_rate=66.7%" in repr(cache)
+    with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+        assert cache.saved_stats() == (3, 2)
+
+
+def test_geocode_cache_ttl(tmp_path, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(job_pipeline.lib.geocodecache.time, "time", lambda: now)
+    with GeocodeCache(tmp_path / "geocode.sqlite", ttl=60) as cache:
+        cache[KEY] = RESULT
+        now += 30
+        assert cache.get(KEY) == RESULT
+        now += 31
+        assert cache.get(KEY) is None
+        assert len(cache) == 0
+        cache[KEY] = RESULT
+        assert len(cache) == 1
+
+
+def test_geocode_cache_evicts_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_pipeline.lib.geocodecache, "EVICT_INTERVAL", 2)
+    with GeocodeCache(tmp_path / "geocode.sqlite", max_entries=3) as cache:
+        for i in range(6):
+            cache[("uri", f"place {i}", None, None)] = {"loc_id": i}
+        assert len(cache) == 3
+        assert [cache.get(("uri", f"place {i}", None, None)) for i in (2, 3)] == [
+            None,
+            {"loc_id": 3},
+        ]
+
+
+def _lookup(text):
+    cache = _lookup.cache
+    result = cache.get(("uri", text, None, None))
+    if result is None:
+        cache[("uri", text, None, None)] = {"text": text}
+    return text
+
+
+def _init_lookup(cache):
+    _lookup.cache = cache
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_geocode_cache_shared_by_processes(tmp_path, start_method):
+    cache = GeocodeCache(tmp_path / "geocode.sqlite")
+    cache[("uri", "place 0", None, None)] = {"text": "place 0"}
+    assert pickle.loads(pickle.dumps(cache)).path == cache.path
+    context = multiprocessing.get_context(start_method)
+    with context.Pool(2, initializer=_init_lookup, initargs=(cache,)) as pool:
+        texts = [f"place {i % 10}" for i in range(50)]
+        assert pool.map(_lookup, texts, chunksize=5) == texts
+        pool.close()
+        pool.join()
+    assert len(cache) == 10
+    hits, misses = cache.run_stats()
+    # Workers save their counts when they exit
+    assert misses >= 9 and hits + misses == 50
+    cache.close()
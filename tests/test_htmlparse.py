@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+
+from job_pipeline.lib.htmlparse import LxmlNode, parse_html
+from job_pipeline.sources import careers_vic, iworkfornsw, probono
+
+GOLDEN_DIR = Path(__file__).parent / "data" / "golden"
+
+GOLDEN_PAGES = [
+    (module, path)
+    for module in (careers_vic, iworkfornsw, probono)
+    for path in sorted((GOLDEN_DIR / module.Datasource.name).glob("*.html"))
+]
+
+
+@pytest.mark.parametrize(
+    "module,path",
+    GOLDEN_PAGES,
+    ids=[f"{p.parent.name}/{p.stem}" for _, p in GOLDEN_PAGES],
+)
+def test_golden_extract_matches_html5lib(module, path):
+    html = path.read_bytes()
+    datasource = module.Datasource()
+    datasource.html_parser = "html5lib"
+    expected = datasource.extract(html, "https://example.com/job", "20220101")
+    datasource.html_parser = "lxml"
+    assert datasource.extract(html, "https://example.com/job", "20220101") == expected
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        # Missing tbody
+        b"<div id=t><table><tr><td>a</td></tr>\n<!--c--><tr><td>b</td></tr></table></div>",
+        # Content misplaced in a table is moved in front of it
+        b"<div id=t><table>text<div>x</div><tr><td>a</td>y</tr></table></div>",
+        b"<div id=t><p>a<br>b<wbr>c</wbr>d</p><pre>\nx</pre></div>",
+        b"<div id=t><a class=' x  y ' title='say \"hi\"' href=/a?b&amp;c>&lt;</a></div>",
+        b"<div id=t><script>if (a < b) {}</script><!-- note --></div>",
+        "<div id=t>café – \x00</div>".encode("windows-1252", "replace"),
+        # Encodings from byte order marks and meta elements
+        "\ufeff<div id=t>café</div>".encode("utf-8"),
+        "\ufeff<div id=t>café</div>".encode("utf-16-le"),
+        "<meta charset=utf-8><div id=t>café</div>".encode("utf-8"),
+        "<meta charset='latin1'><div id=t>café – </div>".encode("windows-1252"),
+        "<meta http-equiv='Content-Type' content='text/html; charset=koi8-r'>"
+        "<div id=t>работа</div>".encode("koi8-r"),
+        "<meta charset=utf-16><div id=t>café</div>".encode("utf-8"),
+        "<meta charset=nonsense><div id=t>café</div>".encode("windows-1252"),
+        # Markup libxml2 repairs differently, parsed with html5lib instead
+        b"<div id=t><p>a<div>b</div>c</p></div>",
+        b"<div id=t><p>a<ul><li>x</li></ul></p></div>",
+        b"<div id=t>a</p>b</div>",
+        b"<div id=t><h1>a<h2>b</h2></h1></div>",
+        b"<div id=t><span>a<p>b</span>c</div>",
+        b"<div id=t><b>a<i>b</b>c</i></div>",
+    ],
+)
+def test_lxml_tree_matches_html5lib(html):
+    expected = parse_html(html, "html5lib").select_one("#t")
+    node = parse_html(html, "lxml").select_one("#t")
+    assert str(node) == str(expected)
+    assert node.get_text() == expected.get_text()
+    assert [str(s) for s in node.select("td, a")] == [
+        str(s) for s in expected.select("td, a")
+    ]
+
+
+@pytest.mark.parametrize(
+    "html,repairable",
+    [
+        (b"<p>a<div>b</div>c</p>", False),
+        (b"<h1>a<h2>b</h2></h1>", False),
+        (b"<span>a<p>b</span>c", False),
+        (b"<p>a<div>b</div>c", True),
+        (b"<h1>a</h1><h2>b</h2><p><span>c</span></p>", True),
+    ],
+)
+def test_lxml_falls_back_to_html5lib(html, repairable):
+    assert isinstance(parse_html(html, "lxml"), LxmlNode) == repairable
+
+
+def test_next_siblings():
+    html = b"<dl><dt>Salary</dt> <!--x--><dd>$1</dd>tail</dl>"
+    expected = parse_html(html, "html5lib").select_one("dt")
+    node = parse_html(html, "lxml").select_one("dt")
+    assert [str(s) for s in node.next_siblings] == [
+        str(s) for s in expected.next_siblings
+    ]
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        parse_html(b"<p></p>", "html.parser")
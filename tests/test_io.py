@@ -0,0 +1,62 @@
+import pytest
+
+from job_pipeline.lib.io import AtomicFileWriter, ResumableFileWriter
+
+
+def test_atomic_file_writer_failure(tmp_path):
+    path = tmp_path / "output.txt"
+    with pytest.raises(ValueError):
+        with AtomicFileWriter(path) as f:
+            f.write(b"partial")
+            raise ValueError()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resumable_file_writer_resumes(tmp_path):
+    path = tmp_path / "output.txt"
+    with pytest.raises(ValueError):
+        with ResumableFileWriter(path) as output:
+            output.filehandle.write(b"a")
+            output.commit("a")
+            output.filehandle.write(b"b")
+            output.commit("b")
+            # Never committed so should be discarded
+            output.filehandle.write(b"partial")
+            raise ValueError()
+    assert not path.exists()
+
+    with ResumableFileWriter(path) as output:
+        assert output.done == {"a", "b"}
+        output.filehandle.write(b"c")
+        output.commit("c")
+    assert path.read_bytes() == b"abc"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_resumable_file_writer_partial_journal(tmp_path):
+    path = tmp_path / "output.txt"
+    (tmp_path / "output.txt.tmp").write_bytes(b"abpartial")
+    (tmp_path / "output.txt.tmp.journal").write_text("a\t1\nb\t2\nc\t")
+    with pytest.raises(ValueError):
+        with ResumableFileWriter(path) as output:
+            assert output.done == {"a", "b"}
+            output.filehandle.write(b"d")
+            output.commit("d")
+            raise ValueError()
+    # The partial entry is gone, so d is committed on a line of its own
+    journal = (tmp_path / "output.txt.tmp.journal").read_text()
+    assert journal == "a\t1\nb\t2\nd\t3\n"
+    with ResumableFileWriter(path) as output:
+        assert output.done == {"a", "b", "d"}
+    assert path.read_bytes() == b"abd"
+
+
+def test_resumable_file_writer_no_resume(tmp_path):
+    path = tmp_path / "output.txt"
+    (tmp_path / "output.txt.tmp").write_bytes(b"ab")
+    (tmp_path / "output.txt.tmp.journal").write_text("a\t1\nb\t2\n")
+    with pytest.raises(ValueError):
+        with ResumableFileWriter(path, resume=False) as output:
+            assert output.done == set()
+            raise ValueError()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,138 @@
+import pandas as pd
+import pytest
+
+from job_pipeline.lib.geocodecache import GeocodeCache
+from job_pipeline.lib.normalise import (
+    DEFERRED_GEOCODE_FIELD,
+    WOF_AUS,
+    Geocoder,
+    deferred_geocoding,
+    geocode_cache,
+    resolve_deferred_geocodes,
+    set_geocode_cache,
+)
+from job_pipeline.lib.serialize import write_data
+from tests.fakedatasource import FakeDatasource
+from tests.placeholderserver import make_place, serve_placeholder
+
+PLACES = {
+    "Carlton, VIC": [make_place(101, "Carlton", "Victoria")],
+    "Carlton, NSW": [make_place(201, "Carlton", "New South Wales")],
+    "Nowhere": [],
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_geocode_cache():
+    set_geocode_cache({})
+    yield
+    set_geocode_cache({})
+
+
+def test_geocode_cache():
+    with serve_placeholder(PLACES) as server:
+        geocoder = Geocoder(server.uri, lang="en", filter_country_ids=(WOF_AUS,))
+        result = geocoder.geocode("Carlton, VIC")
+        assert result == {
+            "loc_id": 101,
+            "loc_country": "Australia",
+            "loc_region": "Victoria",
+            "loc_locality": "Carlton",
+        }
+        result["location_raw"] = "Carlton, VIC"
+        other = Geocoder(server.uri, lang="en", filter_country_ids=[WOF_AUS])
+        assert other.geocode("Carlton, VIC") == geocoder.geocode("Carlton, VIC")
+        assert geocoder.geocode("Nowhere") == {}
+        assert geocoder.geocode("Nowhere") == {}
+        assert (
+            Geocoder(server.uri, filter_country_ids=[1]).geocode("Carlton, NSW") == {}
+        )
+    assert server.queries == {"Carlton, VIC": 1, "Nowhere": 1, "Carlton, NSW": 1}
+
+
+class GeocodingDatasource(FakeDatasource):
+    def normalise(self, uri, location):
+        return {"uri": uri, "location_raw": location, **self.geocoder.geocode(location)}
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_normalise_all_workers(tmp_path, workers):
+    locations = list(PLACES)
+    data = [
+        {"uri": f"https://example.com/job/{i}", "location": locations[i % 3]}
+        for i in range(300)
+    ]
+    (tmp_path / "extract").mkdir()
+    write_data(tmp_path / "extract" / "crawl.jsonl", data)
+    datasource = GeocodingDatasource(None, {})
+    with serve_placeholder(PLACES) as server:
+        datasource.geocoder = Geocoder(server.uri, filter_country_ids=(WOF_AUS,))
+        datasource.normalise_all(
+            tmp_path / "extract", tmp_path / "normalised", workers=workers
+        )
+        df = pd.read_feather(tmp_path / "normalised" / "crawl.feather")
+        assert list(df.uri) == [d["uri"] for d in data]
+        assert list(df.loc_region[:2]) == ["Victoria", "New South Wales"]
+        assert df.loc_region.isna()[2]
+        # Geocoding is deferred to this process, and each location looked up once
+        assert server.queries == {location: 1 for location in PLACES}
+        assert len(geocode_cache()) == len(PLACES)
+
+        num_queries = sum(server.queries.values())
+        datasource.normalise_all(
+            tmp_path / "extract", tmp_path / "normalised", True, workers
+        )
+        assert sum(server.queries.values()) == num_queries
+
+
+def test_normalise_all_persistent_cache(tmp_path):
+    data = [
+        {"uri": f"https://example.com/job/{i}", "location": location}
+        for i, location in enumerate(PLACES)
+    ]
+    (tmp_path / "extract").mkdir()
+    write_data(tmp_path / "extract" / "crawl.jsonl", data)
+    datasource = GeocodingDatasource(None, {})
+    with serve_placeholder(PLACES) as server:
+        datasource.geocoder = Geocoder(server.uri, filter_country_ids=(WOF_AUS,))
+        for run in range(3):
+            with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+                set_geocode_cache(cache)
+                datasource.normalise_all(
+                    tmp_path / "extract", tmp_path / "normalised", True, workers=2
+                )
+                hits, misses = cache.run_stats()
+            assert hits + misses == len(PLACES)
+        # Every later run was answered from the cache
+        assert misses == 0
+    assert sum(server.queries.values()) == len(PLACES)
+
+
+def test_resolve_deferred_geocodes():
+    places = {
+        f"Place {i}": [make_place(i * 10, f"Place {i}", "Victoria")] for i in range(20)
+    }
+    with serve_placeholder(places, delay=0.05) as server:
+        geocoder = Geocoder(server.uri, filter_country_ids=(WOF_AUS,))
+        geocoder.geocode("Place 0")
+        with deferred_geocoding():
+            data = [
+                {"uri": f"job {i}", **geocoder.geocode(f"Place {i % 20}")}
+                for i in range(100)
+            ]
+        assert data[0]["loc_id"] == 0
+        assert data[1] == {
+            "uri": "job 1",
+            DEFERRED_GEOCODE_FIELD: (server.uri, "Place 1", None, (WOF_AUS,)),
+        }
+        resolved = list(
+            resolve_deferred_geocodes(iter(data), batch_size=30, concurrency=4)
+        )
+    assert [datum["uri"] for datum in resolved] == [f"job {i}" for i in range(100)]
+    assert [datum["loc_id"] for datum in resolved] == [
+        10 * (i % 20) for i in range(100)
+    ]
+    assert all(DEFERRED_GEOCODE_FIELD not in datum for datum in resolved)
+    assert server.queries == {place: 1 for place in places}
+    assert 1 < server.max_in_flight <= 4
+    assert geocoder.geocode("Place 19")["loc_locality"] == "Place 19"
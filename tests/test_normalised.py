@@ -0,0 +1,102 @@
+import datetime
+import logging
+
+import pandas as pd
+import pyarrow as pa
+
+from job_pipeline.lib.normalised import NORMALISED_SCHEMA, write_normalised
+from job_pipeline.lib.salary import Period
+from job_pipeline.lib.serialize import write_data
+from tests.fakedatasource import FakeDatasource
+
+UTC = datetime.timezone.utc
+
+
+def normalised(i):
+    return {
+        "title": f"Job {i}",
+        "description": "Do things",
+        "uri": f"https://example.com/job/{i}",
+        "view_date": datetime.datetime(2021, 10, 16, 12, tzinfo=UTC),
+        "org": None,
+        "salary_raw": "$50 per hour",
+        "salary_min": 50,
+        "salary_max": None,
+        "salary_hours": Period.HOUR,
+        "location_raw": "Carlton, Melbourne",
+        "loc_id": 1000 + i,
+        "loc_locality": "Carlton",
+        "loc_country": "Australia",
+    }
+
+
+def test_write_normalised(tmp_path, caplog):
+    data = [normalised(i) for i in range(10)]
+    data[3]["tags"] = ["unknown"]
+    with caplog.at_level(logging.WARNING):
+        num_records = write_normalised(
+            tmp_path / "out.feather", iter(data), batch_size=4
+        )
+
+    assert num_records == 10
+    assert "Dropping unknown field tags" in caplog.text
+    assert pa.ipc.open_file(tmp_path / "out.feather").num_record_batches == 3
+    df = pd.read_feather(tmp_path / "out.feather")
+    assert list(df.columns) == NORMALISED_SCHEMA.names
+    assert list(df.title) == [d["title"] for d in data]
+    assert list(df.loc_id) == list(range(1000, 1010))
+    assert (df.salary_hours == Period.HOUR).all()
+    assert df.salary_max.isna().all() and df.loc_region.isna().all()
+    assert df.view_date[0] == pd.Timestamp("2021-10-16 12:00", tz="UTC")
+
+
+def test_write_normalised_empty(tmp_path):
+    assert write_normalised(tmp_path / "empty.feather", iter([])) == 0
+    df = pd.read_feather(tmp_path / "empty.feather")
+    assert len(df) == 0
+    assert list(df.columns) == NORMALISED_SCHEMA.names
+
+
+class NormaliseDatasource(FakeDatasource):
+    def normalise(self, uri, view_date):
+        return {"uri": uri, "view_date": datetime.datetime.fromisoformat(view_date)}
+
+
+def test_normalise_all(tmp_path):
+    data = [
+        {"uri": f"https://example.com/job/{i}", "view_date": "2021-10-16T12:00:00"}
+        for i in range(5)
+    ]
+    (tmp_path / "extract").mkdir()
+    write_data(tmp_path / "extract" / "crawl.jsonl.zst", data)
+    write_data(tmp_path / "extract" / "empty.jsonl", [])
+    datasource = NormaliseDatasource(None, {})
+    datasource.normalise_batch_size = 2
+    datasource.normalise_all(tmp_path / "extract", tmp_path / "normalised")
+
+    df = pd.read_feather(tmp_path / "normalised" / "crawl.feather")
+    assert list(df.uri) == [d["uri"] for d in data]
+    assert (df.processor == "fake").all() and (df.source == "crawl").all()
+    assert df.title.isna().all()
+    assert len(pd.read_feather(tmp_path / "normalised" / "empty.feather")) == 0
+
+
+class TaggingDatasource(NormaliseDatasource):
+    normalised_schema = NORMALISED_SCHEMA.append(pa.field("tags", pa.string()))
+
+    def normalise(self, uri, view_date):
+        return {**super().normalise(uri, view_date), "tags": "remote"}
+
+
+def test_normalise_all_extended_schema(tmp_path, caplog):
+    (tmp_path / "extract").mkdir()
+    data = [{"uri": "https://example.com/job/1", "view_date": "2021-10-16T12:00:00"}]
+    write_data(tmp_path / "extract" / "crawl.jsonl", data)
+    with caplog.at_level(logging.WARNING):
+        TaggingDatasource(None, {}).normalise_all(
+            tmp_path / "extract", tmp_path / "normalised"
+        )
+
+    assert "Dropping" not in caplog.text
+    df = pd.read_feather(tmp_path / "normalised" / "crawl.feather")
+    assert list(df.tags) == ["remote"]
@@ -0,0 +1,84 @@
+import sqlite3
+
+import job_pipeline.lib.cc as cc
+from job_pipeline.lib.cc import fetch_cc
+from job_pipeline.lib.ccfetch import fetch_all_ranges
+from job_pipeline.lib.rangecache import RangeCache
+from tests.ccserver import make_warc, serve_files
+
+
+def test_range_cache_roundtrip(tmp_path):
+    with RangeCache(tmp_path) as cache:
+        assert cache.get("a", 0, 3) is None
+        cache.put("a", 0, 3, b"abc")
+        cache.put("a", 3, 2, b"de")
+        assert cache.get("a", 0, 3) == b"abc"
+        assert cache.get("a", 3, 2) == b"de"
+    with RangeCache(tmp_path) as cache:
+        assert cache.get("a", 3, 2) == b"de"
+        assert cache.get("a", 3, 3) is None
+
+
+def test_range_caches_share_path(tmp_path):
+    with RangeCache(tmp_path) as first, RangeCache(tmp_path) as second:
+        assert first._pack != second._pack
+        first.put("a", 0, 3, b"abc")
+        second.put("b", 0, 3, b"xyz")
+        first.put("a", 3, 2, b"de")
+        for cache in (first, second):
+            assert cache.get("a", 0, 3) == b"abc"
+            assert cache.get("b", 0, 3) == b"xyz"
+            assert cache.get("a", 3, 2) == b"de"
+    with RangeCache(tmp_path) as cache:
+        assert cache.get("b", 0, 3) == b"xyz"
+    # Packs reserved but never written aren't kept
+    db = sqlite3.connect(str(tmp_path / "index.sqlite"))
+    assert db.execute("SELECT count(*) FROM packs").fetchone()[0] == 2
+    db.close()
+
+
+def test_range_cache_evicts_least_recently_used_pack(tmp_path):
+    with RangeCache(tmp_path, max_size=35, pack_size=10) as cache:
+        for i in range(3):
+            cache.put("a", 10 * i, 10, bytes([i]) * 10)
+        # Pack holding offset 0 is now the most recently used
+        assert cache.get("a", 0, 10) == bytes([0]) * 10
+        cache.put("a", 30, 10, bytes([3]) * 10)
+        assert cache.size() <= 35
+        assert cache.get("a", 10, 10) is None
+        assert cache.get("a", 0, 10) == bytes([0]) * 10
+        assert cache.get("a", 30, 10) == bytes([3]) * 10
+    assert len(list(tmp_path.glob("pack-*.bin"))) == 3
+
+
+def test_fetch_all_ranges_uses_cache(tmp_path):
+    pages = [(f"https://example.com/job/{i}", b"<p>Job</p>") for i in range(20)]
+    data, rows = make_warc(pages)
+    with serve_files({"crawl.warc.gz": data}) as server, RangeCache(tmp_path) as cache:
+        first = dict(
+            (r["url"], c)
+            for r, c in fetch_all_ranges(rows[:10], base_url=server.url, cache=cache)
+        )
+        requests = server.requests
+        second = dict(
+            (r["url"], c)
+            for r, c in fetch_all_ranges(rows, base_url=server.url, cache=cache)
+        )
+        # Only the uncached rows are fetched, in one coalesced request
+        assert server.requests == requests + 1
+        assert cache.hits == 10
+    assert all(second[url] == content for url, content in first.items())
+    assert len(second) == 20
+
+
+def test_fetch_cc_range(tmp_path, monkeypatch):
+    pages = [(f"https://example.com/job/{i}", b"<p>Job</p>") for i in range(3)]
+    data, rows = make_warc(pages)
+    row = rows[1]
+    offset, length = int(row["offset"]), int(row["length"])
+    with serve_files({"crawl.warc.gz": data}) as server, RangeCache(tmp_path) as cache:
+        monkeypatch.setattr(cc, "CC_DATA_URL", server.url)
+        content = fetch_cc(row["filename"], row["offset"], row["length"], cache)
+        assert fetch_cc(row["filename"], offset, length, cache) == content
+        assert server.ranges == [f"bytes={offset}-{offset + length - 1}"]
+    assert content == data[offset : offset + length]
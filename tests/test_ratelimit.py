@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from job_pipeline.lib.ccfetch import fetch_all_ranges
+from job_pipeline.lib.ratelimit import AdaptiveAdapter, AdaptiveLimiter
+from tests.ccserver import ThrottlingHandler, make_warc, serve_files
+
+PAGES = [(f"https://example.com/job/{i}", b"<p>Job</p>") for i in range(300)]
+
+
+def test_limiter_aimd():
+    limiter = AdaptiveLimiter(initial=4, maximum=100, cooldown=0, pause=0)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    # Slow start adds one per success
+    assert limiter.limit == 8
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release()
+    # Congestion avoidance adds about one per limit successes
+    assert limiter.limit == 5
+
+
+def test_limiter_blocks_at_limit():
+    limiter = AdaptiveLimiter(initial=2, maximum=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter.try_acquire() is not None
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_limiter_acquire_async_waits_for_release():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    limiter.acquire()
+
+    async def acquire():
+        start = time.monotonic()
+        await limiter.acquire_async()
+        return time.monotonic() - start
+
+    async def main():
+        task = asyncio.ensure_future(acquire())
+        await asyncio.sleep(0.05)
+        assert not task.done() and limiter._waiters
+        # Released from another thread, as by AdaptiveAdapter
+        threading.Timer(0.05, limiter.release).start()
+        return await task
+
+    assert asyncio.run(main()) >= 0.1
+    assert limiter.in_flight == 1 and not limiter._waiters
+
+
+def test_limiter_backoff_delay():
+    limiter = AdaptiveLimiter(backoff=1.0, max_backoff=10.0)
+    for attempt, delay in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (5, 10.0)]:
+        delays = [limiter.backoff_delay(attempt) for _ in range(100)]
+        assert all(delay / 2 <= d <= delay for d in delays)
+        assert len(set(delays)) > 1
+
+
+def test_fetch_all_ranges_adapts_to_throttling():
+    data, rows = make_warc(PAGES)
+    limiter = AdaptiveLimiter(
+        initial=4, maximum=64, cooldown=0.05, pause=0.02, backoff=0.005, max_backoff=0.1
+    )
+    with serve_files({"crawl.warc.gz": data}, ThrottlingHandler) as server:
+        server.capacity = 8
+        results = list(
+            fetch_all_ranges(
+                rows,
+                concurrency=64,
+                base_url=server.url,
+                max_gap=None,
+                limiter=limiter,
+            )
+        )
+        assert server.throttled > 0
+    assert len(results) == len(rows)
+    assert limiter.throttles == server.throttled
+    assert 1 <= limiter.limit <= 16
+
+
+def test_adaptive_adapter_retries():
+    data, rows = make_warc(PAGES[:50])
+    limiter = AdaptiveLimiter(
+        initial=4, maximum=32, cooldown=0.05, pause=0.02, backoff=0.005, max_backoff=0.1
+    )
+    session = requests.Session()
+    with serve_files({"crawl.warc.gz": data}, ThrottlingHandler) as server:
+        server.capacity = 4
+        session.mount(server.url, AdaptiveAdapter(limiter, pool_maxsize=32))
+
+        def fetch(row):
+            start = int(row["offset"])
+            end = start + int(row["length"]) - 1
+            r = session.get(
+                server.url + row["filename"],
+                headers={"Range": f"bytes={start}-{end}"},
+            )
+            r.raise_for_status()
+            return r.content
+
+        with ThreadPoolExecutor(16) as executor:
+            contents = list(executor.map(fetch, rows))
+    assert [len(c) for c in contents] == [int(row["length"]) for row in rows]
+    assert limiter.in_flight == 0
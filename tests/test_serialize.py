@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import job_pipeline.lib.serialize as serialize
+from job_pipeline.lib.serialize import (
+    DATA_EXTENSIONS,
+    data_extension,
+    dumps,
+    read_data,
+    write_data,
+)
+from job_pipeline.sources.abstract_datasource import find_data
+
+DATA = [
+    {"data": {"title": "Café ☕", "tags": [1, 2.5, None, True]}, "uri": f"u{i}"}
+    for i in range(3000)
+] + [{"big": 2**70, "nested": {"1": "\n"}}]
+
+
+@pytest.mark.parametrize("extension", DATA_EXTENSIONS)
+def test_roundtrip(tmp_path, extension):
+    path = tmp_path / f"crawl{extension}"
+    write_data(path, iter(DATA))
+    assert data_extension(path) == extension
+    assert list(read_data(path)) == DATA
+    write_data(tmp_path / f"empty{extension}", [])
+    assert list(read_data(tmp_path / f"empty{extension}")) == []
+
+
+def test_concatenated_zstd_frames(tmp_path):
+    write_data(tmp_path / "a.jsonl.zst", DATA[:10])
+    write_data(tmp_path / "b.jsonl.zst", DATA[10:20])
+    with open(tmp_path / "a.jsonl.zst", "ab") as f:
+        f.write((tmp_path / "b.jsonl.zst").read_bytes())
+    assert list(read_data(tmp_path / "a.jsonl.zst")) == DATA[:20]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_nonfinite_as_null(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialize, "orjson", None)
+    datum = {"salary": float("nan"), "range": [1.5, float("inf")]}
+    assert json.loads(dumps(datum)) == {"salary": None, "range": [1.5, None]}
+    # Falls back to the json module even with orjson
+    datum["big"] = 2**70
+    assert json.loads(dumps(datum))["salary"] is None
+
+
+def test_unknown_extension(tmp_path):
+    with pytest.raises(ValueError):
+        data_extension(tmp_path / "crawl.json")
+
+
+def test_find_data(tmp_path):
+    write_data(tmp_path / "a.jsonl", DATA[:1])
+    write_data(tmp_path / "b.arrow", DATA[:1])
+    (tmp_path / "c.jsonl.manifest.json").write_text("{}")
+    assert find_data(tmp_path) == {
+        "a": tmp_path / "a.jsonl",
+        "b": tmp_path / "b.arrow",
+    }
@@ -0,0 +1,80 @@
+import job_pipeline.lib.warcindex as warcindex
+from job_pipeline.lib.serialize import read_data
+from job_pipeline.lib.warcindex import (
+    lookup_uri,
+    read_warc_entries,
+    read_warc_index,
+    scan_warc,
+    warc_index_path,
+    write_warc_index,
+)
+from tests.ccserver import make_warc, serve_files
+from tests.fakedatasource import FakeDatasource, UriDatasource
+
+PAGES = [(f"https://example.com/job/{i}", f"Job {i}".encode()) for i in range(10)]
+
+
+def test_scan_warc(tmp_path):
+    data, rows = make_warc(PAGES)
+    path = tmp_path / "crawl.warc.gz"
+    path.write_bytes(data)
+    entries = scan_warc(path)
+    assert [(e.offset, e.length, e.uri) for e in entries] == [
+        (int(row["offset"]), int(row["length"]), row["url"]) for row in rows
+    ]
+    assert read_warc_index(path) is None
+    write_warc_index(path, entries)
+    assert read_warc_index(path) == entries
+
+    records = list(read_warc_entries(path, entries[3:5]))
+    assert [r.content_stream().read() for r in records] == [b"Job 3", b"Job 4"]
+    [record] = lookup_uri(path, "https://example.com/job/7")
+    assert record.content_stream().read() == b"Job 7"
+
+    # The index is out of date once the WARC changes
+    with open(path, "ab") as f:
+        f.write(data)
+    assert read_warc_index(path) is None
+    assert len(lookup_uri(path, "https://example.com/job/7")) == 2
+
+
+def test_download_writes_index(tmp_path):
+    data, rows = make_warc(PAGES)
+    datasource = FakeDatasource(None, {"crawl": rows})
+    datasource.sources = {"crawl": "crawl"}
+    with serve_files({"crawl.warc.gz": data}) as server:
+        datasource.data_url = server.url
+        datasource.download(tmp_path)
+    path = tmp_path / "crawl.warc.gz"
+    assert read_warc_index(path) == scan_warc(path)
+
+
+def test_extract_parallel_builds_index(tmp_path):
+    data, rows = make_warc(PAGES)
+    path = tmp_path / "crawl.warc.gz"
+    path.write_bytes(data)
+    datasource = UriDatasource(None, {})
+    output = list(datasource.extract_parallel(path, workers=2, chunksize=3))
+    assert [(d["uri"], d["text"].encode()) for d in output] == PAGES
+    assert warc_index_path(path).exists()
+
+
+def test_extract_file_indexes_while_extracting(tmp_path, monkeypatch):
+    data, rows = make_warc(PAGES)
+    path = tmp_path / "crawl.warc.gz"
+    path.write_bytes(data)
+    expected = scan_warc(path)
+
+    def scan_warc_once(path):
+        raise AssertionError("A single worker shouldn't read the WARC twice")
+
+    monkeypatch.setattr(warcindex, "scan_warc", scan_warc_once)
+    datasource = UriDatasource(None, {})
+    dest_path = tmp_path / "crawl.jsonl"
+    datasource.extract_file(path, dest_path)
+    assert [(d["uri"], d["text"].encode()) for d in read_data(dest_path)] == PAGES
+    assert read_warc_index(path) == expected
+
+    # The index written is used to find there's nothing more to extract
+    datasource.extract_file(path, dest_path)
+    assert len(list(read_data(dest_path))) == len(PAGES)
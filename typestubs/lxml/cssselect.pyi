@@ -0,0 +1,14 @@
+from typing import Dict, List, Optional
+
+from lxml.etree import _Element
+
+class CSSSelector:
+    css: str
+    path: str
+    def __init__(
+        self,
+        css: str,
+        namespaces: Optional[Dict[str, str]] = None,
+        translator: str = "xml",
+    ) -> None: ...
+    def __call__(self, element: _Element) -> List[_Element]: ...
@@ -0,0 +1,55 @@
+from typing import Dict, Iterator, MutableMapping, Optional, Union
+
+class _Element:
+    tag: str
+    text: Optional[str]
+    tail: Optional[str]
+    attrib: MutableMapping[str, str]
+    def __iter__(self) -> Iterator[_Element]: ...
+    def __len__(self) -> int: ...
+    def append(self, element: _Element) -> None: ...
+    def addnext(self, element: _Element) -> None: ...
+    def addprevious(self, element: _Element) -> None: ...
+    def getparent(self) -> Optional[_Element]: ...
+    def getprevious(self) -> Optional[_Element]: ...
+    def iter(self, *tags: str) -> Iterator[_Element]: ...
+    def iterancestors(self, *tags: str) -> Iterator[_Element]: ...
+    def iterdescendants(self, *tags: str) -> Iterator[_Element]: ...
+    def itersiblings(
+        self, *tags: str, preceding: bool = False
+    ) -> Iterator[_Element]: ...
+    def itertext(self, *tags: str, with_tail: bool = True) -> Iterator[str]: ...
+
+class _Comment(_Element): ...
+
+class _ProcessingInstruction(_Element):
+    target: str
+
+class _LogEntry:
+    type_name: str
+    message: str
+    line: int
+    column: int
+
+class _ListErrorLog:
+    def __iter__(self) -> Iterator[_LogEntry]: ...
+    def __len__(self) -> int: ...
+
+class HTMLParser:
+    error_log: _ListErrorLog
+    def __init__(
+        self,
+        *,
+        encoding: Optional[str] = None,
+        remove_blank_text: bool = False,
+        remove_comments: bool = False,
+        recover: bool = True,
+        no_network: bool = True,
+    ) -> None: ...
+
+def Element(
+    _tag: str, attrib: Optional[Dict[str, str]] = None, **extra: str
+) -> _Element: ...
+def fromstring(
+    text: Union[str, bytes], parser: Optional[HTMLParser] = None
+) -> Optional[_Element]: ...
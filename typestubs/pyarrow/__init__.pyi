@@ -0,0 +1,47 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pyarrow import ipc as ipc
+
+class DataType: ...
+
+class Field:
+    name: str
+    type: DataType
+
+class Schema:
+    names: List[str]
+    types: List[DataType]
+    def __len__(self) -> int: ...
+    def append(self, field: Field) -> Schema: ...
+    def field(self, i: Union[int, str]) -> Field: ...
+
+class Array:
+    type: DataType
+    def __len__(self) -> int: ...
+    def to_pylist(self) -> List[Any]: ...
+
+class RecordBatch:
+    schema: Schema
+    num_rows: int
+    def column(self, i: Union[int, str]) -> Array: ...
+    @staticmethod
+    def from_pylist(
+        mapping: List[Dict[str, Any]], schema: Optional[Schema] = None
+    ) -> RecordBatch: ...
+
+def string() -> DataType: ...
+def large_binary() -> DataType: ...
+def float64() -> DataType: ...
+def int64() -> DataType: ...
+def timestamp(unit: str, tz: Optional[str] = None) -> DataType: ...
+def field(name: str, type: DataType, nullable: bool = True) -> Field: ...
+def schema(
+    fields: Iterable[Union[Field, Tuple[str, DataType]]],
+    metadata: Optional[Dict[Any, Any]] = None,
+) -> Schema: ...
+def array(obj: Iterable[Any], type: Optional[DataType] = None) -> Array: ...
+def record_batch(
+    data: Sequence[Array],
+    names: Optional[List[str]] = None,
+    schema: Optional[Schema] = None,
+) -> RecordBatch: ...
@@ -0,0 +1,39 @@
+from types import TracebackType
+from typing import IO, Iterator, Optional, Type
+
+from pyarrow import RecordBatch, Schema
+
+class IpcWriteOptions:
+    def __init__(self, *, compression: Optional[str] = None) -> None: ...
+
+class _RecordBatchWriter:
+    def write_batch(self, batch: RecordBatch) -> None: ...
+    def close(self) -> None: ...
+    def __enter__(self) -> _RecordBatchWriter: ...
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None: ...
+
+class RecordBatchStreamWriter(_RecordBatchWriter): ...
+class RecordBatchFileWriter(_RecordBatchWriter): ...
+
+class RecordBatchStreamReader:
+    schema: Schema
+    def __iter__(self) -> Iterator[RecordBatch]: ...
+
+class RecordBatchFileReader:
+    schema: Schema
+    num_record_batches: int
+    def get_batch(self, i: int) -> RecordBatch: ...
+
+def new_stream(
+    sink: IO[bytes], schema: Schema, *, options: Optional[IpcWriteOptions] = None
+) -> RecordBatchStreamWriter: ...
+def new_file(
+    sink: IO[bytes], schema: Schema, *, options: Optional[IpcWriteOptions] = None
+) -> RecordBatchFileWriter: ...
+def open_stream(source: IO[bytes]) -> RecordBatchStreamReader: ...
+def open_file(source: IO[bytes]) -> RecordBatchFileReader: ...
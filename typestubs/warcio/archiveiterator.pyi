@@ -19,3 +19,5 @@ class ArchiveIterator(six.Iterator):
     ) -> None: ...
     def __next__(self) -> ArcWarcRecord: ...
     def __iter__(self) -> Generator[ArcWarcRecord, None, None]: ...
+    def get_record_offset(self) -> int: ...
+    def get_record_length(self) -> int: ...
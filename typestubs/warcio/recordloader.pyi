@@ -1,9 +1,13 @@
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 from warcio.bufferedreaders import BufferedReader
 from warcio.limitreader import LimitReader
+from warcio.statusandheaders import StatusAndHeaders
 
 class ArcWarcRecord(object):
     def content_stream(self) -> Union[BufferedReader, LimitReader]: ...
     rec_headers: Dict[str, str]
     rec_type: str
+    http_headers: Optional[StatusAndHeaders]
+    # Length of the record block, including any HTTP headers
+    length: int
@@ -0,0 +1,10 @@
+from typing import List, Optional, Tuple
+
+class StatusAndHeaders(object):
+    statusline: str
+    headers: List[Tuple[str, str]]
+    protocol: str
+    def get_header(
+        self, name: str, default_value: Optional[str] = None
+    ) -> Optional[str]: ...
+    def get_statuscode(self) -> str: ...
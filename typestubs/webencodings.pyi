@@ -0,0 +1,11 @@
+import codecs
+from typing import Optional, Tuple, Union
+
+class Encoding:
+    name: str
+    codec_info: codecs.CodecInfo
+
+def lookup(label: str) -> Optional[Encoding]: ...
+def decode(
+    input: bytes, fallback_encoding: Union[Encoding, str], errors: str = "replace"
+) -> Tuple[str, Encoding]: ...